@@ -3,7 +3,8 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from gen_ai_hub.proxy.langchain.init_models import init_llm
+from workshop_common.llm import get_llm, warm_up
+from workshop_common.telemetry import TelemetryCollector
 
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
@@ -11,16 +12,23 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
 MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "50000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "You are a helpful assistant.")
+# Aggregated token usage and latency per model, appended periodically as JSON lines
+TELEMETRY_FILE = Path(__file__).resolve().parent / "telemetry.jsonl"
 
 
 def main() -> None:
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    # Optional (LLM_WARM_UP): authenticate while the user types the first prompt
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    telemetry = TelemetryCollector.from_env(default_path=TELEMETRY_FILE)
     while True:
         user = input("Prompt (empty to exit): ")
         if not user.strip():
             break
+        llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
         text = f"{SYSTEM_PROMPT}\n\nUser: {user}"
-        response = llm.invoke(text)
+        with telemetry.track(MODEL) as call:
+            response = llm.invoke(text)
+            call.finish(response)
         data = {
             "content": getattr(response, "content", str(response)),
             "response_metadata": getattr(response, "response_metadata", None),
@@ -29,6 +37,12 @@ def main() -> None:
         print("Reply:")
         print(json.dumps(data, indent=2, default=str))
 
+    print("Telemetry:")
+    print(telemetry.format_summary())
+    telemetry.close()
+    if telemetry.path:
+        print(f"Snapshots written to {telemetry.path}")
+
 
 if __name__ == "__main__":
     main()
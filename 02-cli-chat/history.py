@@ -0,0 +1,200 @@
+"""Token-budgeted chat history for the streaming CLI.
+
+Sending the full history on every turn makes each request bigger than the
+last: prompt tokens, cost and time to first token all grow linearly with the
+session. `ChatHistory` keeps the prompt under a fixed token budget instead:
+
+- **Sliding window**: the most recent turns are kept verbatim. When a reply
+  pushes the prompt over the budget (minus a reserve for the next user
+  message), the oldest turns are evicted down to a low-water mark
+  (`compact_ratio` of the budget). Evicting in batches means the summary is
+  updated every few turns instead of on every turn.
+- **Rolling summary**: evicted turns are folded into a running summary by a
+  small LLM call. It runs in a background thread while the user types the
+  next message, so it does not add to the reply latency. Its result (or
+  error, see `take_summary_error()`) is applied on the caller's thread when
+  the next prompt is built. Without a summarizer, evicted turns are simply
+  dropped.
+
+Token counts are estimated once per message (no tokenizer download needed)
+and kept as a running total, so the per-turn bookkeeping is constant.
+"""
+import threading
+from collections import deque
+from typing import Callable
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from workshop_common.ratelimit import estimate_tokens
+
+# Per-message overhead of the chat format (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """Summarize the conversation below for the assistant's memory.
+Keep facts, names, numbers, decisions and open questions; drop small talk.
+Write at most {max_words} words, in the language of the conversation.
+
+Previous summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+def llm_summarizer(
+    get_model: Callable[[], BaseChatModel], max_words: int = 150
+) -> Callable[[str, list[BaseMessage]], str]:
+    """Build a summarizer that folds evicted messages into the summary.
+
+    `get_model` is called on every summary, e.g. a cached `get_llm(...)`.
+    """
+
+    def summarize(summary: str, messages: list[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=max_words, summary=summary or "(none)", messages=transcript
+        )
+        return str(get_model().invoke(prompt).content).strip()
+
+    return summarize
+
+
+class ChatHistory:
+    """System prompt + rolling summary + sliding window of recent turns."""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 3000,
+        reserve_tokens: int = 500,
+        compact_ratio: float = 0.6,
+        summarizer: Callable[[str, list[BaseMessage]], str] | None = None,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        self.system = SystemMessage(content=system_prompt)
+        self.token_budget = token_budget
+        self.reserve_tokens = reserve_tokens
+        self.compact_ratio = compact_ratio
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+
+        self.summary = ""
+        self._window: deque[tuple[BaseMessage, int]] = deque()
+        self._window_tokens = 0
+        self._system_tokens = self._tokens(self.system)
+        self._summary_tokens = 0
+        self._pending: list[BaseMessage] = []
+        self._worker: threading.Thread | None = None
+        # Set by the worker, applied by _wait_for_summary()
+        self._result: str | None = None
+        self._error: Exception | None = None
+        self._summary_error: Exception | None = None
+
+        self.evicted_messages = 0
+        self.summaries = 0
+
+    # -- building the prompt -------------------------------------------------
+
+    def add_user(self, text: str) -> None:
+        self._append(HumanMessage(content=text))
+
+    def add_assistant(self, text: str) -> None:
+        """Store the reply and compact the window for the next turn."""
+        self._append(AIMessage(content=text))
+        if self.prompt_tokens > self.token_budget - self.reserve_tokens:
+            self._evict(int(self.token_budget * self.compact_ratio))
+            self._start_summary()
+
+    def messages(self) -> list[BaseMessage]:
+        """Messages to send: system prompt (with summary) + window.
+
+        Waits for a running summary; if the user message did not fit into
+        the reserve, older turns are evicted right away.
+        """
+        self._wait_for_summary()
+        self._evict(self.token_budget)
+        return [self._system_message(), *(m for m, _ in self._window)]
+
+    def take_summary_error(self) -> Exception | None:
+        """The error of the last failed summary (once), for the caller to
+        report; the evicted turns it should have summarized are dropped."""
+        error, self._summary_error = self._summary_error, None
+        return error
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Estimated tokens of `messages()`."""
+        return self._system_tokens + self._summary_tokens + self._window_tokens
+
+    def format_stats(self) -> str:
+        return (
+            f"history: {len(self._window)} messages in window, ~{self.prompt_tokens} of "
+            f"{self.token_budget} tokens, {self.evicted_messages} evicted, "
+            f"{self.summaries} summary update(s)"
+        )
+
+    # -- internals -------------------------------------------------------------
+
+    def _system_message(self) -> SystemMessage:
+        if not self.summary:
+            return self.system
+        return SystemMessage(
+            content=f"{self.system.content}\n\nSummary of the earlier conversation:\n{self.summary}"
+        )
+
+    def _tokens(self, message: BaseMessage) -> int:
+        return self.count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+
+    def _append(self, message: BaseMessage) -> None:
+        tokens = self._tokens(message)
+        self._window.append((message, tokens))
+        self._window_tokens += tokens
+
+    def _evict(self, limit: int) -> None:
+        # Evict from the front; the newest message always stays.
+        while self.prompt_tokens > limit and len(self._window) > 1:
+            self._pop_front()
+            # Take the reply along with its question, so the window starts
+            # with a user message
+            while len(self._window) > 1 and not isinstance(self._window[0][0], HumanMessage):
+                self._pop_front()
+
+    def _pop_front(self) -> None:
+        message, tokens = self._window.popleft()
+        self._window_tokens -= tokens
+        self.evicted_messages += 1
+        if self.summarizer is not None:
+            self._pending.append(message)
+
+    def _start_summary(self) -> None:
+        if not self._pending or self.summarizer is None or self._worker is not None:
+            return
+        pending, self._pending = self._pending, []
+        previous = self.summary
+
+        def run() -> None:
+            try:
+                self._result = self.summarizer(previous, pending)
+            except Exception as e:  # noqa: BLE001 - keep chatting without the summary
+                self._error = e
+
+        self._result = self._error = None
+        self._worker = threading.Thread(target=run, name="history-summary", daemon=True)
+        self._worker.start()
+
+    def _wait_for_summary(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.join()
+        self._worker = None
+        if self._error is not None:
+            self._summary_error = self._error
+            return
+        self.summary = self._result or ""
+        # Counted as sent: the summary and its heading in the system message
+        self._summary_tokens = self._tokens(self._system_message()) - self._system_tokens
+        self.summaries += 1
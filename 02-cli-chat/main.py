@@ -1,9 +1,13 @@
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
-from gen_ai_hub.proxy.langchain.init_models import init_llm
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from workshop_common.llm import get_llm, warm_up
+from workshop_common.router import ModelRouter
+from workshop_common.telemetry import TelemetryCollector
+
+from history import ChatHistory, llm_summarizer
 
 # Load shared credentials and LLM_* config from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -12,28 +16,65 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
 MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "You are a helpful assistant.")
+# Max. estimated prompt tokens per request (system prompt + summary + recent turns)
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+# Summarize evicted turns (1) or just drop them (0)
+HISTORY_SUMMARY = os.getenv("CHAT_HISTORY_SUMMARY", "1") == "1"
+SUMMARY_MAX_TOKENS = 300
 
 
 def main() -> None:
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
-    history = [SystemMessage(content=SYSTEM_PROMPT)]
+    verbose = "--verbose" in sys.argv
+    # Optional (LLM_WARM_UP): authenticate while the user types the first prompt
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    # Optional (TELEMETRY_FILE): token usage, latency and TTFT per model
+    telemetry = TelemetryCollector.from_env()
+    summarizer = None
+    if HISTORY_SUMMARY:
+        # Created on first use, so startup (and warm-up) is not delayed
+        summarizer = llm_summarizer(
+            lambda: get_llm(MODEL, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.0)
+        )
+    history = ChatHistory(SYSTEM_PROMPT, token_budget=HISTORY_TOKEN_BUDGET, summarizer=summarizer)
+    # Optional (LLM_ROUTING=1): short, simple turns go to LLM_FAST_MODEL.
+    # Only the new message is classified – the history is bounded anyway.
+    router = ModelRouter.from_env(
+        max_tokens=MAX_TOKENS, temperature=TEMPERATURE, get_model=get_llm, telemetry=telemetry
+    )
 
     while True:
         user = input("You: ")
         if not user.strip():
             break
 
-        history.append(HumanMessage(content=user))
+        history.add_user(user)
+        # Waits for a running summary; report its failure before the reply
+        messages = history.messages()
+        error = history.take_summary_error()
+        if error is not None:
+            print(f"[history] summary failed, older turns were dropped: {error}")
+        decision = router.classify(user)
+        if verbose:
+            print(f"[route: {decision.label} – {', '.join(decision.reasons)}]")
         print("Assistant: ", end="", flush=True)
 
-        ai_content = ""
-        for chunk in llm.stream(history):
-            text = getattr(chunk, "content", str(chunk))
-            print(text, end="", flush=True)
-            ai_content += text
+        # Collect the pieces and join once (no string copy per chunk)
+        parts: list[str] = []
+        with router.track(decision) as call:
+            for chunk in router.llm(decision).stream(messages):
+                call.on_chunk(chunk)
+                text = getattr(chunk, "content", str(chunk))
+                print(text, end="", flush=True)
+                parts.append(text)
 
         print()
-        history.append(AIMessage(content=ai_content))
+        history.add_assistant("".join(parts))
+        if verbose:
+            print(f"[{history.format_stats()}]")
+
+    telemetry.close()
+    if telemetry.path or router.enabled:
+        print(telemetry.format_summary())
 
 
 if __name__ == "__main__":
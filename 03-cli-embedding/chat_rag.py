@@ -1,10 +1,17 @@
 import os
+import sys
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
+from typing import Iterator
 
 from dotenv import load_dotenv
-from hdbcli import dbapi
 from langchain_hana import HanaDB
-from gen_ai_hub.proxy.langchain.init_models import init_llm, init_embedding_model
+from workshop_common.hana import get_pool
+from workshop_common.llm import get_embedding_model, get_llm, warm_up
+from workshop_common.router import ModelRouter
+from workshop_common.vectors import VectorStorage
+
+from multi_query import MultiQueryRetriever
 
 # Load shared configuration from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -13,45 +20,46 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
 MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "You are a helpful assistant.")
+# Search with several query variants: off | local (no LLM call) | llm
+MULTI_QUERY = os.getenv("RAG_MULTI_QUERY", "off").strip().lower()
+MULTI_QUERY_VARIANTS = int(os.getenv("RAG_MULTI_QUERY_VARIANTS", "3"))
 
 
-def get_connection() -> dbapi.Connection:
-    return dbapi.connect(
-        address=os.getenv("HANA_DB_ADDRESS"),
-        port=int(os.getenv("HANA_DB_PORT", "443")),
-        user=os.getenv("HANA_DB_USER"),
-        password=os.getenv("HANA_DB_PASSWORD"),
-        autocommit=True,
-        sslValidateCertificate=False,
-    )
-
+@contextmanager
+def open_vector_store() -> Iterator[HanaDB]:
+    """The document table on a pooled connection, returned to the pool on exit.
 
-def get_vector_store() -> HanaDB:
-    connection = get_connection()
+    Held for the whole chat session; the pool reconnects it if HANA drops
+    the session while the user is idle.
+    """
     embedding_model = os.getenv("LLM_EMBEDDING_MODEL", "text-embedding-3-small")
     table_name = os.getenv("HANA_TABLE_NAME", "WORKSHOP_DOCS")
 
-    embeddings = init_embedding_model(embedding_model)
-
-    return HanaDB(embedding=embeddings, connection=connection, table_name=table_name)
-
-
-def main() -> None:
-    db = get_vector_store()
-    top_k = int(os.getenv("RAG_TOP_K", "5"))
-    retriever = db.as_retriever(search_kwargs={"k": top_k})
-
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
-
-    while True:
-        question = input("You (question about the document, empty to exit): ")
-        if not question.strip():
-            break
+    # Must match the settings the table was ingested with
+    storage = VectorStorage.from_env()
+    embeddings = storage.embeddings(get_embedding_model(embedding_model, dimensions=storage.dimensions))
+
+    with get_pool().connection() as connection:
+        yield HanaDB(
+            embedding=embeddings, connection=connection, table_name=table_name, **storage.hana_kwargs()
+        )
+
+
+def get_multi_query_retriever(db: HanaDB, top_k: int, max_stores: int) -> MultiQueryRetriever:
+    return MultiQueryRetriever(
+        db,
+        open_store=open_vector_store,
+        mode=MULTI_QUERY,
+        variants=MULTI_QUERY_VARIANTS,
+        top_k=top_k,
+        max_stores=max_stores,
+        # Rephrasing is a simple task: use the fast model
+        get_model=lambda: get_llm(os.getenv("LLM_FAST_MODEL", MODEL), max_tokens=200, temperature=0.0),
+    )
 
-        docs = retriever.invoke(question)
-        context = "\n\n---\n\n".join(doc.page_content for doc in docs)
 
-        prompt = f"""{SYSTEM_PROMPT}
+def build_prompt(question: str, context: str) -> str:
+    return f"""{SYSTEM_PROMPT}
 
 Context:
 {context}
@@ -59,11 +67,49 @@ Context:
 User: {question}
 """
 
-        print("Assistant: ", end="", flush=True)
-        for chunk in llm.stream(prompt):
-            text = getattr(chunk, "content", str(chunk))
-            print(text, end="", flush=True)
-        print()
+
+def main() -> None:
+    verbose = "--verbose" in sys.argv
+    # Optional (LLM_WARM_UP): authenticate against AI Core while HANA connects
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    with ExitStack() as session:
+        db = session.enter_context(open_vector_store())
+        top_k = int(os.getenv("RAG_TOP_K", "5"))
+        if MULTI_QUERY == "off":
+            retriever = db.as_retriever(search_kwargs={"k": top_k})
+        else:
+            retriever = session.enter_context(get_multi_query_retriever(
+                db, top_k, max_stores=min(MULTI_QUERY_VARIANTS, int(os.getenv("HANA_POOL_SIZE", "4")))
+            ))
+
+        # Optional (LLM_ROUTING=1): simple questions go to LLM_FAST_MODEL
+        router = ModelRouter.from_env(max_tokens=MAX_TOKENS, temperature=TEMPERATURE, get_model=get_llm)
+
+        while True:
+            question = input("You (question about the document, empty to exit): ")
+            if not question.strip():
+                break
+
+            docs = retriever.invoke(question)
+            if verbose and MULTI_QUERY != "off":
+                print(f"[{retriever.timing.format()}]")
+            context = "\n\n---\n\n".join(doc.page_content for doc in docs)
+            prompt = build_prompt(question, context)
+
+            decision = router.classify(question, context=context)
+            if verbose:
+                print(f"[route: {decision.label} – {', '.join(decision.reasons)}]")
+
+            print("Assistant: ", end="", flush=True)
+            with router.track(decision) as call:
+                for chunk in router.llm(decision).stream(prompt):
+                    call.on_chunk(chunk)
+                    text = getattr(chunk, "content", str(chunk))
+                    print(text, end="", flush=True)
+            print()
+
+        if verbose:
+            print(router.format_stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+"""Batch evaluation of the RAG chat: latency breakdown, recall@k and QPS.
+
+Runs every question of a file through the same retrieval and generation as
+`chat_rag.py` (same `.env` settings: `RAG_TOP_K`, `RAG_MULTI_QUERY`,
+`RAG_VECTOR_TYPE`, `LLM_ROUTING`, ...), several questions at a time, and
+reports per question:
+
+- embed / search / first token / total latency (ms),
+- recall@k: share of the expected snippets found in the retrieved chunks.
+
+Question files:
+- `.jsonl`: one object per line, `{"question": "...", "expected": ["69,501"]}`;
+  `expected` (optional) lists text snippets that a relevant chunk contains.
+- anything else: one question per line (no recall).
+
+Usage:
+    uv run eval_rag.py eval-questions.jsonl
+    uv run eval_rag.py eval-questions.jsonl --concurrency 8 --output results.jsonl
+    uv run eval_rag.py eval-questions.jsonl --retrieval-only   # skip the LLM
+    uv run eval_rag.py eval-questions.jsonl --verbose          # one line per question
+"""
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from queue import Queue
+
+from workshop_common.router import ModelRouter
+
+import chat_rag
+
+
+@dataclass
+class EvalQuestion:
+    id: int
+    question: str
+    expected: list[str] = field(default_factory=list)
+
+
+@dataclass
+class EvalResult:
+    id: int
+    question: str
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+    retrieval_ms: float = 0.0
+    first_token_ms: float | None = None
+    total_ms: float = 0.0
+    completion_tokens: int = 0
+    route: str = ""
+    recall: float | None = None
+    sources: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
+def load_questions(path: Path) -> list[EvalQuestion]:
+    questions = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        if path.suffix == ".jsonl":
+            item = json.loads(line)
+            questions.append(EvalQuestion(len(questions), item["question"], list(item.get("expected", []))))
+        else:
+            questions.append(EvalQuestion(len(questions), line.strip()))
+    return questions
+
+
+def recall_at_k(expected: list[str], texts: list[str]) -> float | None:
+    """Share of expected snippets that occur in at least one retrieved chunk."""
+    if not expected:
+        return None
+    haystack = [t.lower() for t in texts]
+    found = sum(1 for snippet in expected if any(snippet.lower() in t for t in haystack))
+    return found / len(expected)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+class Evaluator:
+    """Answers questions concurrently with the chat_rag.py pipeline."""
+
+    def __init__(self, concurrency: int, generate: bool = True) -> None:
+        self.top_k = int(os.getenv("RAG_TOP_K", "5"))
+        self.generate = generate
+        # Searches need their own HANA connection; LLM calls do not, so more
+        # questions than connections can be in flight
+        stores = max(1, min(concurrency, int(os.getenv("HANA_POOL_SIZE", "4"))))
+        # Every store holds a pooled connection until close()
+        self._resources = ExitStack()
+        db = self._resources.enter_context(chat_rag.open_vector_store())
+        self.embeddings = db.embeddings
+        self.multi = None
+        self._stores: Queue = Queue()
+        if chat_rag.MULTI_QUERY != "off":
+            self.multi = self._resources.enter_context(
+                chat_rag.get_multi_query_retriever(db, self.top_k, max_stores=stores)
+            )
+        else:
+            self._stores.put(db)
+            for _ in range(stores - 1):
+                self._stores.put(self._resources.enter_context(chat_rag.open_vector_store()))
+        self.router = ModelRouter.from_env(
+            max_tokens=chat_rag.MAX_TOKENS, temperature=chat_rag.TEMPERATURE, get_model=chat_rag.get_llm
+        )
+
+    def close(self) -> None:
+        """Return the connections of the vector stores to the pool."""
+        self._resources.close()
+
+    def evaluate(self, item: EvalQuestion) -> EvalResult:
+        result = EvalResult(item.id, item.question)
+        start = time.perf_counter()
+        try:
+            docs = self._retrieve(item.question, result)
+            result.retrieval_ms = (time.perf_counter() - start) * 1000
+            texts = [doc.page_content for doc in docs]
+            result.recall = recall_at_k(item.expected, texts)
+            result.sources = sorted({str(doc.metadata.get("source", "")) for doc in docs})
+            if self.generate:
+                self._generate(item.question, "\n\n---\n\n".join(texts), result, start)
+        except Exception as e:  # noqa: BLE001 - report and continue with the next question
+            result.error = f"{type(e).__name__}: {e}"
+        result.total_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    def _retrieve(self, question: str, result: EvalResult) -> list:
+        if self.multi is not None:
+            docs, timing = self.multi.retrieve(question)
+            result.embed_ms, result.search_ms = timing.embed_ms, timing.search_ms
+            return docs
+
+        t0 = time.perf_counter()
+        vector = self.embeddings.embed_query(question)
+        t1 = time.perf_counter()
+        store = self._stores.get()
+        try:
+            docs = store.similarity_search_by_vector(vector, k=self.top_k)
+        finally:
+            self._stores.put(store)
+        result.embed_ms = (t1 - t0) * 1000
+        result.search_ms = (time.perf_counter() - t1) * 1000
+        return docs
+
+    def _generate(self, question: str, context: str, result: EvalResult, start: float) -> None:
+        decision = self.router.classify(question, context=context)
+        result.route = decision.label
+        with self.router.track(decision) as call:
+            for chunk in self.router.llm(decision).stream(chat_rag.build_prompt(question, context)):
+                call.on_chunk(chunk)
+                if result.first_token_ms is None and getattr(chunk, "content", None):
+                    result.first_token_ms = (time.perf_counter() - start) * 1000
+        result.completion_tokens = call.usage.completion_tokens
+
+
+def format_summary(results: list[EvalResult], wall_s: float, concurrency: int, top_k: int) -> str:
+    ok = [r for r in results if r.error is None]
+    lines = [
+        f"{len(results)} questions ({len(results) - len(ok)} errors), concurrency {concurrency}, "
+        f"{wall_s:.2f} s, {len(results) / wall_s if wall_s else 0.0:.2f} QPS",
+        f"{'':<16} {'p50':>9} {'p95':>9} {'mean':>9}",
+    ]
+    columns = [
+        ("embed ms", [r.embed_ms for r in ok]),
+        ("search ms", [r.search_ms for r in ok]),
+        ("retrieval ms", [r.retrieval_ms for r in ok]),
+        ("first token ms", [r.first_token_ms for r in ok if r.first_token_ms is not None]),
+        ("total ms", [r.total_ms for r in ok]),
+    ]
+    for name, values in columns:
+        if values:
+            lines.append(
+                f"{name:<16} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} "
+                f"{sum(values) / len(values):>9.1f}"
+            )
+    recalls = [r.recall for r in ok if r.recall is not None]
+    if recalls:
+        lines.append(f"recall@{top_k}: {sum(recalls) / len(recalls):.3f} over {len(recalls)} questions")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(1)
+    questions = load_questions(Path(args[0]))
+    concurrency = int(args[args.index("--concurrency") + 1]) if "--concurrency" in args else 4
+    output = Path(args[args.index("--output") + 1]) if "--output" in args else None
+    verbose = "--verbose" in args
+
+    evaluator = Evaluator(concurrency, generate="--retrieval-only" not in args)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eval") as pool:
+            results = list(pool.map(evaluator.evaluate, questions))
+    finally:
+        evaluator.close()
+    wall_s = time.perf_counter() - start
+
+    if verbose:
+        for r in results:
+            ttft = f"{r.first_token_ms:.0f}" if r.first_token_ms is not None else "-"
+            recall = f"{r.recall:.2f}" if r.recall is not None else "-"
+            status = f"  ERROR {r.error}" if r.error else ""
+            print(
+                f"[{r.id}] embed {r.embed_ms:.0f} / search {r.search_ms:.0f} / first token {ttft} / "
+                f"total {r.total_ms:.0f} ms, recall {recall} – {r.question}{status}"
+            )
+    if output:
+        with output.open("w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+        print(f"Per-question results written to {output}")
+
+    print(format_summary(results, wall_s, concurrency, evaluator.top_k))
+    if evaluator.generate:
+        print(evaluator.router.format_stats())
+
+
+if __name__ == "__main__":
+    main()
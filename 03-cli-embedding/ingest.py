@@ -3,27 +3,19 @@ import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
-from hdbcli import dbapi
 from langchain_core.documents import Document
 from langchain_hana import HanaDB
-from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
-from gen_ai_hub.proxy.langchain.init_models import init_embedding_model
+from workshop_common.hana import get_pool
+from workshop_common.llm import get_embedding_model
+from workshop_common.ratelimit import all_metrics
+from workshop_common.vectors import VectorStorage
+
+from splitter import get_splitter
 
 # Load shared configuration from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
 
-def get_connection() -> dbapi.Connection:
-    return dbapi.connect(
-        address=os.getenv("HANA_DB_ADDRESS"),
-        port=int(os.getenv("HANA_DB_PORT", "443")),
-        user=os.getenv("HANA_DB_USER"),
-        password=os.getenv("HANA_DB_PASSWORD"),
-        autocommit=True,
-        sslValidateCertificate=False,
-    )
-
-
 def main() -> None:
     if len(sys.argv) > 1:
         file_path = Path(sys.argv[1])
@@ -36,31 +28,33 @@ def main() -> None:
 
     text = file_path.read_text(encoding="utf-8")
 
-    chunk_size = int(os.getenv("RAG_CHUNK_SIZE", "500"))
-    chunk_overlap = int(os.getenv("RAG_CHUNK_OVERLAP", "50"))
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
+    # RAG_SPLITTER=characters (RAG_CHUNK_SIZE/RAG_CHUNK_OVERLAP in characters)
+    # or tokens (RAG_CHUNK_TOKENS/RAG_CHUNK_OVERLAP_TOKENS, better for CJK text)
+    splitter = get_splitter()
     docs = splitter.split_documents(
         [Document(page_content=text, metadata={"source": str(file_path)})]
     )
 
-    connection = get_connection()
-
     embedding_model = os.getenv("LLM_EMBEDDING_MODEL", "text-embedding-3-small")
     table_name = os.getenv("HANA_TABLE_NAME", "WORKSHOP_DOCS")
 
-    embeddings = init_embedding_model(embedding_model)
+    # Optional: HALF_VECTOR column and/or fewer dimensions (RAG_VECTOR_TYPE,
+    # RAG_EMBEDDING_DIMENSIONS); chat_rag.py reads the same settings
+    storage = VectorStorage.from_env()
+    embeddings = storage.embeddings(get_embedding_model(embedding_model, dimensions=storage.dimensions))
 
-    db = HanaDB(embedding=embeddings, connection=connection, table_name=table_name)
+    with get_pool().connection() as connection:
+        db = HanaDB(
+            embedding=embeddings, connection=connection, table_name=table_name, **storage.hana_kwargs()
+        )
 
-    # Avoid duplicates: remove existing chunks for this source file, then insert
-    db.delete(filter={"source": str(file_path)})
-    db.add_documents(docs)
+        # Avoid duplicates: remove existing chunks for this source file, then insert
+        db.delete(filter={"source": str(file_path)})
+        db.add_documents(docs)
 
-    print(f"Ingested {len(docs)} chunks from {file_path} into table '{table_name}'.")
+    print(f"Ingested {len(docs)} chunks from {file_path} into table '{table_name}' ({storage.label}).")
+    for metrics in all_metrics():
+        print(f"[{metrics.format()}]")
 
 
 if __name__ == "__main__":
@@ -2,8 +2,8 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from gen_ai_hub.proxy.langchain.init_models import init_llm
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from workshop_common.llm import get_llm, warm_up
 
 # Load shared credentials and LLM_* config from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -15,7 +15,8 @@ SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "You are a helpful assistant.")
 
 
 def main() -> None:
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    # Optional (LLM_WARM_UP): authenticate while the user types the first prompt
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
     history = [SystemMessage(content=SYSTEM_PROMPT)]
 
     while True:
@@ -24,6 +25,7 @@ def main() -> None:
             break
 
         history.append(HumanMessage(content=user))
+        llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
         print("Assistant: ", end="", flush=True)
 
         ai_content = ""
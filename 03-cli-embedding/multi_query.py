@@ -0,0 +1,218 @@
+"""Multi-query retrieval with reciprocal rank fusion.
+
+A single similarity search for a vague question ("what about the risks?")
+easily misses chunks that use other words. `MultiQueryRetriever` searches
+with several variants of the question and merges the rankings:
+
+1. **Variants**: either a cheap local expansion (keywords only, question
+   without the interrogative) or one small LLM call that rephrases it.
+2. **One embedding request** for all variants (`embed_documents`).
+3. **Concurrent searches**, one per variant, each on its own pooled HANA
+   connection (a connection runs one statement at a time).
+4. **Reciprocal rank fusion**: a chunk scores `sum(1 / (60 + rank))` over all
+   result lists, so chunks found by several variants rise to the top.
+
+Retrieval wall time stays close to a single search: the embedding is one
+request and the searches overlap. In LLM mode the original question is
+already searched while the variants are being generated.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, ExitStack
+from dataclasses import dataclass
+from queue import Queue
+from typing import Any, Callable
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+MODES = ("off", "local", "llm")
+RRF_K = 60
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does", "did",
+    "has", "have", "had", "of", "in", "on", "at", "to", "for", "from", "by", "with",
+    "and", "or", "about", "what", "which", "who", "whom", "where", "when", "why", "how",
+    "much", "many", "can", "could", "should", "would", "will", "there", "this", "that",
+    "these", "those", "it", "its", "me", "my", "we", "our", "you", "your", "please", "tell",
+}
+INTERROGATIVE = re.compile(
+    r"^(what|which|who|where|when|why|how( much| many)?)\s+"
+    r"((is|are|was|were|do|does|did|has|have|had|can|could|will)\s+)?(the\s+)?",
+    re.IGNORECASE,
+)
+
+VARIANTS_PROMPT = """Rewrite the question below as {n} different search queries for a document
+search. Use other words and synonyms, keep names and numbers. One query per line,
+no numbering, no explanations.
+
+Question: {question}"""
+
+
+def local_variants(question: str, n: int) -> list[str]:
+    """Question, its keywords and its core phrase (no LLM call)."""
+    question = question.strip()
+    words = re.findall(r"[\w%€$.-]+", question)
+    keywords = " ".join(w for w in words if w.lower() not in STOPWORDS).strip(".")
+    core = INTERROGATIVE.sub("", question).rstrip("?!. ")
+    return _unique([question, keywords, core])[:n]
+
+
+def llm_variants(llm: Any, question: str, n: int) -> list[str]:
+    """The question plus up to n-1 rephrasings from one LLM call."""
+    reply = str(llm.invoke(VARIANTS_PROMPT.format(n=n - 1, question=question)).content)
+    lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in reply.splitlines()]
+    return _unique([question.strip(), *lines])[:n]
+
+
+def _unique(queries: list[str]) -> list[str]:
+    seen: set[str] = set()
+    result = []
+    for query in queries:
+        key = " ".join(re.findall(r"\w+", query.lower()))
+        if query and key not in seen:
+            seen.add(key)
+            result.append(query)
+    return result
+
+
+def reciprocal_rank_fusion(result_lists: list[list[Document]], top_k: int, k: int = RRF_K) -> list[Document]:
+    """Merge rankings; documents are identified by source + content."""
+    scores: dict[tuple[str, str], float] = {}
+    docs: dict[tuple[str, str], Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = (str(doc.metadata.get("source", "")), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [docs[key] for key in ranked[:top_k]]
+
+
+@dataclass
+class RetrievalTiming:
+    queries: int = 0
+    variants_ms: float = 0.0
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+    total_ms: float = 0.0
+
+    def format(self) -> str:
+        return (
+            f"retrieval: {self.queries} queries, variants {self.variants_ms:.0f} ms, "
+            f"embed {self.embed_ms:.0f} ms, search {self.search_ms:.0f} ms, total {self.total_ms:.0f} ms"
+        )
+
+
+class MultiQueryRetriever:
+    """Search with several query variants in parallel and fuse the results."""
+
+    def __init__(
+        self,
+        db: VectorStore,
+        open_store: Callable[[], AbstractContextManager[VectorStore]],
+        mode: str = "local",
+        variants: int = 3,
+        top_k: int = 5,
+        get_model: Callable[[], Any] | None = None,
+        max_stores: int | None = None,
+    ) -> None:
+        if mode not in MODES[1:]:
+            raise ValueError(f"RAG_MULTI_QUERY must be one of {', '.join(MODES)}, got '{mode}'")
+        if mode == "llm" and get_model is None:
+            raise ValueError("mode 'llm' needs get_model")
+        self.embeddings = db.embeddings
+        self.mode = mode
+        self.variants = variants
+        self.top_k = top_k
+        self.get_model = get_model
+        self.timing = RetrievalTiming()
+        # One store per concurrent search, each on its own connection; extra
+        # ones are opened on first use with open_store() (a context manager,
+        # exited by close()). Keep max_stores within the HANA pool size,
+        # otherwise opening a store waits for a connection until it times out.
+        self.max_stores = max_stores or variants
+        self._open_store = open_store
+        self._stores: Queue[VectorStore] = Queue()
+        self._stores.put(db)
+        self._opened = 1
+        self._extra_stores = ExitStack()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(variants, self.max_stores), thread_name_prefix="multi-query"
+        )
+
+    def close(self) -> None:
+        """Wait for running searches and close the extra stores, which returns
+        their connections to the pool; `db` stays open (it belongs to the caller)."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._extra_stores.close()
+
+    def __enter__(self) -> "MultiQueryRetriever":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def invoke(self, question: str) -> list[Document]:
+        docs, self.timing = self.retrieve(question)
+        return docs
+
+    def retrieve(self, question: str) -> tuple[list[Document], RetrievalTiming]:
+        """Fused documents plus the timing of this call (thread-safe)."""
+        start = time.perf_counter()
+        timing = RetrievalTiming()
+        first = None
+        if self.mode == "llm":
+            # Search the original question while the LLM writes variants
+            first = self._executor.submit(self._search_text, question)
+            queries = llm_variants(self.get_model(), question, self.variants)[1:]
+        else:
+            queries = local_variants(question, self.variants)
+        timing.variants_ms = (time.perf_counter() - start) * 1000
+
+        embed_start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(queries) if queries else []
+        timing.embed_ms = (time.perf_counter() - embed_start) * 1000
+
+        search_start = time.perf_counter()
+        result_lists = list(self._executor.map(self._search, vectors))
+        if first is not None:
+            result_lists.insert(0, first.result())
+        timing.search_ms = (time.perf_counter() - search_start) * 1000
+
+        timing.queries = len(queries) + (first is not None)
+        timing.total_ms = (time.perf_counter() - start) * 1000
+        return reciprocal_rank_fusion(result_lists, self.top_k), timing
+
+    def _search_text(self, question: str) -> list[Document]:
+        return self._search(self.embeddings.embed_query(question))
+
+    def _search(self, vector: list[float]) -> list[Document]:
+        store = self._take_store()
+        try:
+            return store.similarity_search_by_vector(vector, k=self.top_k)
+        finally:
+            self._stores.put(store)
+
+    def _take_store(self) -> VectorStore:
+        with self._lock:
+            open_new = self._stores.empty() and self._opened < self.max_stores
+            if open_new:
+                self._opened += 1
+        if not open_new:
+            return self._stores.get()
+        # Connect outside the lock, so the other searches are not held up
+        opened = self._open_store()
+        try:
+            store = opened.__enter__()
+        except BaseException:
+            with self._lock:
+                self._opened -= 1
+            raise
+        with self._lock:
+            self._extra_stores.push(opened)
+        return store
@@ -0,0 +1,239 @@
+"""Token-aware Markdown splitter for Latin and CJK text.
+
+`RecursiveCharacterTextSplitter` measures chunks in characters. That fits
+English (~4 characters per token) but not Japanese, where a character is
+roughly one token: a 500-character chunk is ~125 tokens of English but ~500
+tokens of Japanese, so one setting gives either tiny English chunks or
+oversized Japanese ones. It also tries its separators recursively, splitting
+and re-merging the same text several times.
+
+`TokenAwareSplitter` sizes chunks by tokens and makes one pass over the text:
+
+1. **Segments**: lines are grouped into Markdown blocks (heading, paragraph,
+   list item, table row, fenced code line) and paragraphs are cut into
+   sentences at `。！？!?` (plus closing quotes/brackets) or at a period
+   followed by whitespace, so `69.5` and `e.g.` stay intact.
+2. **Packing**: segments are appended to the current chunk until the next one
+   would exceed `chunk_tokens`. Chunks therefore end on a sentence or line
+   boundary; only a single segment longer than the budget is cut, preferably
+   after `、，,` or a space. Chunk ends are found by binary search over the
+   running token total, so Python only does work per chunk, not per segment.
+3. **Sections**: a heading starts a new chunk (once the current one holds at
+   least `min_tokens`), and the overlap is not carried across it.
+4. **Overlap**: the last whole segments of a chunk, up to `overlap_tokens`,
+   start the next one.
+
+Tokens are estimated without a tokenizer (~4 ASCII characters or 1 other
+character per token, `workshop_common.ratelimit.estimate_tokens`), or
+counted exactly with `tiktoken` if installed and `RAG_TOKENIZER=tiktoken`
+is set.
+"""
+import os
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, compress, filterfalse
+from operator import not_
+from typing import Callable, Iterator
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+from workshop_common.ratelimit import estimate_tokens
+
+SPLITTERS = ("characters", "tokens")
+
+# Closing quotes and brackets that belong to the sentence before them
+_CLOSERS = r"[」』）)\]\"'”’]*"
+_LIST_ITEM = r"(?:[-*+][ \t]|\d+[.)][ \t]|[•●○■□◆◇・※]|[（(]\d+[)）])"
+_BLOCK_START = rf"(?:\n|#{{1,6}}[ \t]|```|~~~|\||{_LIST_ITEM})"
+_HEADING = r"^[ \t]*#{1,6}[ \t][^\n]*\n?"
+# One match per segment, in a single scan of the text (no groups, so
+# findall() returns the segments without building match objects):
+# - a fenced code block, kept whole
+# - a Markdown heading line
+# - a table row or a blank line
+# - paragraph text up to the end of the sentence (。！？!? or a period
+#   followed by whitespace) or up to the next block
+SEGMENT = re.compile(
+    rf"(?:^[ \t]*(?:```|~~~)[^\n]*\n.*?(?:^[ \t]*(?:```|~~~)[^\n]*\n?|\Z))"
+    rf"|(?:{_HEADING})"
+    rf"|(?:^[ \t]*(?:\|[^\n]*)?\n)"
+    rf"|(?:(?:[^。！？!?.\n]++|\.(?!{_CLOSERS}(?:\s|\Z))|\n(?![ \t]*{_BLOCK_START}))*+"
+    rf"(?:[。！？!?]+{_CLOSERS}|\.{_CLOSERS})?[ \t]*\n?)",
+    re.M | re.S,
+)
+# A heading line (matched where a line with a `#` starts)
+HEADING = re.compile(_HEADING, re.M)
+# Where an over-long sentence is preferably cut
+SOFT_BREAK = re.compile(r"[、，,;；:：\s]")
+
+
+def tiktoken_counter(encoding: str = "cl100k_base") -> Callable[[str], int]:
+    """Exact token count with tiktoken (`cl100k_base` = text-embedding-3-*)."""
+    import tiktoken  # optional dependency: uv add tiktoken
+
+    enc = tiktoken.get_encoding(encoding)
+    return lambda text: len(enc.encode(text, disallowed_special=()))
+
+
+class TokenAwareSplitter(TextSplitter):
+    """Single-pass splitter that packs sentences into token-sized chunks."""
+
+    def __init__(
+        self,
+        chunk_tokens: int = 256,
+        overlap_tokens: int = 32,
+        count_tokens: Callable[[str], float] = estimate_tokens,
+        min_tokens: int | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(chunk_size=chunk_tokens, chunk_overlap=overlap_tokens, **kwargs)
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens
+        self.min_tokens = chunk_tokens // 4 if min_tokens is None else min_tokens
+
+    def split_text(self, text: str) -> list[str]:
+        segments, sizes, offsets, headings = self._segments(text)
+        # Tokens before segment i
+        tokens_before = list(accumulate(sizes, initial=0))
+        # Segments that make a chunk worth emitting (not blank, not headings)
+        content = list(
+            filterfalse(headings.__contains__, compress(range(len(segments)), map(not_, map(str.isspace, segments))))
+        )
+
+        def has_content(begin: int, end: int) -> bool:
+            i = bisect_left(content, begin)
+            return i < len(content) and content[i] < end
+
+        def emit(begin: int, end: int) -> None:
+            chunk = text[offsets[begin]:offsets[end]].strip()
+            if chunk:
+                chunks.append(chunk)
+
+        chunks: list[str] = []
+        # The chunk is segments[start:end]; it is "fresh" (worth emitting) if
+        # it has content from fresh_from on, and begins with `carried`
+        # overlap segments
+        start = end = fresh_from = carried = 0
+        next_heading = iter(sorted(headings))
+        heading = next(next_heading, len(segments))
+        while end < len(segments):
+            if end == heading:
+                fresh = has_content(fresh_from, end)
+                if not fresh:
+                    # Do not carry the previous section's overlap into this one
+                    start += carried
+                    carried = 0
+                new_section = fresh and tokens_before[end] - tokens_before[start] >= self.min_tokens
+                cut = start < end and (
+                    new_section or tokens_before[end + 1] - tokens_before[start] > self.chunk_tokens
+                )
+                heading = next(next_heading, len(segments))
+            else:
+                # The first segment before the next heading that does not fit
+                limit = tokens_before[start] + self.chunk_tokens
+                overflow = bisect_right(tokens_before, limit, lo=end + 1, hi=heading + 1) - 1
+                if overflow >= heading:
+                    end = heading
+                    continue
+                end, fresh, new_section = overflow, has_content(fresh_from, overflow), False
+                cut = start < end
+            if cut:
+                if fresh:
+                    emit(start, end)
+                fresh_from = end
+                if new_section:
+                    start = end
+                # Keep whole trailing segments as overlap, as long as they
+                # leave room for the next one
+                floor = max(
+                    tokens_before[end] - self.overlap_tokens, tokens_before[end + 1] - self.chunk_tokens
+                )
+                start = bisect_left(tokens_before, floor, lo=start, hi=end)
+                carried = end - start
+            end += 1
+        if has_content(fresh_from, len(segments)):
+            emit(start, len(segments))
+        return chunks
+
+    def _segments(self, text: str) -> tuple[list[str], list[float], list[int], set[int]]:
+        """Segments (sentences and Markdown blocks, cut if longer than the
+        budget), their tokens, their offsets in `text` (plus its length) and
+        the indexes of the heading segments. The segments give back `text`."""
+        segments = list(filter(None, SEGMENT.findall(text)))
+        sizes = list(map(self.count_tokens, segments))
+        offsets = list(accumulate(map(len, segments), initial=0))
+
+        # (start, end) of the heading segments. Only lines with a `#` can be
+        # headings, so each of them is looked at once
+        spans: list[tuple[int, int]] = []
+        pos = text.find("#")
+        while pos != -1:
+            line = text.rfind("\n", 0, pos) + 1
+            match = HEADING.match(text, line)
+            # Not a heading inside a code block
+            if match and offsets[bisect_left(offsets, line)] == line:
+                spans.append((line, match.end()))
+            end_of_line = text.find("\n", pos)
+            pos = text.find("#", end_of_line) if end_of_line != -1 else -1
+
+        if max(sizes, default=0) > self.chunk_tokens:
+            cut_segments, cut_sizes, done = [], [], 0
+            for i, size in enumerate(sizes):
+                if size > self.chunk_tokens:
+                    cut_segments += segments[done:i]
+                    cut_sizes += sizes[done:i]
+                    for part, part_size in self._cut(segments[i], size):
+                        cut_segments.append(part)
+                        cut_sizes.append(part_size)
+                    done = i + 1
+            segments, sizes = cut_segments + segments[done:], cut_sizes + sizes[done:]
+            offsets = list(accumulate(map(len, segments), initial=0))
+
+        headings: set[int] = set()
+        for line, end in spans:
+            # Every part of the heading, if it was cut
+            i = bisect_left(offsets, line)
+            while offsets[i] < end:
+                headings.add(i)
+                i += 1
+        return segments, sizes, offsets, headings
+
+    def _cut(self, segment: str, size: float) -> Iterator[tuple[str, float]]:
+        """Cut an over-long segment into parts within the budget."""
+        step = max(1, int(len(segment) * self.chunk_tokens / size))
+        start = 0
+        while start < len(segment):
+            end = min(len(segment), start + step)
+            while True:
+                if end < len(segment):
+                    # Prefer a soft break in the second half of the window
+                    for i in range(end - 1, start + (end - start) // 2, -1):
+                        if SOFT_BREAK.match(segment[i]):
+                            end = i + 1
+                            break
+                part = segment[start:end]
+                part_size = self.count_tokens(part)
+                # Mixed scripts are not spread evenly: shrink until it fits
+                if part_size <= self.chunk_tokens or end - start == 1:
+                    break
+                end = start + max(1, (end - start) * 3 // 4)
+            yield part, part_size
+            start = end
+
+
+def get_splitter() -> TextSplitter:
+    """The splitter configured in `.env` (`RAG_SPLITTER`, default characters)."""
+    kind = os.getenv("RAG_SPLITTER", "characters").strip().lower()
+    if kind == "characters":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=int(os.getenv("RAG_CHUNK_SIZE", "500")),
+            chunk_overlap=int(os.getenv("RAG_CHUNK_OVERLAP", "50")),
+        )
+    if kind == "tokens":
+        tokenizer = os.getenv("RAG_TOKENIZER", "estimate").strip().lower()
+        return TokenAwareSplitter(
+            chunk_tokens=int(os.getenv("RAG_CHUNK_TOKENS", "256")),
+            overlap_tokens=int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "32")),
+            count_tokens=tiktoken_counter() if tokenizer == "tiktoken" else estimate_tokens,
+        )
+    raise ValueError(f"RAG_SPLITTER must be one of {', '.join(SPLITTERS)}, got '{kind}'")
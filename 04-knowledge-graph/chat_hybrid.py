@@ -0,0 +1,306 @@
+"""
+Hybrid chat: vector search and knowledge graph for every question, concurrently.
+
+For each question two branches run at the same time:
+- vector: similarity search in the HanaDB table of 03-cli-embedding (HANA_TABLE_NAME)
+- graph: entity linking, SPARQL generation (checked and repaired locally) and
+  SPARQL_TABLE execution, as in chat_kg.py
+
+Each branch has its own timeout (HYBRID_VECTOR_TIMEOUT, HYBRID_KG_TIMEOUT), so
+a slow branch cannot stall the answer: whatever arrived in time is merged into
+one context of at most HYBRID_CONTEXT_TOKENS tokens, and the LLM answers from it.
+A branch that timed out keeps running in the background; until it returns,
+later questions skip that branch (status "busy") instead of piling up behind it.
+
+Usage:
+    uv run chat_hybrid.py [--verbose]
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import load_dotenv
+from langchain_hana import HanaDB, HanaRdfGraph
+from workshop_common.hana import get_pool
+from workshop_common.llm import get_llm, warm_up
+from workshop_common.ratelimit import estimate_tokens
+
+# The vector branch reads the table of 03-cli-embedding with its store factory
+sys.path.append(str(Path(__file__).resolve().parents[1] / "03-cli-embedding"))
+import chat_rag  # noqa: E402
+
+from chat_kg import (
+    BASE_URI,
+    ENTITY_LINKING,
+    GRAPH_URI,
+    SPARQL_CHECK,
+    execute_sparql_select,
+    format_results_for_llm,
+    generate_sparql,
+    load_label_index,
+)
+from label_index import LabelIndex
+from sparql_check import SchemaVocabulary, SparqlCheckStats
+
+# Load shared configuration from repo root .env
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
+MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
+TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "You are a helpful assistant.")
+TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+# Seconds each branch may take, counted from the question
+VECTOR_TIMEOUT = float(os.getenv("HYBRID_VECTOR_TIMEOUT", "5"))
+KG_TIMEOUT = float(os.getenv("HYBRID_KG_TIMEOUT", "15"))
+# Estimated tokens of graph facts plus document excerpts in the prompt
+CONTEXT_TOKENS = int(os.getenv("HYBRID_CONTEXT_TOKENS", "3000"))
+
+ANSWER_PROMPT = """{system}
+
+Answer the question from the context below. Knowledge graph facts are exact
+relationships between entities; document excerpts add details and wording.
+If the two disagree, say so.
+
+Knowledge graph facts:
+{facts}
+
+Document excerpts:
+{excerpts}
+
+User: {question}
+"""
+
+
+@dataclass
+class BranchResult:
+    name: str
+    items: list[str] = field(default_factory=list)
+    # ok | empty | timeout | busy | off | error: ...
+    status: str = "ok"
+    ms: float = 0.0
+    # The SPARQL query of the graph branch
+    detail: str = ""
+
+    def format(self) -> str:
+        return f"{self.name}: {self.status}, {len(self.items)} items in {self.ms:.0f} ms"
+
+
+def fit(items: list[str], budget: float) -> tuple[list[str], float]:
+    """Leading items (in rank order) that fit into the token budget."""
+    taken, used = [], 0.0
+    for item in items:
+        tokens = estimate_tokens(item)
+        if used + tokens > budget:
+            break
+        taken.append(item)
+        used += tokens
+    return taken, used
+
+
+def merge_context(facts: list[str], excerpts: list[str], budget: int) -> tuple[list[str], list[str], float]:
+    """Split the budget between graph facts and document excerpts: half each
+    if both have results, and what one side leaves unused goes to the other."""
+    share = budget / 2 if facts and excerpts else budget
+    kept_facts, fact_tokens = fit(facts, share)
+    kept_excerpts, excerpt_tokens = fit(excerpts, budget - fact_tokens)
+    if len(kept_facts) < len(facts):
+        kept_facts, fact_tokens = fit(facts, budget - excerpt_tokens)
+    return kept_facts, kept_excerpts, fact_tokens + excerpt_tokens
+
+
+class HybridRetriever:
+    """Runs the vector and the graph branch of a question concurrently."""
+
+    def __init__(
+        self,
+        llm,
+        schema_text: str,
+        vocabulary: SchemaVocabulary | None,
+        label_index: LabelIndex | None,
+        vector_timeout: float = VECTOR_TIMEOUT,
+        kg_timeout: float = KG_TIMEOUT,
+    ) -> None:
+        self.llm = llm
+        self.schema_text = schema_text
+        self.vocabulary = vocabulary
+        self.label_index = label_index
+        self.vector_timeout = vector_timeout
+        self.kg_timeout = kg_timeout
+        self.check_stats = SparqlCheckStats()
+        self.statuses: Counter[str] = Counter()
+        # The last run of each branch; a new one starts when it has returned
+        self._running: dict[str, Future] = {}
+        # The vector store (one pooled connection), opened on first use and
+        # closed by close(), or by the branch using it if that is later
+        self._store: HanaDB | None = None
+        self._store_busy = False
+        self._closed = False
+        self._resources = ExitStack()
+        self._lock = threading.Lock()
+
+    def retrieve(self, question: str) -> tuple[BranchResult, BranchResult]:
+        start = time.perf_counter()
+        vector = self._start("vector", self._search_documents, question)
+        # Without a schema (empty or missing graph) SPARQL generation is guesswork
+        graph = self._start("graph", self._query_graph, question) if self.schema_text else None
+        results = (
+            self._wait(vector, "vector", start + self.vector_timeout, start),
+            self._wait(graph, "graph", start + self.kg_timeout, start)
+            if graph is not None
+            else BranchResult("graph", status="off"),
+        )
+        for result in results:
+            self.statuses[f"{result.name} {result.status.split(':')[0]}"] += 1
+        return results
+
+    def close(self) -> None:
+        """Return the connection of the vector store to the pool. Branches
+        still running after their timeout are not waited for."""
+        with self._lock:
+            self._closed = True
+            if not self._store_busy:
+                self._resources.close()
+
+    def _start(self, name: str, branch, question: str) -> Future | BranchResult:
+        """Run a branch on its own daemon thread, so abandoned runs neither
+        hold up later questions nor the exit; "busy" while the last one runs."""
+        with self._lock:
+            running = self._running.get(name)
+            if running is not None and not running.done():
+                return BranchResult(name, status="busy")
+            future: Future = Future()
+            self._running[name] = future
+
+        def run() -> None:
+            try:
+                future.set_result(branch(question))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"hybrid-{name}", daemon=True).start()
+        return future
+
+    def _wait(self, future: Future | BranchResult, name: str, deadline: float, start: float) -> BranchResult:
+        if isinstance(future, BranchResult):
+            return future
+        try:
+            return future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeout:
+            return BranchResult(name, status="timeout", ms=(time.perf_counter() - start) * 1000)
+        except Exception as e:
+            return BranchResult(name, status=f"error: {e}", ms=(time.perf_counter() - start) * 1000)
+
+    def _search_documents(self, question: str) -> BranchResult:
+        start = time.perf_counter()
+        with self._lock:
+            if self._closed:
+                return BranchResult("vector", status="off")
+            self._store_busy = True
+        try:
+            if self._store is None:
+                self._store = self._resources.enter_context(chat_rag.open_vector_store())
+            docs = self._store.similarity_search(question, k=TOP_K)
+        finally:
+            with self._lock:
+                self._store_busy = False
+                if self._closed:
+                    self._resources.close()
+        items = [doc.page_content for doc in docs]
+        return BranchResult("vector", items, "ok" if items else "empty", (time.perf_counter() - start) * 1000)
+
+    def _query_graph(self, question: str) -> BranchResult:
+        start = time.perf_counter()
+        links = self.label_index.link(question) if self.label_index is not None else []
+        sparql = generate_sparql(self.llm, question, self.schema_text, self.vocabulary, self.check_stats, links=links)
+        with get_pool().connection() as connection:
+            results = execute_sparql_select(connection, sparql)
+        items = format_results_for_llm(results).splitlines() if results else []
+        return BranchResult(
+            "graph", items, "ok" if items else "empty", (time.perf_counter() - start) * 1000, detail=sparql
+        )
+
+
+def build_prompt(question: str, facts: list[str], excerpts: list[str], graph: BranchResult, vector: BranchResult) -> str:
+    return ANSWER_PROMPT.format(
+        system=SYSTEM_PROMPT,
+        facts="\n".join(facts) if facts else f"(none: {graph.status})",
+        excerpts="\n\n---\n\n".join(excerpts) if excerpts else f"(none: {vector.status})",
+        question=question,
+    )
+
+
+def main() -> None:
+    verbose = "--verbose" in sys.argv or "-v" in sys.argv
+
+    # Optional (LLM_WARM_UP): authenticate against AI Core while HANA connects
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+
+    print(f"Connecting to HANA (vector table and graph <{GRAPH_URI}>)...")
+    schema_text, schema, label_index = "", None, None
+    with get_pool().connection() as connection:
+        try:
+            graph = HanaRdfGraph(connection=connection, graph_uri=GRAPH_URI, auto_extract_ontology=True)
+            schema = graph.get_schema
+            schema_text = schema.serialize(format="turtle") if schema else ""
+            if schema_text and ENTITY_LINKING:
+                label_index = load_label_index(connection)
+        except Exception as e:
+            print(f"Warning: Could not load the graph schema, answers use documents only: {e}")
+    vocabulary = SchemaVocabulary.from_schema(schema, {"ex": BASE_URI}) if SPARQL_CHECK else None
+
+    print(f"Initializing LLM ({MODEL})...")
+    llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    retriever = HybridRetriever(llm, schema_text, vocabulary, label_index)
+    if verbose:
+        print(
+            f"\n[Timeouts: vector {retriever.vector_timeout:g} s, graph {retriever.kg_timeout:g} s; "
+            f"context budget {CONTEXT_TOKENS} tokens]"
+        )
+
+    print("\nHybrid Chat (documents + knowledge graph)")
+    print("=" * 40)
+    print("Press Enter with empty input to exit.\n")
+
+    try:
+        while True:
+            try:
+                question = input("You: ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if not question:
+                break
+
+            vector, graph = retriever.retrieve(question)
+            facts, excerpts, tokens = merge_context(graph.items, vector.items, CONTEXT_TOKENS)
+            if verbose:
+                if graph.detail:
+                    print(f"\n[Generated SPARQL]:\n{graph.detail}\n")
+                print(f"[{vector.format()} | {graph.format()}]")
+                print(
+                    f"[context: {len(facts)}/{len(graph.items)} facts, {len(excerpts)}/{len(vector.items)} "
+                    f"excerpts, ~{tokens:.0f}/{CONTEXT_TOKENS} tokens]"
+                )
+
+            print("Assistant: ", end="", flush=True)
+            for chunk in llm.stream(build_prompt(question, facts, excerpts, graph, vector)):
+                print(getattr(chunk, "content", str(chunk)), end="", flush=True)
+            print("\n")
+    finally:
+        retriever.close()
+    print("Goodbye!")
+    if verbose:
+        print(f"[branches: {', '.join(f'{k} {v}' for k, v in sorted(retriever.statuses.items()))}]")
+        print(f"[{retriever.check_stats.format()}]")
+        print(f"[{get_pool().metrics().format()}]")
+
+
+if __name__ == "__main__":
+    main()
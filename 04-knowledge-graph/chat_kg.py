@@ -3,6 +3,8 @@ Chat with SAP HANA Knowledge Graph using natural language.
 
 Uses a two-step approach:
 1. LLM generates SPARQL from natural language question
+   (entity mentions linked to exact URIs first, see label_index.py; the query is
+   checked locally against the schema and repaired if needed, see sparql_check.py)
 2. Execute SPARQL and format results
 3. LLM formulates natural language answer from cleaned results
 
@@ -16,8 +18,13 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 from hdbcli import dbapi
-from gen_ai_hub.proxy.langchain.init_models import init_llm
 from langchain_hana import HanaRdfGraph
+from workshop_common.hana import get_pool
+from workshop_common.llm import get_llm, stats as llm_stats, warm_up
+from workshop_common.ratelimit import all_metrics
+
+from label_index import EntityLink, LabelIndex
+from sparql_check import SchemaVocabulary, SparqlCheckStats, check_sparql
 
 # Load shared configuration from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -27,6 +34,14 @@ MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 GRAPH_URI = os.getenv("KG_GRAPH_URI", "WORKSHOP_KG")
 BASE_URI = "http://workshop.example.org/"
+# Local check of generated SPARQL before it is sent to HANA, and how many
+# repair prompts an invalid query gets (0 = only report the problems)
+SPARQL_CHECK = os.getenv("KG_SPARQL_CHECK", "1").lower() in ("1", "true", "yes")
+SPARQL_REPAIRS = int(os.getenv("KG_SPARQL_REPAIRS", "2"))
+# Link entity mentions in the question to exact URIs (label index loaded
+# once per session), and the minimum trigram similarity of a link
+ENTITY_LINKING = os.getenv("KG_ENTITY_LINKING", "1").lower() in ("1", "true", "yes")
+LINK_THRESHOLD = float(os.getenv("KG_LINK_THRESHOLD", "0.8"))
 
 # Prompt for generating SPARQL from natural language
 SPARQL_GENERATION_PROMPT = """Given the following RDF schema, generate a SPARQL SELECT query to answer the user's question.
@@ -38,14 +53,38 @@ Rules:
 - Use PREFIX ex: <http://workshop.example.org/>
 - Always include FROM <{graph_uri}> clause
 - Select human-readable labels (rdfs:label) when available
-- Use CONTAINS() or REGEX() for partial string matching on labels, not exact equality
+- For entities listed under "Linked entities", use their exact URIs and do not match their labels
+- For other entities, use CONTAINS() or REGEX() for partial string matching on labels, not exact equality
 - When looking for "all products", use UNION to combine multiple product relationships (offers_product, develops, etc.)
 - Return only the SPARQL query, no explanation
 
-User question: {question}
+{linked_entities}User question: {question}
 
 SPARQL query:"""
 
+# Prompt for fixing a generated query that failed the local check
+SPARQL_REPAIR_PROMPT = """The SPARQL query below was generated for the user's question, but it has problems.
+Fix exactly these problems and keep the rest of the query unchanged.
+
+Schema (Turtle format):
+{schema}
+
+User question: {question}
+
+Query:
+{sparql}
+
+Problems:
+{problems}
+
+Rules:
+- Use PREFIX ex: <http://workshop.example.org/>
+- Always include FROM <{graph_uri}> clause
+- Only use predicates and classes that occur in the schema
+- Return only the corrected SPARQL query, no explanation
+
+Corrected SPARQL query:"""
+
 # Prompt for formulating answer from query results
 ANSWER_PROMPT = """Answer the user's question based on the data below.
 
@@ -62,18 +101,6 @@ Instructions:
 Answer:"""
 
 
-def get_connection() -> dbapi.Connection:
-    """Create a connection to SAP HANA Cloud."""
-    return dbapi.connect(
-        address=os.getenv("HANA_DB_ADDRESS"),
-        port=int(os.getenv("HANA_DB_PORT", "443")),
-        user=os.getenv("HANA_DB_USER"),
-        password=os.getenv("HANA_DB_PASSWORD"),
-        autocommit=True,
-        sslValidateCertificate=False,
-    )
-
-
 def clean_uri(value: str) -> str:
     """Remove URI prefixes to get clean values for LLM."""
     if isinstance(value, str):
@@ -94,6 +121,80 @@ def extract_sparql(response: str) -> str:
     return response.strip()
 
 
+def load_label_index(connection: dbapi.Connection) -> LabelIndex:
+    """Trigram index over all entity labels of the graph (one SPARQL query)."""
+    sparql = (
+        "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> "
+        f"SELECT ?s ?label FROM <{GRAPH_URI}> WHERE {{ ?s rdfs:label ?label . FILTER(isIRI(?s)) }}"
+    )
+    cursor = connection.cursor()
+    try:
+        escaped = sparql.replace("'", "''")
+        cursor.execute(f"SELECT * FROM SPARQL_TABLE('{escaped}')")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return LabelIndex([(str(uri), str(label)) for uri, label in rows if uri and label], LINK_THRESHOLD)
+
+
+def format_links(links: list[EntityLink]) -> str:
+    """The "Linked entities" section of the SPARQL generation prompt."""
+    if not links:
+        return ""
+    lines = ["Linked entities (mention in the question -> exact URI):"]
+    for link in links:
+        uris = " or ".join(f"<{uri}>" for uri in link.uris)
+        lines.append(f'- "{link.mention}" -> {uris} (label "{link.label}")')
+    return "\n".join(lines) + "\n\n"
+
+
+def generate_sparql(
+    llm,
+    question: str,
+    schema_text: str,
+    vocabulary: SchemaVocabulary | None,
+    stats: SparqlCheckStats,
+    verbose: bool = False,
+    links: list[EntityLink] | None = None,
+) -> str:
+    """Generate a SELECT query for the question; with a vocabulary, check it
+    locally and let the LLM repair it (up to SPARQL_REPAIRS times)."""
+    prompt = SPARQL_GENERATION_PROMPT.format(
+        schema=schema_text, graph_uri=GRAPH_URI, linked_entities=format_links(links or []), question=question
+    )
+    sparql = extract_sparql(llm.invoke(prompt).content)
+    if vocabulary is None:
+        return sparql
+
+    stats.queries += 1
+    problems = check_sparql(sparql, GRAPH_URI, vocabulary)
+    if problems:
+        stats.invalid += 1
+    for _ in range(SPARQL_REPAIRS):
+        if not problems:
+            break
+        if verbose:
+            print(f"\n[SPARQL check failed]:\n{sparql}\n" + "\n".join(f"  - {p}" for p in problems))
+        repair_prompt = SPARQL_REPAIR_PROMPT.format(
+            schema=schema_text,
+            question=question,
+            sparql=sparql,
+            problems="\n".join(f"- {p}" for p in problems),
+            graph_uri=GRAPH_URI,
+        )
+        sparql = extract_sparql(llm.invoke(repair_prompt).content)
+        stats.repair_calls += 1
+        problems = check_sparql(sparql, GRAPH_URI, vocabulary)
+        if not problems:
+            stats.repaired += 1
+    if problems:
+        # HANA has the final word: the check may reject HANA-specific syntax
+        stats.sent_invalid += 1
+        if verbose:
+            print("[SPARQL still fails the check, sending it anyway]:\n" + "\n".join(f"  - {p}" for p in problems))
+    return sparql
+
+
 def execute_sparql_select(connection: dbapi.Connection, sparql: str) -> list[dict]:
     """Execute a SPARQL SELECT query and return results as list of dicts."""
     cursor = connection.cursor()
@@ -149,9 +250,17 @@ def format_results_for_llm(results: list[dict]) -> str:
 def main() -> None:
     verbose = "--verbose" in sys.argv or "-v" in sys.argv
     
+    # Optional (LLM_WARM_UP): authenticate against AI Core while HANA connects
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+
     print(f"Connecting to HANA Knowledge Graph <{GRAPH_URI}>...")
-    connection = get_connection()
-    
+    # Held for the whole chat session; the pool reconnects it if HANA drops
+    # the session while the user is idle.
+    with get_pool().connection() as connection:
+        chat(connection, verbose)
+
+
+def chat(connection: dbapi.Connection, verbose: bool) -> None:
     # Create the RDF graph instance with auto-extracted ontology
     graph = HanaRdfGraph(
         connection=connection,
@@ -160,7 +269,7 @@ def main() -> None:
     )
     
     print(f"Initializing LLM ({MODEL})...")
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
     
     if verbose:
         print("\n[Verbose mode enabled - will show generated SPARQL queries]")
@@ -172,6 +281,7 @@ def main() -> None:
     
     # Get schema for SPARQL generation
     schema_text = ""
+    schema = None
     try:
         schema = graph.get_schema
         if schema:
@@ -186,6 +296,20 @@ def main() -> None:
     except Exception as e:
         print(f"Warning: Could not load schema: {e}")
         print("The graph might be empty. Run ingest_kg.py first.\n")
+
+    # Vocabulary for the local check of generated queries
+    vocabulary = SchemaVocabulary.from_schema(schema, {"ex": BASE_URI}) if SPARQL_CHECK else None
+    check_stats = SparqlCheckStats()
+
+    # Entity linking: labels are read once here instead of scanned per question
+    label_index = None
+    if ENTITY_LINKING and schema_text:
+        try:
+            label_index = load_label_index(connection)
+            if verbose:
+                print(f"[Label index: {len(label_index)} labels]\n")
+        except Exception as e:
+            print(f"Warning: Could not load entity labels, questions are not linked: {e}\n")
     
     while True:
         try:
@@ -199,14 +323,14 @@ def main() -> None:
             break
         
         try:
-            # Step 1: Generate SPARQL from question
-            sparql_prompt = SPARQL_GENERATION_PROMPT.format(
-                schema=schema_text,
-                graph_uri=GRAPH_URI,
-                question=user_input
-            )
-            sparql_response = llm.invoke(sparql_prompt)
-            sparql = extract_sparql(sparql_response.content)
+            # Step 1: Link entity mentions, generate SPARQL from question
+            # (checked and repaired locally)
+            links = label_index.link(user_input) if label_index is not None else []
+            if verbose and links:
+                print("\n[Linked entities]:")
+                for link in links:
+                    print(f"  {link.mention} -> {', '.join(link.uris)} (score {link.score})")
+            sparql = generate_sparql(llm, user_input, schema_text, vocabulary, check_stats, verbose, links)
             
             if verbose:
                 print(f"\n[Generated SPARQL]:\n{sparql}\n")
@@ -238,6 +362,14 @@ def main() -> None:
                 traceback.print_exc()
             print("Try rephrasing your question or check if data has been ingested.\n")
 
+    if verbose:
+        if vocabulary is not None:
+            print(f"[{check_stats.format()}]")
+        print(f"[{get_pool().metrics().format()}]")
+        print(f"[{llm_stats().format()}]")
+        for metrics in all_metrics():
+            print(f"[{metrics.format()}]")
+
 
 if __name__ == "__main__":
     main()
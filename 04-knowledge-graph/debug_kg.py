@@ -3,27 +3,21 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from hdbcli import dbapi
+from workshop_common.hana import get_pool
 
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
 GRAPH_URI = os.getenv("KG_GRAPH_URI", "WORKSHOP_KG")
 
 
-def get_connection() -> dbapi.Connection:
-    return dbapi.connect(
-        address=os.getenv("HANA_DB_ADDRESS"),
-        port=int(os.getenv("HANA_DB_PORT", "443")),
-        user=os.getenv("HANA_DB_USER"),
-        password=os.getenv("HANA_DB_PASSWORD"),
-        autocommit=True,
-        sslValidateCertificate=False,
-    )
-
-
 def main() -> None:
     print(f"Querying graph <{GRAPH_URI}>...\n")
-    connection = get_connection()
+    with get_pool().connection() as connection:
+        print_triples(connection)
+
+
+def print_triples(connection) -> None:
+    """Print every triple of the graph with shortened URIs."""
     cursor = connection.cursor()
     
     # Query all triples in the graph
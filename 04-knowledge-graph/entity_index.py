@@ -0,0 +1,281 @@
+"""Entity resolution across ingestions for `ingest_kg.py`.
+
+The extraction LLM picks an `id` for every entity, and it does not pick the
+same one every time: one document yields `maria_chen`, the next
+`dr_maria_chen`. Both become separate nodes, and every query has to join
+over the duplicates. `EntityIndex` maps each extracted entity to a canonical
+id before its triples are built:
+
+1. **Exact keys** (hash lookup): the normalised name, the normalised id and
+   every alias seen so far, per entity type. Normalising folds case and
+   width (NFKC), drops punctuation, titles (`Dr.`, `Prof.`) and company
+   suffixes (`Inc.`, `GmbH`), so `Dr. Maria Chen` and `maria_chen` share the
+   key `maria chen`. The product `CloudSync` and the company `CloudSync Inc.`
+   share a key too, but not a type, so they stay apart.
+2. **Blocking**: otherwise only entities that share a pair of name tokens
+   are compared (one indexed lookup per pair, at most `MAX_BLOCK` each), and
+   one of the same type whose tokens contain the other's (`Maria L. Chen`)
+   is a match.
+3. **Embeddings** (optional): entities of the same type that share a single
+   token and whose name embeddings have a cosine similarity of at least
+   `embedding_threshold` (`Bob Smith` / `Robert Smith`).
+
+Every name that resolved to an entity becomes one of its aliases, so the
+next lookup of it is exact. The index lives in SQLite (`KG_ENTITY_INDEX`,
+one row per key or block entry with B-tree indexes), so it does not have to
+fit into memory, and lookups stay fast at hundreds of thousands of entities.
+"""
+import math
+import re
+import sqlite3
+import struct
+import unicodedata
+from dataclasses import dataclass
+from itertools import combinations
+from pathlib import Path
+from typing import Callable
+
+TITLES = {"dr", "mr", "mrs", "ms", "miss", "prof", "professor", "sir", "dame"}
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "llc", "plc", "gmbh", "ag", "sa", "se", "bv", "kk",
+}
+# Block entries read per block; common ones ("john") are capped
+MAX_BLOCK = 500
+# Longer names only get the pair blocks of their first tokens
+MAX_PAIR_TOKENS = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    graph TEXT NOT NULL, id TEXT NOT NULL, name TEXT NOT NULL, type TEXT NOT NULL,
+    vector BLOB, PRIMARY KEY (graph, id)
+);
+CREATE TABLE IF NOT EXISTS keys (
+    graph TEXT NOT NULL, key TEXT NOT NULL, type TEXT NOT NULL COLLATE NOCASE, id TEXT NOT NULL,
+    PRIMARY KEY (graph, key, type)
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    graph TEXT NOT NULL, block TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (graph, block, id)
+);
+"""
+# Index files written before keys had a type: take it from the entity
+MIGRATE_KEYS = """
+ALTER TABLE keys RENAME TO keys_untyped;
+CREATE TABLE keys (
+    graph TEXT NOT NULL, key TEXT NOT NULL, type TEXT NOT NULL COLLATE NOCASE, id TEXT NOT NULL,
+    PRIMARY KEY (graph, key, type)
+);
+INSERT OR IGNORE INTO keys (graph, key, type, id)
+    SELECT k.graph, k.key, e.type, k.id FROM keys_untyped k JOIN entities e ON e.graph = k.graph AND e.id = k.id;
+DROP TABLE keys_untyped;
+"""
+
+
+def normalize(text: str) -> str:
+    """Lowercase words of a name or id without titles and company suffixes."""
+    text = unicodedata.normalize("NFKC", text).lower().replace("_", " ")
+    words = re.findall(r"\w+", text)
+    while len(words) > 1 and words[0] in TITLES:
+        words.pop(0)
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def tokens(key: str) -> set[str]:
+    """Tokens used for blocking; single Latin letters (initials) are ignored."""
+    return {t for t in key.split() if len(t) > 1 or not t.isascii()}
+
+
+def pairs(name_tokens: set[str]) -> list[str]:
+    """Token-pair blocks of a name (its first MAX_PAIR_TOKENS tokens)."""
+    ordered = sorted(name_tokens)[:MAX_PAIR_TOKENS]
+    return [f"{a} {b}" for a, b in combinations(ordered, 2)]
+
+
+@dataclass
+class ResolutionStats:
+    exact: int = 0
+    blocked: int = 0
+    embedding: int = 0
+    new: int = 0
+
+    def format(self) -> str:
+        resolved = self.exact + self.blocked + self.embedding
+        return (
+            f"entity resolution: {resolved} resolved ({self.exact} exact, {self.blocked} by tokens, "
+            f"{self.embedding} by embedding), {self.new} new"
+        )
+
+
+class EntityIndex:
+    """Persistent map from entity names, ids and aliases to canonical ids."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        graph: str,
+        embed: Callable[[list[str]], list[list[float]]] | None = None,
+        embedding_threshold: float = 0.92,
+    ) -> None:
+        self.graph = graph
+        self.embed = embed
+        self.embedding_threshold = embedding_threshold
+        self.stats = ResolutionStats()
+        # Extracted id -> canonical id, for the relationships of this run
+        self.mapping: dict[str, str] = {}
+        self._db = sqlite3.connect(str(path))
+        self._db.executescript(SCHEMA)
+        if "type" not in {row[1] for row in self._db.execute("PRAGMA table_info(keys)")}:
+            self._db.executescript(MIGRATE_KEYS)
+
+    def clear(self) -> None:
+        """Forget all entities of the graph (when the graph is cleared)."""
+        for table in ("entities", "keys", "blocks"):
+            self._db.execute(f"DELETE FROM {table} WHERE graph = ?", (self.graph,))
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entities WHERE graph = ?", (self.graph,)).fetchone()[0]
+
+    def resolve(self, entity: dict) -> dict:
+        """The entity with its canonical id (registered if it is new)."""
+        names = [entity["name"], entity["id"], *entity.get("aliases", [])]
+        keys = [k for k in dict.fromkeys(normalize(n) for n in names) if k]
+        entity_type = str(entity.get("type", ""))
+        vector = None
+        canonical = self._lookup_keys(keys, entity_type)
+        if canonical is not None:
+            self.stats.exact += 1
+        else:
+            if self.embed is not None:
+                vector = self.embed([f"{entity.get('type', '')}: {entity['name']}"])[0]
+            canonical = self._lookup_blocks(entity, keys[0] if keys else "", vector)
+        if canonical is None:
+            canonical = self._register(entity, vector)
+            self.stats.new += 1
+        self._add_keys(keys, entity_type, canonical)
+        self.mapping[entity["id"]] = canonical
+        return {**entity, "id": canonical}
+
+    def resolve_knowledge(self, knowledge: dict) -> dict:
+        """Entities with canonical ids (duplicates merged) and relationships
+        pointing to them."""
+        entities: dict[str, dict] = {}
+        for entity in knowledge.get("entities", []):
+            resolved = self.resolve(entity)
+            entities.setdefault(resolved["id"], resolved)
+        self._db.commit()
+        return {
+            "entities": list(entities.values()),
+            "relationships": [self.resolve_relationship(r) for r in knowledge.get("relationships", [])],
+        }
+
+    def resolve_relationship(self, rel: dict) -> dict:
+        obj = rel["object"]
+        return {
+            **rel,
+            "subject": self.mapping.get(rel["subject"], rel["subject"]),
+            "object": self.mapping.get(obj, obj) if isinstance(obj, str) else obj,
+        }
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def _lookup_keys(self, keys: list[str], entity_type: str) -> str | None:
+        for key in keys:
+            row = self._db.execute(
+                "SELECT id FROM keys WHERE graph = ? AND key = ? AND type = ?", (self.graph, key, entity_type)
+            ).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def _lookup_blocks(self, entity: dict, key: str, vector: list[float] | None) -> str | None:
+        new_tokens = tokens(key)
+        entity_type = str(entity.get("type", ""))
+
+        # Token containment ("maria chen" in "maria l chen") needs two shared
+        # tokens, so only entities in the same token-pair blocks can match
+        for candidate_id, name in self._candidates(pairs(new_tokens), "name", entity_type):
+            other = tokens(normalize(name))
+            shorter, longer = sorted((new_tokens, other), key=len)
+            if len(shorter) >= 2 and shorter <= longer:
+                self.stats.blocked += 1
+                return candidate_id
+
+        # Embeddings: any entity sharing a single token ("bob smith", "robert smith")
+        if vector is not None:
+            best_id, best = None, self.embedding_threshold
+            for candidate_id, blob in self._candidates(sorted(new_tokens), "vector", entity_type):
+                if blob is not None:
+                    score = _cosine(vector, _unpack(blob))
+                    if score >= best:
+                        best_id, best = candidate_id, score
+            if best_id is not None:
+                self.stats.embedding += 1
+                return best_id
+        return None
+
+    def _candidates(self, blocks: list[str], column: str, entity_type: str) -> list[tuple[str, object]]:
+        """(id, column) of the entities of the same type in the given blocks."""
+        if not blocks:
+            return []
+        candidates: set[str] = set()
+        for block in blocks:
+            rows = self._db.execute(
+                "SELECT id FROM blocks WHERE graph = ? AND block = ? LIMIT ?", (self.graph, block, MAX_BLOCK)
+            ).fetchall()
+            candidates.update(row[0] for row in rows)
+        if not candidates:
+            return []
+        return self._db.execute(
+            f"SELECT id, {column} FROM entities WHERE graph = ? AND type = ? COLLATE NOCASE "
+            f"AND id IN ({','.join('?' * len(candidates))})",
+            (self.graph, entity_type, *candidates),
+        ).fetchall()
+
+    def _register(self, entity: dict, vector: list[float] | None) -> str:
+        canonical = entity["id"]
+        # Another entity already owns this id (e.g. same id, other type)
+        while self._db.execute(
+            "SELECT 1 FROM entities WHERE graph = ? AND id = ?", (self.graph, canonical)
+        ).fetchone():
+            canonical = f"{canonical}_{str(entity.get('type', 'entity')).lower()}"
+        self._db.execute(
+            "INSERT INTO entities (graph, id, name, type, vector) VALUES (?, ?, ?, ?, ?)",
+            (
+                self.graph, canonical, entity["name"], str(entity.get("type", "")),
+                _pack(vector) if vector is not None else None,
+            ),
+        )
+        name_tokens = tokens(normalize(entity["name"]))
+        self._db.executemany(
+            "INSERT OR IGNORE INTO blocks (graph, block, id) VALUES (?, ?, ?)",
+            [(self.graph, block, canonical) for block in [*name_tokens, *pairs(name_tokens)]],
+        )
+        return canonical
+
+    def _add_keys(self, keys: list[str], entity_type: str, canonical: str) -> None:
+        self._db.executemany(
+            "INSERT OR IGNORE INTO keys (graph, key, type, id) VALUES (?, ?, ?, ?)",
+            [(self.graph, key, entity_type, canonical) for key in keys],
+        )
+
+
+def _pack(vector: list[float]) -> bytes:
+    return struct.pack(f"<{len(vector)}f", *vector)
+
+
+def _unpack(blob: bytes) -> list[float]:
+    return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
@@ -6,15 +6,24 @@ then stores them as RDF triples in the HANA Knowledge Graph.
 
 Usage:
     uv run ingest_kg.py <text_file>
+    uv run ingest_kg.py <text_file> --stream   # write triples while the LLM is still generating
+    uv run ingest_kg.py <text_file> --append   # keep the graph, add this document to it
 """
 import json
 import os
 import sys
+import time
 from pathlib import Path
+from typing import Iterator
 
 from dotenv import load_dotenv
 from hdbcli import dbapi
-from gen_ai_hub.proxy.langchain.init_models import init_llm
+from workshop_common.hana import get_pool
+from workshop_common.llm import get_embedding_model, get_llm
+from workshop_common.ratelimit import all_metrics
+
+from entity_index import EntityIndex
+from kg_stream import ExtractionParser, TripleWriter
 
 # Load shared configuration from repo root .env
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
@@ -23,6 +32,13 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
 MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 GRAPH_URI = os.getenv("KG_GRAPH_URI", "WORKSHOP_KG")
+# Triples per INSERT DATA statement in --stream mode
+INSERT_BATCH_TRIPLES = int(os.getenv("KG_INSERT_BATCH_TRIPLES", "200"))
+# Entity resolution index (entity_index.py); "off" disables it
+ENTITY_INDEX = os.getenv("KG_ENTITY_INDEX", str(Path(__file__).resolve().parent / "entity_index.sqlite"))
+ENTITY_EMBEDDINGS = os.getenv("KG_ENTITY_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+BASE_URI = "http://workshop.example.org/"
+RDFS_LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
 
 # Prompt for extracting entities and relationships from text
 EXTRACTION_PROMPT = """Extract ALL entities and relationships from the following text.
@@ -33,6 +49,7 @@ Output a JSON object with two arrays:
    - "id": lowercase identifier with underscores (e.g., "maria_chen", "cloudsync")
    - "type": category (Person, Organization, Product, Location, etc.)
    - "name": the full name as it appears in the text
+   - "aliases": other names the text uses for it (optional, e.g. ["Maria", "Dr. Chen"])
 
 2. "relationships": Each relationship has:
    - "subject": entity id (must match an entity's id)
@@ -54,18 +71,6 @@ Text to analyze:
 Return ONLY valid JSON, no markdown formatting or explanation."""
 
 
-def get_connection() -> dbapi.Connection:
-    """Create a connection to SAP HANA Cloud."""
-    return dbapi.connect(
-        address=os.getenv("HANA_DB_ADDRESS"),
-        port=int(os.getenv("HANA_DB_PORT", "443")),
-        user=os.getenv("HANA_DB_USER"),
-        password=os.getenv("HANA_DB_PASSWORD"),
-        autocommit=True,
-        sslValidateCertificate=False,
-    )
-
-
 def extract_knowledge(llm, text: str) -> dict:
     """Use LLM to extract entities and relationships from text."""
     prompt = EXTRACTION_PROMPT.format(text=text)
@@ -81,41 +86,49 @@ def extract_knowledge(llm, text: str) -> dict:
     return json.loads(content)
 
 
-def build_sparql_insert(knowledge: dict, graph_uri: str) -> str:
-    """Convert extracted knowledge to SPARQL INSERT DATA statement."""
-    triples = []
-    base_uri = "http://workshop.example.org/"
-    
-    # Create entity triples
-    for entity in knowledge.get("entities", []):
-        entity_uri = f"<{base_uri}{entity['id']}>"
-        entity_type = f"<{base_uri}{entity['type']}>"
-        
-        # Type triple
-        triples.append(f"{entity_uri} a {entity_type} .")
-        # Label triple
-        escaped_name = entity["name"].replace('"', '\\"')
-        triples.append(f'{entity_uri} <http://www.w3.org/2000/01/rdf-schema#label> "{escaped_name}" .')
-    
-    # Create relationship triples
-    for rel in knowledge.get("relationships", []):
-        subject_uri = f"<{base_uri}{rel['subject']}>"
-        predicate_uri = f"<{base_uri}{rel['predicate']}>"
-        
-        # Check if object is an entity reference or a literal
-        obj = rel["object"]
-        if any(e["id"] == obj for e in knowledge.get("entities", [])):
-            # Object is an entity reference
-            object_value = f"<{base_uri}{obj}>"
-        else:
-            # Object is a literal value
-            escaped_obj = str(obj).replace('"', '\\"')
-            object_value = f'"{escaped_obj}"'
-        
-        triples.append(f"{subject_uri} {predicate_uri} {object_value} .")
-    
+def stream_knowledge(llm, text: str) -> Iterator[tuple[str, dict | None]]:
+    """Like `extract_knowledge`, but yield ("entities", entity) and
+    ("relationships", relationship) as soon as each one is complete, and
+    (key, None) when its array is closed."""
+    parser = ExtractionParser()
+    for chunk in llm.stream(EXTRACTION_PROMPT.format(text=text)):
+        yield from parser.feed(str(chunk.content))
+    if not parser.complete:
+        print("Warning: the extraction output is incomplete (LLM_MAX_TOKENS reached?); "
+              "keeping the complete entities and relationships.")
+
+
+def entity_triples(entity: dict) -> list[str]:
+    """Type and label triples of an extracted entity."""
+    entity_uri = f"<{BASE_URI}{entity['id']}>"
+    entity_type = f"<{BASE_URI}{entity['type']}>"
+    escaped_name = entity["name"].replace('"', '\\"')
+    return [
+        f"{entity_uri} a {entity_type} .",
+        f'{entity_uri} {RDFS_LABEL} "{escaped_name}" .',
+    ]
+
+
+def relationship_triple(rel: dict, entity_ids: set[str]) -> str:
+    """Triple of a relationship; the object is an entity if its id is known."""
+    subject_uri = f"<{BASE_URI}{rel['subject']}>"
+    predicate_uri = f"<{BASE_URI}{rel['predicate']}>"
+
+    obj = rel["object"]
+    if obj in entity_ids:
+        # Object is an entity reference
+        object_value = f"<{BASE_URI}{obj}>"
+    else:
+        # Object is a literal value
+        escaped_obj = str(obj).replace('"', '\\"')
+        object_value = f'"{escaped_obj}"'
+    return f"{subject_uri} {predicate_uri} {object_value} ."
+
+
+def insert_data(triples: list[str], graph_uri: str) -> str:
+    """SPARQL INSERT DATA statement for the given triples."""
     triples_str = "\n            ".join(triples)
-    
+
     return f"""INSERT DATA {{
         GRAPH <{graph_uri}> {{
             {triples_str}
@@ -123,6 +136,23 @@ def build_sparql_insert(knowledge: dict, graph_uri: str) -> str:
     }}"""
 
 
+def build_sparql_insert(knowledge: dict, graph_uri: str) -> str:
+    """Convert extracted knowledge to SPARQL INSERT DATA statement."""
+    triples = []
+    entities = knowledge.get("entities", [])
+    entity_ids = {e["id"] for e in entities}
+
+    # Create entity triples
+    for entity in entities:
+        triples.extend(entity_triples(entity))
+
+    # Create relationship triples
+    for rel in knowledge.get("relationships", []):
+        triples.append(relationship_triple(rel, entity_ids))
+
+    return insert_data(triples, graph_uri)
+
+
 def execute_sparql(connection: dbapi.Connection, sparql: str) -> None:
     """Execute a SPARQL update statement via SPARQL_EXECUTE."""
     cursor = connection.cursor()
@@ -156,9 +186,76 @@ def clear_graph(connection: dbapi.Connection, graph_uri: str) -> None:
         cursor.close()
 
 
+def open_entity_index() -> EntityIndex | None:
+    """The entity resolution index of the graph, or None if disabled."""
+    if ENTITY_INDEX.lower() in ("", "off", "0", "false"):
+        return None
+    embed = None
+    if ENTITY_EMBEDDINGS:
+        embed = get_embedding_model(os.getenv("LLM_EMBEDDING_MODEL", "text-embedding-3-small")).embed_documents
+    return EntityIndex(ENTITY_INDEX, GRAPH_URI, embed=embed)
+
+
+def ingest_streaming(llm, text: str, index: EntityIndex | None, append: bool) -> None:
+    """Extract and store at the same time: batches of triples are written on
+    a background thread while the LLM is still generating the rest."""
+    entities: list[dict] = []
+    relationships: list[dict] = []
+    # Canonical ids of the entities of this document
+    entity_ids: set[str] = set()
+    # Relationships seen before the entities list was complete
+    pending: list[dict] = []
+    entities_done = False
+
+    def triple(rel: dict) -> str:
+        return relationship_triple(index.resolve_relationship(rel) if index is not None else rel, entity_ids)
+
+    print(f"Connecting to HANA and streaming into graph <{GRAPH_URI}>...")
+    start = time.perf_counter()
+    with get_pool().connection() as connection:
+
+        def write_batch(batch: list[str]) -> None:
+            execute_sparql(connection, insert_data(batch, GRAPH_URI))
+
+        with TripleWriter(write_batch, INSERT_BATCH_TRIPLES) as writer:
+            if not append:
+                # Runs on the writer thread while the LLM processes the prompt
+                writer.submit(lambda: clear_graph(connection, GRAPH_URI))
+
+            for key, item in stream_knowledge(llm, text):
+                if key == "entities" and item is not None:
+                    entities.append(item)
+                    resolved = index.resolve(item) if index is not None else item
+                    merged = f" (was {item['id']})" if resolved["id"] != item["id"] else ""
+                    print(f"  - {resolved['id']} ({item['type']}): {item['name']}{merged}")
+                    if resolved["id"] not in entity_ids:
+                        entity_ids.add(resolved["id"])
+                        writer.add(entity_triples(resolved))
+                elif key == "entities":
+                    entities_done = True
+                    writer.add([triple(r) for r in pending])
+                    pending.clear()
+                elif key == "relationships" and item is not None:
+                    relationships.append(item)
+                    print(f"  - {item['subject']} --[{item['predicate']}]--> {item['object']}")
+                    if entities_done:
+                        writer.add([triple(item)])
+                    else:
+                        pending.append(item)
+            llm_seconds = time.perf_counter() - start
+            writer.add([triple(r) for r in pending])
+    total_seconds = time.perf_counter() - start
+
+    print(f"Extracted {len(entities)} entities and {len(relationships)} relationships.")
+    print(
+        f"LLM {llm_seconds:.2f} s, HANA {writer.db_seconds:.2f} s for {writer.batches} INSERT DATA "
+        f"batches ({writer.triples} triples), total {total_seconds:.2f} s"
+    )
+
+
 def main() -> None:
     if len(sys.argv) < 2:
-        print("Usage: uv run ingest_kg.py <text_file>")
+        print("Usage: uv run ingest_kg.py <text_file> [--stream] [--append]")
         print("  Extracts entities and relationships from text and stores them in HANA Knowledge Graph.")
         sys.exit(1)
     
@@ -171,36 +268,56 @@ def main() -> None:
     text = file_path.read_text(encoding="utf-8")
     
     print(f"Initializing LLM ({MODEL})...")
-    llm = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
-    
-    print("Extracting entities and relationships...")
-    knowledge = extract_knowledge(llm, text)
-    
-    entity_count = len(knowledge.get("entities", []))
-    rel_count = len(knowledge.get("relationships", []))
-    print(f"Extracted {entity_count} entities and {rel_count} relationships.")
-    
-    # Show extracted knowledge
-    print("\nEntities:")
-    for e in knowledge.get("entities", []):
-        print(f"  - {e['id']} ({e['type']}): {e['name']}")
-    
-    print("\nRelationships:")
-    for r in knowledge.get("relationships", []):
-        print(f"  - {r['subject']} --[{r['predicate']}]--> {r['object']}")
-    
-    print(f"\nConnecting to HANA and storing in graph <{GRAPH_URI}>...")
-    connection = get_connection()
-    
-    # Clear existing data in the graph (optional, for clean re-ingestion)
-    clear_graph(connection, GRAPH_URI)
-    
-    # Build and execute SPARQL INSERT
-    sparql = build_sparql_insert(knowledge, GRAPH_URI)
-    execute_sparql(connection, sparql)
+    llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+
+    # Without --append the graph is cleared, and so are its index entries
+    append = "--append" in sys.argv[2:]
+    index = open_entity_index()
+    if index is not None and not append:
+        index.clear()
+
+    if "--stream" in sys.argv[2:]:
+        print("Extracting entities and relationships (streaming)...")
+        ingest_streaming(llm, text, index, append)
+    else:
+        print("Extracting entities and relationships...")
+        knowledge = extract_knowledge(llm, text)
+
+        entity_count = len(knowledge.get("entities", []))
+        rel_count = len(knowledge.get("relationships", []))
+        print(f"Extracted {entity_count} entities and {rel_count} relationships.")
+
+        # Show extracted knowledge
+        print("\nEntities:")
+        for e in knowledge.get("entities", []):
+            print(f"  - {e['id']} ({e['type']}): {e['name']}")
+
+        print("\nRelationships:")
+        for r in knowledge.get("relationships", []):
+            print(f"  - {r['subject']} --[{r['predicate']}]--> {r['object']}")
+
+        # Map the extracted ids to canonical ones (across documents)
+        if index is not None:
+            knowledge = index.resolve_knowledge(knowledge)
+
+        print(f"\nConnecting to HANA and storing in graph <{GRAPH_URI}>...")
+        with get_pool().connection() as connection:
+            # Clear existing data in the graph (optional, for clean re-ingestion)
+            if not append:
+                clear_graph(connection, GRAPH_URI)
+
+            # Build and execute SPARQL INSERT
+            sparql = build_sparql_insert(knowledge, GRAPH_URI)
+            execute_sparql(connection, sparql)
+
+    if index is not None:
+        print(f"{index.stats.format()}; {len(index)} entities in the index")
+        index.close()
     
     print(f"\nSuccessfully ingested knowledge graph from {file_path}")
     print(f"Graph URI: {GRAPH_URI}")
+    for metrics in all_metrics():
+        print(f"[{metrics.format()}]")
 
 
 if __name__ == "__main__":
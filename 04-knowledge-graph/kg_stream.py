@@ -0,0 +1,148 @@
+"""Streaming extraction for `ingest_kg.py --stream`.
+
+Without streaming, ingestion is strictly sequential: wait for the complete
+LLM response, parse it, then write all triples. With streaming, the two
+overlap:
+
+- `ExtractionParser` reads the extraction JSON as the tokens arrive and
+  returns every entity and relationship object as soon as its closing brace
+  is seen (Markdown fences around the JSON are ignored).
+- `TripleWriter` collects the triples of those objects and writes them in
+  batches of `batch_size` on a background thread, on one HANA connection,
+  while the LLM keeps generating.
+
+Total time approaches max(LLM time, DB time) instead of their sum; only the
+last batch is written after generation ends.
+"""
+import json
+import threading
+import time
+from queue import Queue
+from typing import Callable
+
+
+class ExtractionParser:
+    """Incremental parser for `{"entities": [...], "relationships": [...]}`.
+
+    `feed()` returns `(array_key, object)` for every array element completed
+    by the new text, and `(array_key, None)` when an array closes. The parser
+    only tracks nesting and strings, so each character is looked at once.
+    """
+
+    def __init__(self) -> None:
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_chars: list[str] = []
+        self._key: str | None = None
+        self._array: str | None = None
+        self._element: list[str] | None = None
+
+    def feed(self, text: str) -> list[tuple[str, dict | None]]:
+        events: list[tuple[str, dict | None]] = []
+        for ch in text:
+            if self._element is not None:
+                self._element.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._key = "".join(self._key_chars)
+                elif self._depth == 1:
+                    self._key_chars.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                self._key_chars = []
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and ch == "[":
+                    self._array = self._key
+                elif self._depth == 3 and ch == "{" and self._array is not None:
+                    self._element = ["{"]
+            elif ch in "}]":
+                if self._depth == 3 and self._element is not None:
+                    events.append((self._array, json.loads("".join(self._element))))
+                    self._element = None
+                elif self._depth == 2 and self._array is not None:
+                    events.append((self._array, None))
+                    self._array = None
+                elif self._depth == 1:
+                    self.complete = True
+                self._depth -= 1
+        return events
+
+
+class TripleWriter:
+    """Writes triples in batches on a background thread.
+
+    `write_batch(triples)` runs on the writer thread, one call at a time and
+    in submission order, so it may use a single HANA connection. Use as a
+    context manager: on normal exit the last batch is written and the thread
+    joined; the first error of a batch is re-raised by `add()` or on exit.
+    """
+
+    def __init__(self, write_batch: Callable[[list[str]], None], batch_size: int = 200) -> None:
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.batches = 0
+        self.triples = 0
+        self.db_seconds = 0.0
+        self._pending: list[str] = []
+        self._queue: Queue[Callable[[], None] | None] = Queue()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="triple-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, task: Callable[[], None]) -> None:
+        """Run `task` on the writer thread after the batches queued so far."""
+        self._raise_error()
+        self._queue.put(task)
+
+    def add(self, triples: list[str]) -> None:
+        self._pending.extend(triples)
+        while len(self._pending) >= self.batch_size:
+            self._submit_batch(self._pending[: self.batch_size])
+            del self._pending[: self.batch_size]
+
+    def flush(self) -> None:
+        if self._pending:
+            self._submit_batch(self._pending)
+            self._pending = []
+
+    def _submit_batch(self, batch: list[str]) -> None:
+        self.submit(lambda: self._write(batch))
+
+    def __enter__(self) -> "TripleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        if exc_type is None:
+            self._raise_error()
+
+    def _write(self, batch: list[str]) -> None:
+        start = time.perf_counter()
+        self.write_batch(batch)
+        self.db_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.triples += len(batch)
+
+    def _run(self) -> None:
+        while (task := self._queue.get()) is not None:
+            if self._error is None:
+                try:
+                    task()
+                except BaseException as e:  # noqa: BLE001 - re-raised in the caller's thread
+                    self._error = e
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
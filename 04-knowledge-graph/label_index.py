@@ -0,0 +1,122 @@
+"""Entity linking for `chat_kg.py`: question mentions to exact entity URIs.
+
+Without linking, the generated SPARQL finds entities by their label with
+`FILTER(CONTAINS(...))` or `REGEX(...)`, and HANA has to scan every
+`rdfs:label` of the graph on every question. `LabelIndex` loads the labels
+once per chat session and resolves the mentions locally, so the query can
+bind the exact URI (`<.../maria_chen> ex:founded ?company`) instead.
+
+Matching uses character trigrams, like `pg_trgm`: every label is indexed by
+the trigrams of its normalised text (case- and width-folded, punctuation
+removed). For a question, each run of up to `MAX_MENTION_WORDS` words is
+looked up: only labels that share one of its rarest trigrams can reach a
+Dice coefficient of `threshold` (prefix filtering), so common trigrams
+(` ma`, `on `) are never scanned. The best non-overlapping mentions with a
+score of at least `threshold` win: case, punctuation and a missing suffix
+do not matter (`techvision` links to `TechVision Inc.`), stopwords alone
+(`the`, `who`) never link.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Longest run of question words tried as one mention
+MAX_MENTION_WORDS = 5
+# Words that never form a mention on their own
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "by", "did", "do", "does", "for", "from", "has", "have", "how",
+    "in", "is", "it", "its", "many", "much", "of", "on", "or", "the", "their", "to", "was", "were",
+    "what", "when", "where", "which", "who", "whom", "whose", "why", "with",
+}
+
+
+@dataclass(frozen=True)
+class EntityLink:
+    mention: str
+    label: str
+    uris: tuple[str, ...]
+    score: float
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of a normalised text, each word padded like pg_trgm."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class LabelIndex:
+    """In-memory trigram index over the `rdfs:label`s of a graph."""
+
+    def __init__(self, labels: list[tuple[str, str]], threshold: float = 0.8) -> None:
+        """`labels` are (entity URI, label) pairs."""
+        self.threshold = threshold
+        uris: dict[str, list[str]] = defaultdict(list)
+        originals: dict[str, str] = {}
+        for uri, label in labels:
+            key = normalize(label)
+            if key and key not in STOPWORDS and uri not in uris[key]:
+                uris[key].append(uri)
+                originals.setdefault(key, label)
+        self._keys = list(uris)
+        self._labels = [originals[k] for k in self._keys]
+        self._uris = [tuple(uris[k]) for k in self._keys]
+        self._grams = [frozenset(trigrams(k)) for k in self._keys]
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings[gram].append(i)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def link(self, question: str) -> list[EntityLink]:
+        """Entities mentioned in the question, best matches first."""
+        words = normalize(question).split()
+        candidates: list[tuple[float, int, int, int]] = []
+        for start in range(len(words)):
+            for end in range(start + 1, min(len(words), start + MAX_MENTION_WORDS) + 1):
+                span = words[start:end]
+                if span[0] in STOPWORDS or span[-1] in STOPWORDS:
+                    continue
+                match = self._best(" ".join(span))
+                if match is not None:
+                    candidates.append((match[0], start, end, match[1]))
+
+        # Best first; a word belongs to at most one mention
+        links: list[EntityLink] = []
+        taken: set[int] = set()
+        for score, start, end, i in sorted(candidates, key=lambda c: (-c[0], c[1] - c[2])):
+            if taken.isdisjoint(range(start, end)):
+                taken.update(range(start, end))
+                links.append(EntityLink(" ".join(words[start:end]), self._labels[i], self._uris[i], round(score, 3)))
+        return links
+
+    def _best(self, mention: str) -> tuple[float, int] | None:
+        """(Dice score, label number) of the best label for a mention."""
+        grams = trigrams(mention)
+        if not grams:
+            return None
+        # Dice >= threshold needs at least min_shared common trigrams, so a
+        # match shares one of the len - min_shared + 1 rarest ones
+        min_shared = math.ceil(self.threshold * len(grams) / (2 - self.threshold) - 1e-9)
+        rarest = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        candidates: set[int] = set()
+        for gram in rarest[: len(grams) - min_shared + 1]:
+            candidates.update(self._postings.get(gram, ()))
+
+        best: tuple[float, int] | None = None
+        for i in candidates:
+            score = 2 * len(grams & self._grams[i]) / (len(grams) + len(self._grams[i]))
+            if score >= self.threshold and (best is None or score > best[0]):
+                best = (score, i)
+        return best
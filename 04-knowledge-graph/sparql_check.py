@@ -0,0 +1,157 @@
+"""Local pre-flight check of generated SPARQL for `chat_kg.py`.
+
+A query the LLM got wrong is otherwise only noticed after a round trip to
+HANA: a syntax error or an undeclared prefix fails the question, and a
+misspelt predicate (`ex:founder` for `ex:founded`) runs fine but returns
+nothing. `check_sparql()` finds these problems locally, in a few
+milliseconds, against the schema `HanaRdfGraph` already extracted:
+
+1. **Syntax and prefixes**: the query is parsed with rdflib (as
+   `HanaRdfGraph` does for its schema query); undeclared prefixes are
+   reported with the namespace the schema uses for them.
+2. **Query form and graph**: it must be a SELECT with `FROM <graph_uri>`.
+3. **Vocabulary**: every predicate, and every class after `a`/`rdf:type`,
+   must occur in the schema (RDF, RDFS, OWL and XSD terms are always
+   allowed); unknown ones are reported with the closest schema terms.
+
+The problems are phrased for the repair prompt, so the LLM fixes exactly
+what is wrong instead of regenerating the query from scratch.
+"""
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.algebra import traverse
+from rdflib.plugins.sparql.parserutils import CompValue
+
+# Terms of these vocabularies are valid in any graph
+BUILTIN_NAMESPACES = (str(RDF), str(RDFS), str(OWL), str(XSD))
+STANDARD_PREFIXES = {"rdf": str(RDF), "rdfs": str(RDFS), "owl": str(OWL), "xsd": str(XSD)}
+
+
+@dataclass
+class SparqlCheckStats:
+    queries: int = 0
+    invalid: int = 0
+    repaired: int = 0
+    repair_calls: int = 0
+    sent_invalid: int = 0
+
+    def format(self) -> str:
+        return (
+            f"SPARQL check: {self.queries} queries, {self.invalid} invalid, {self.repaired} repaired "
+            f"({self.repair_calls} repair calls), {self.sent_invalid} sent invalid"
+        )
+
+
+@dataclass
+class SchemaVocabulary:
+    """Properties, classes and prefixes of the graph schema."""
+
+    properties: set[str] = field(default_factory=set)
+    classes: set[str] = field(default_factory=set)
+    prefixes: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_schema(cls, schema: Graph | None, prefixes: dict[str, str] | None = None) -> "SchemaVocabulary":
+        """Vocabulary of an extracted schema; `prefixes` are the ones the
+        generation prompt asks for (e.g. `ex:`)."""
+        vocabulary = cls(prefixes={**STANDARD_PREFIXES, **(prefixes or {})})
+        if schema is None:
+            return vocabulary
+        for prefix, namespace in schema.namespaces():
+            if prefix:
+                vocabulary.prefixes.setdefault(prefix, str(namespace))
+        for term in (OWL.ObjectProperty, OWL.DatatypeProperty, RDF.Property):
+            vocabulary.properties.update(str(s) for s in schema.subjects(RDF.type, term))
+        vocabulary.classes.update(str(s) for s in schema.subjects(RDF.type, OWL.Class))
+        return vocabulary
+
+
+def check_sparql(sparql: str, graph_uri: str, vocabulary: SchemaVocabulary) -> list[str]:
+    """Problems of a generated SELECT query; an empty list if it looks valid."""
+    # HANA accepts FROM DEFAULT, standard SPARQL (and rdflib) does not
+    try:
+        query = prepareQuery(re.sub(r"\bfrom\s+default\b", "", sparql, flags=re.IGNORECASE))
+    except Exception as e:  # pyparsing and rdflib raise a variety of errors
+        return [_parse_problem(e, vocabulary)]
+
+    problems = []
+    if query.algebra.name != "SelectQuery":
+        problems.append(f"The query must be a SELECT query, not {query.algebra.name.removesuffix('Query')}.")
+    graphs = [str(c.default) for c in query.algebra.get("datasetClause") or [] if c.get("default")]
+    if graph_uri not in graphs:
+        problems.append(f"The query must read the graph with FROM <{graph_uri}>.")
+
+    # Without a schema (empty graph) there is nothing to compare with
+    if vocabulary.properties or vocabulary.classes:
+        predicates, classes = _terms(query.algebra)
+        for iri in sorted(predicates - vocabulary.properties):
+            if not iri.startswith(BUILTIN_NAMESPACES):
+                problems.append(_unknown("predicate", iri, vocabulary.properties, vocabulary))
+        for iri in sorted(classes - vocabulary.classes):
+            if not iri.startswith(BUILTIN_NAMESPACES):
+                problems.append(_unknown("class", iri, vocabulary.classes, vocabulary))
+    return problems
+
+
+def _parse_problem(error: Exception, vocabulary: SchemaVocabulary) -> str:
+    match = re.search(r"Unknown namespace prefix : (\w*)", str(error))
+    if match:
+        prefix = match.group(1)
+        namespace = vocabulary.prefixes.get(prefix)
+        if namespace:
+            return f"Prefix {prefix}: is not declared; add PREFIX {prefix}: <{namespace}>."
+        return f"Prefix {prefix}: is not declared and not used by the schema."
+    return f"Syntax error: {error}"
+
+
+def _terms(algebra: CompValue) -> tuple[set[str], set[str]]:
+    """IRIs used as predicates, and as classes (objects of rdf:type)."""
+    predicates: set[str] = set()
+    classes: set[str] = set()
+
+    def visit(node: object) -> None:
+        if isinstance(node, CompValue) and node.name == "BGP":
+            for _, predicate, obj in node.triples:
+                iris = set(_path_iris(predicate))
+                predicates.update(iris)
+                if str(RDF.type) in iris and isinstance(obj, URIRef):
+                    classes.add(str(obj))
+
+    traverse(algebra, visitPost=visit)
+    return predicates, classes
+
+
+def _path_iris(path: object) -> Iterator[str]:
+    """IRIs in a predicate or property path (`ex:a/ex:b`, `^ex:c`, `ex:d*`)."""
+    if isinstance(path, URIRef):
+        yield str(path)
+        return
+    # SequencePath/AlternativePath/NegatedPath.args, InvPath.arg, MulPath.path
+    for name in ("args", "arg", "path"):
+        part = getattr(path, name, None)
+        if isinstance(part, (list, tuple)):
+            for item in part:
+                yield from _path_iris(item)
+        elif part is not None:
+            yield from _path_iris(part)
+
+
+def _unknown(kind: str, iri: str, known: set[str], vocabulary: SchemaVocabulary) -> str:
+    names = [_short(k, vocabulary) for k in known]
+    close = difflib.get_close_matches(_short(iri, vocabulary), names, n=3, cutoff=0.6)
+    hint = f" Did you mean {' or '.join(close)}?" if close else ""
+    return f"Unknown {kind} {_short(iri, vocabulary)}: it does not occur in the schema.{hint}"
+
+
+def _short(iri: str, vocabulary: SchemaVocabulary) -> str:
+    """`ex:founded` for an IRI in a known namespace, else `<iri>`."""
+    for prefix, namespace in vocabulary.prefixes.items():
+        if iri.startswith(namespace) and re.fullmatch(r"[\w-]+", iri[len(namespace):]):
+            return f"{prefix}:{iri[len(namespace):]}"
+    return f"<{iri}>"
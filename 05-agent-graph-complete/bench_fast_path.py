@@ -0,0 +1,57 @@
+"""
+Report how much traffic the deterministic fast path can serve without an LLM.
+
+Classifies a sample of license requests with `match_fast_path` (no LLM, no
+HANA, no credentials needed) and prints which ones would skip the model and
+the overall percentage. Pass a text file with one request per line to use
+your own traffic sample instead.
+
+Usage:
+    uv run bench_fast_path.py [requests.txt]
+"""
+import sys
+import time
+from pathlib import Path
+
+from license_agent_complete import match_fast_path
+
+SAMPLE_REQUESTS = [
+    "I am from the IT team. Can I get an SAP license?",
+    "I am from the Marketing team. Can I get an Adobe license?",
+    "The Finance team needs SAP HANA.",
+    "Team marketing would like Adobe Creative Cloud.",
+    "IT team needs Adobe CC.",
+    "Finance team wants to order SAP S/4HANA.",
+    "Can the IT team get SAP or Adobe?",
+    "Why was my last request rejected?",
+    "How much budget does the marketing team have left?",
+    "I need a license for Figma.",
+    "The IT team does not need SAP anymore, cancel it.",
+    "We need SAP for the finance team and Adobe for the marketing team.",
+]
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        lines = Path(sys.argv[1]).read_text(encoding="utf-8").splitlines()
+        requests = [line.strip() for line in lines if line.strip()]
+    else:
+        requests = SAMPLE_REQUESTS
+
+    start = time.perf_counter()
+    matches = [match_fast_path(text) for text in requests]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for text, matched in zip(requests, matches):
+        label = f"fast path {matched}" if matched else "LLM"
+        print(f"  [{label}] {text}")
+
+    served = sum(1 for m in matches if m)
+    print(
+        f"\nServed without LLM: {served}/{len(requests)} "
+        f"({served / len(requests):.0%}), classified in {elapsed_ms:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how speculative tool prefetching changes LLM calls per request.
+
+Sends the same set of license requests through the agent twice, once with
+`SPECULATIVE_PREFETCH` off and once on, each request in a fresh thread with
+fresh budgets, and reports the average `llm_calls` per request.
+
+Needs SAP AI Core credentials (real LLM calls).
+
+Usage:
+    uv run bench_prefetch.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+# Keep benchmark checkpoints out of the normal agent_state.sqlite
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["AGENT_CHECKPOINT_DB"] = str(Path(_tmp_dir.name) / "bench.sqlite")
+
+import license_agent_complete as agent_module  # noqa: E402
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+REQUESTS = [
+    "I am from the IT team. Can I get an SAP license?",
+    "I am from the Marketing team. Can I get an Adobe license?",
+    "The Finance team needs SAP HANA.",
+    "Team marketing would like Adobe Creative Cloud.",
+    "Can the IT team get Adobe CC?",
+    "Finance team here, we need an SAP S/4HANA seat.",
+]
+
+
+def run_requests(prefetch: bool) -> list[int]:
+    """Run every request once and return the llm_calls of each."""
+    agent_module.SPECULATIVE_PREFETCH = prefetch
+    agent = agent_module.get_agent()
+    initial_budgets = dict(agent_module.TEAM_BUDGETS)
+
+    calls: list[int] = []
+    for i, text in enumerate(REQUESTS):
+        agent_module.TEAM_BUDGETS.update(initial_budgets)
+        config = {"configurable": {"thread_id": f"bench-{prefetch}-{i}"}}
+        state = agent.invoke(
+            {"messages": [HumanMessage(content=text)], "llm_calls": 0},
+            config,
+        )
+        calls.append(state["llm_calls"])
+        print(f"  [{'on ' if prefetch else 'off'}] {state['llm_calls']} LLM calls: {text}")
+    return calls
+
+
+def main() -> None:
+    print(f"Running {len(REQUESTS)} requests with prefetch off and on...\n")
+    baseline = run_requests(prefetch=False)
+    prefetched = run_requests(prefetch=True)
+
+    avg_off = statistics.mean(baseline)
+    avg_on = statistics.mean(prefetched)
+    drop = (avg_off - avg_on) / avg_off * 100 if avg_off else 0.0
+
+    print("\nAverage LLM calls per request:")
+    print(f"  prefetch off: {avg_off:.2f}")
+    print(f"  prefetch on:  {avg_on:.2f}")
+    print(f"  reduction:    {drop:.1f}%")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
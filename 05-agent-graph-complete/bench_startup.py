@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark for the license agent.
+
+Runs each measurement in a fresh Python process so nothing is cached between
+runs, and reports the median of several repetitions:
+
+- import: `import license_agent_complete`
+- agent:  `get_agent()` (graph compile + SQLite checkpointer, no model yet)
+- model:  `get_model_with_tools()` (SDK import, credentials, proxy client);
+          only with `--with-model`, needs SAP AI Core credentials
+
+Exits with status 1 if the median import + agent time exceeds the budget, so
+it can be used as a CI gate.
+
+Usage:
+    uv run bench_startup.py [--runs N] [--budget-ms MS] [--with-model]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_RUNS = 5
+DEFAULT_BUDGET_MS = float(os.getenv("AGENT_STARTUP_BUDGET_MS", "1500"))
+
+# Executed in a child interpreter; prints one JSON line with timings in ms.
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {here!r})
+t0 = time.perf_counter()
+import license_agent_complete as m
+t1 = time.perf_counter()
+m.get_agent()
+t2 = time.perf_counter()
+timings = {{"import": (t1 - t0) * 1000, "agent": (t2 - t1) * 1000}}
+if {with_model!r}:
+    m.get_model_with_tools()
+    timings["model"] = (time.perf_counter() - t2) * 1000
+print(json.dumps(timings))
+"""
+
+
+def run_probe(with_model: bool, checkpoint_db: Path) -> dict[str, float]:
+    """Run one cold start in a fresh interpreter and return its timings."""
+    env = dict(os.environ, AGENT_CHECKPOINT_DB=str(checkpoint_db))
+    code = PROBE.format(here=str(HERE), with_model=with_model)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv: list[str]) -> tuple[int, float, bool]:
+    runs = DEFAULT_RUNS
+    budget_ms = DEFAULT_BUDGET_MS
+    if "--runs" in argv:
+        runs = int(argv[argv.index("--runs") + 1])
+    if "--budget-ms" in argv:
+        budget_ms = float(argv[argv.index("--budget-ms") + 1])
+    return runs, budget_ms, "--with-model" in argv
+
+
+def main() -> None:
+    runs, budget_ms, with_model = parse_args(sys.argv[1:])
+
+    samples: dict[str, list[float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            timings = run_probe(with_model, Path(tmp) / f"bench-{i}.sqlite")
+            for phase, ms in timings.items():
+                samples.setdefault(phase, []).append(ms)
+
+    print(f"Cold start over {runs} runs (median / max, ms):")
+    for phase, values in samples.items():
+        print(f"  {phase:<7} {statistics.median(values):8.1f} / {max(values):8.1f}")
+
+    startup = statistics.median(
+        [i + a for i, a in zip(samples["import"], samples["agent"])]
+    )
+    status = "OK" if startup <= budget_ms else "OVER BUDGET"
+    print(f"\nimport + agent: {startup:.1f} ms (budget {budget_ms:.0f} ms) -> {status}")
+
+    if startup > budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,17 +10,25 @@ You will later derive a skeleton version of this for the hands-on exercise.
 """
 
 import os
-import operator
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Literal
 
 from dotenv import load_dotenv
 from typing_extensions import Annotated, TypedDict
 
-from gen_ai_hub.proxy.langchain.init_models import init_llm
 from langchain.tools import tool
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, ToolMessage
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import Runnable
+from langgraph.channels import DeltaChannel
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
+
+from tracing import summarize, traced_node, traced_route, tracer
 
 
 # ---------------------------------------------------------------------------
@@ -34,14 +42,51 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
 MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "2000"))
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
 
-# Initialize LLM via SAP Generative AI Hub helper
-model = init_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+# Local SQLite file that stores conversation checkpoints and the budget ledger
+CHECKPOINT_DB = Path(
+    os.getenv("AGENT_CHECKPOINT_DB", Path(__file__).resolve().parent / "agent_state.sqlite")
+)
+
+# Speculatively run the companion read-only tool (license <-> budget) when the
+# model only asks for one of them, to save an LLM round trip per request.
+SPECULATIVE_PREFETCH = os.getenv("AGENT_SPECULATIVE_PREFETCH", "false").lower() in {"1", "true", "yes"}
+
+# Answer fully-specified requests ("Team X needs software Y") with rules and
+# tools only, without calling the LLM.
+FAST_PATH = os.getenv("AGENT_FAST_PATH", "false").lower() in {"1", "true", "yes"}
+
+# Model, tool binding and the compiled graph are created lazily by the
+# factories below, so importing this module stays cheap (no SDK import,
+# credential lookup or proxy client setup).
+_model_instance: BaseChatModel | None = None
+_model_with_tools_instance: Runnable | None = None
+_agent_instance: CompiledStateGraph | None = None
+
+
+def get_model() -> BaseChatModel:
+    """Get or initialize the LLM via the SAP Generative AI Hub helper."""
+
+    global _model_instance
+
+    if _model_instance is None:
+        from workshop_common.llm import get_llm
+
+        # Shared factory: one proxy client (token, deployments) per process
+        _model_instance = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    return _model_instance
 
 
 # ---------------------------------------------------------------------------
 # Tools (IT + Finance)
 # ---------------------------------------------------------------------------
 
+SAP_PRODUCTS = {"sap", "sap hana", "sap s/4hana"}
+ADOBE_PRODUCTS = {"adobe", "adobe cc", "adobe creative cloud"}
+
+# Estimated cost per license, as suggested to the model in the system prompt
+LICENSE_COSTS_USD = {"sap": 3000.0, "adobe": 600.0}
+
+
 @tool
 def check_software_license(software_name: str) -> str:
     """Check if a license is available for the given software.
@@ -51,9 +96,9 @@ def check_software_license(software_name: str) -> str:
     """
 
     name = software_name.strip().lower()
-    if name in {"sap", "sap hana", "sap s/4hana"}:
+    if name in SAP_PRODUCTS:
         return "Available: we have spare SAP licenses."
-    if name in {"adobe", "adobe cc", "adobe creative cloud"}:
+    if name in ADOBE_PRODUCTS:
         return "Out of stock: no Adobe licenses available."
     return f"Unknown availability for '{software_name}'. Assume not available."
 
@@ -86,6 +131,55 @@ TEAM_BUDGETS: dict[str, float] = {
     "finance": 5000.0,
 }
 
+# Connection used to persist budget deductions (set up by `open_budget_ledger`)
+_ledger_conn: sqlite3.Connection | None = None
+
+
+def open_budget_ledger(path: Path) -> sqlite3.Connection:
+    """Open the budget ledger and replay it into `TEAM_BUDGETS`.
+
+    Every deduction is appended as one row, so a write never rewrites the
+    whole ledger. On startup the latest row per team wins.
+    """
+
+    global _ledger_conn
+
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS budget_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team TEXT NOT NULL,
+            amount_usd REAL NOT NULL,
+            new_value REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+    rows = conn.execute(
+        "SELECT team, new_value FROM budget_ledger"
+        " WHERE id IN (SELECT MAX(id) FROM budget_ledger GROUP BY team)"
+    )
+    for team, new_value in rows:
+        TEAM_BUDGETS[team] = new_value
+
+    _ledger_conn = conn
+    return conn
+
+
+def _record_deduction(team: str, amount_usd: float, new_value: float) -> None:
+    """Append a single deduction to the ledger (no-op if no ledger is open)."""
+
+    if _ledger_conn is None:
+        return
+    with _ledger_conn:
+        _ledger_conn.execute(
+            "INSERT INTO budget_ledger (team, amount_usd, new_value, created_at) VALUES (?, ?, ?, ?)",
+            (team, amount_usd, new_value, datetime.now(timezone.utc).isoformat()),
+        )
+
 
 @tool
 def deduct_budget(team_name: str, amount_usd: float) -> str:
@@ -101,12 +195,22 @@ def deduct_budget(team_name: str, amount_usd: float) -> str:
 
     new_value = max(0.0, current - amount_usd)
     TEAM_BUDGETS[key] = new_value
+    _record_deduction(key, amount_usd, new_value)
     return f"Deducted {amount_usd:.2f} USD from {team_name}. New budget: {new_value:.2f} USD."
 
 
 tools = [check_software_license, check_team_budget, deduct_budget]
 tools_by_name = {t.name: t for t in tools}
-model_with_tools = model.bind_tools(tools)
+
+
+def get_model_with_tools() -> Runnable:
+    """Get the LLM with the agent tools bound (created on first use)."""
+
+    global _model_with_tools_instance
+
+    if _model_with_tools_instance is None:
+        _model_with_tools_instance = get_model().bind_tools(tools)
+    return _model_with_tools_instance
 
 
 # ---------------------------------------------------------------------------
@@ -114,14 +218,25 @@ model_with_tools = model.bind_tools(tools)
 # ---------------------------------------------------------------------------
 
 
+def append_messages(
+    current: list[AnyMessage], writes: list[list[AnyMessage]]
+) -> list[AnyMessage]:
+    """Reducer for `messages`: append every batch of new messages in order."""
+
+    return current + [m for batch in writes for m in batch]
+
+
 class MessagesState(TypedDict):
     """State passed between LangGraph nodes.
 
     - messages: conversation history + tool calls/results
     - llm_calls: how many times the LLM node has been called
+
+    `messages` uses a `DeltaChannel`, so the checkpointer only stores the new
+    messages of each step instead of re-serialising the whole history.
     """
 
-    messages: Annotated[list[AnyMessage], operator.add]
+    messages: Annotated[list[AnyMessage], DeltaChannel(append_messages)]
     llm_calls: int
 
 
@@ -151,7 +266,7 @@ def llm_call(state: MessagesState) -> MessagesState:
         )
     )
 
-    result = model_with_tools.invoke([system] + state["messages"])
+    result = get_model_with_tools().invoke([system] + state["messages"])
 
     return {
         "messages": [result],
@@ -160,21 +275,138 @@ def llm_call(state: MessagesState) -> MessagesState:
 
 
 def tool_node(state: MessagesState) -> MessagesState:
-    """Execute the tools requested by the last LLM message."""
+    """Execute the tools requested by the last LLM message.
+
+    With `SPECULATIVE_PREFETCH` enabled, the companion tool of a known pair is
+    run in the same step (see `prefetch_companion_tools`).
+    """
 
     last_msg = state["messages"][-1]
-    tool_messages: list[ToolMessage] = []
+    tool_calls = getattr(last_msg, "tool_calls", []) or []
+    tool_messages: list[AnyMessage] = []
 
-    for tool_call in getattr(last_msg, "tool_calls", []) or []:
+    for tool_call in tool_calls:
         tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
+        with tracer.span(f"tool.{tool.name}", **{"tool.name": tool.name}):
+            observation = tool.invoke(tool_call["args"])
         tool_messages.append(
             ToolMessage(content=observation, tool_call_id=tool_call["id"])
         )
 
+    if SPECULATIVE_PREFETCH:
+        tool_messages.extend(prefetch_companion_tools(state["messages"], tool_calls))
+
     return {"messages": tool_messages, "llm_calls": state.get("llm_calls", 0)}
 
 
+# ---------------------------------------------------------------------------
+# Speculative prefetch of companion tools
+# ---------------------------------------------------------------------------
+
+# Read-only tools the system prompt always needs together. When the model asks
+# for one, the other is pre-run so both results reach the next LLM call.
+PREFETCH_PAIRS = {
+    "check_software_license": "check_team_budget",
+    "check_team_budget": "check_software_license",
+}
+
+PREFETCH_ID_PREFIX = "prefetch_"
+
+
+def infer_prefetch_args(tool_name: str, text: str) -> dict | None:
+    """Guess the arguments of a read-only tool from the user's request.
+
+    Returns None if the request does not name a known team / software, in
+    which case nothing is prefetched and the model asks for it itself.
+    """
+
+    if tool_name == "check_team_budget":
+        teams = find_teams(text)
+        return {"team_name": teams[0]} if teams else None
+    if tool_name == "check_software_license":
+        software = find_software(text)
+        return {"software_name": software[0]} if software else None
+    return None
+
+
+def find_teams(text: str) -> list[str]:
+    """Known teams mentioned as "<name> team" or "team <name>", in order."""
+
+    teams: list[str] = []
+    for match in re.finditer(r"\b(\w+)\s+team\b|\bteam\s+(\w+)\b", text.lower()):
+        team = match.group(1) or match.group(2)
+        if team in TEAM_BUDGETS and team not in teams:
+            teams.append(team)
+    return teams
+
+
+def find_software(text: str) -> list[str]:
+    """Known software names mentioned in the text, in order of appearance.
+
+    Longer names win over shorter ones they contain ("sap hana" over "sap").
+    """
+
+    lowered = text.lower()
+    taken: list[tuple[int, int]] = []
+    found: list[tuple[int, str]] = []
+    for name in sorted(SAP_PRODUCTS | ADOBE_PRODUCTS, key=len, reverse=True):
+        for match in re.finditer(rf"\b{re.escape(name)}\b", lowered):
+            start, end = match.span()
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            taken.append((start, end))
+            found.append((start, name))
+    return [name for _, name in sorted(found)]
+
+
+def prefetch_companion_tools(
+    messages: list[AnyMessage], tool_calls: list[dict]
+) -> list[AnyMessage]:
+    """Run the companion of each requested read-only tool speculatively.
+
+    The result is appended as a synthetic AI tool call plus its ToolMessage,
+    so the history stays a valid tool-calling sequence for the model.
+    Companions already called in the current turn are skipped.
+    """
+
+    # Messages of the current turn start after the last user message
+    turn_start = max(
+        (i for i, m in enumerate(messages) if getattr(m, "type", None) == "human"),
+        default=0,
+    )
+    request = messages[turn_start].content if messages else ""
+    already_called = {
+        call["name"]
+        for m in messages[turn_start:]
+        for call in (getattr(m, "tool_calls", None) or [])
+    }
+
+    prefetch_calls: list[dict] = []
+    for tool_call in tool_calls:
+        companion = PREFETCH_PAIRS.get(tool_call["name"])
+        if companion is None or companion in already_called:
+            continue
+        args = infer_prefetch_args(companion, str(request))
+        if args is None:
+            continue
+        already_called.add(companion)
+        prefetch_calls.append({
+            "name": companion,
+            "args": args,
+            "id": f"{PREFETCH_ID_PREFIX}{tool_call['id']}",
+        })
+
+    if not prefetch_calls:
+        return []
+
+    prefetched: list[AnyMessage] = [AIMessage(content="", tool_calls=prefetch_calls)]
+    for tool_call in prefetch_calls:
+        with tracer.span(f"tool.{tool_call['name']}", **{"tool.name": tool_call["name"], "tool.prefetch": True}):
+            observation = tools_by_name[tool_call["name"]].invoke(tool_call["args"])
+        prefetched.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
+    return prefetched
+
+
 def should_continue(state: MessagesState) -> Literal["tool_node", END]:
     """Route either to the tool node or end based on LLM output.
 
@@ -197,6 +429,108 @@ def should_continue(state: MessagesState) -> Literal["tool_node", END]:
     return END
 
 
+# ---------------------------------------------------------------------------
+# Deterministic fast path (no LLM)
+# ---------------------------------------------------------------------------
+
+FAST_PATH_ID_PREFIX = "fastpath_"
+
+# The request must clearly ask for something ...
+REQUEST_PATTERN = re.compile(
+    r"\b(needs?|wants?|would like|requests?|requesting|get|order|buy|purchase)\b"
+)
+# ... and must not contain anything the rules cannot interpret safely.
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(not|no|don't|cancel|instead|why|how|what|which|compare|or|but|if|unless|more|another|budget)\b"
+)
+
+
+def match_fast_path(text: str) -> tuple[str, str] | None:
+    """Return (team, software) if the request is fully specified, else None.
+
+    Fully specified means: exactly one known team, exactly one known
+    software, a clear request verb and no wording that needs interpretation.
+    """
+
+    lowered = text.lower()
+    if not REQUEST_PATTERN.search(lowered) or AMBIGUOUS_PATTERN.search(lowered):
+        return None
+    teams = find_teams(lowered)
+    software = find_software(lowered)
+    if len(teams) != 1 or len(software) != 1:
+        return None
+    return teams[0], software[0]
+
+
+def license_cost(software: str) -> float:
+    """Estimated license cost from `LICENSE_COSTS_USD`."""
+
+    family = "sap" if software in SAP_PRODUCTS else "adobe"
+    return LICENSE_COSTS_USD[family]
+
+
+def fast_path(state: MessagesState) -> MessagesState:
+    """Handle fully-specified requests with tools and rules only.
+
+    Runs the license and budget checks directly and applies the same policy
+    as the system prompt: approve only if a license is available and the
+    team budget covers the estimated cost, then deduct it. Produces the same
+    tool-call / tool-result message sequence the LLM would, followed by the
+    final answer. Anything else is left for `llm_call`.
+    """
+
+    last_msg = state["messages"][-1]
+    if not FAST_PATH or getattr(last_msg, "type", None) != "human":
+        return {"messages": [], "llm_calls": state.get("llm_calls", 0)}
+
+    matched = match_fast_path(str(last_msg.content))
+    if matched is None:
+        return {"messages": [], "llm_calls": state.get("llm_calls", 0)}
+
+    team, software = matched
+    cost = license_cost(software)
+    messages: list[AnyMessage] = []
+
+    def run_tool(name: str, args: dict) -> str:
+        call_id = f"{FAST_PATH_ID_PREFIX}{len(messages)}_{name}"
+        messages.append(AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}]))
+        with tracer.span(f"tool.{name}", **{"tool.name": name, "tool.fast_path": True}):
+            observation = tools_by_name[name].invoke(args)
+        messages.append(ToolMessage(content=observation, tool_call_id=call_id))
+        return observation
+
+    license_result = run_tool("check_software_license", {"software_name": software})
+    budget_result = run_tool("check_team_budget", {"team_name": team})
+
+    available = license_result.startswith("Available")
+    budget = TEAM_BUDGETS[team]
+
+    if available and budget >= cost:
+        deduction = run_tool("deduct_budget", {"team_name": team, "amount_usd": cost})
+        answer = (
+            f"Approved. {license_result} The team budget ({budget:.0f} USD) covers "
+            f"the estimated cost of {cost:.0f} USD. {deduction}"
+        )
+    elif not available:
+        answer = f"Rejected. {license_result} {budget_result}"
+    else:
+        answer = (
+            f"Rejected. {license_result} However, the team budget ({budget:.0f} USD) "
+            f"does not cover the estimated cost of {cost:.0f} USD."
+        )
+
+    messages.append(AIMessage(content=answer, response_metadata={"fast_path": True}))
+    return {"messages": messages, "llm_calls": state.get("llm_calls", 0)}
+
+
+def route_after_fast_path(state: MessagesState) -> Literal["llm_call", END]:
+    """End the turn if the fast path already answered, else ask the LLM."""
+
+    if getattr(state["messages"][-1], "type", None) == "ai":
+        return END
+    return "llm_call"
+
+
 # ---------------------------------------------------------------------------
 # Build the agent graph
 # ---------------------------------------------------------------------------
@@ -204,14 +538,38 @@ def should_continue(state: MessagesState) -> Literal["tool_node", END]:
 
 agent_builder = StateGraph(MessagesState)
 
-agent_builder.add_node("llm_call", llm_call)
-agent_builder.add_node("tool_node", tool_node)
-
-agent_builder.add_edge(START, "llm_call")
-agent_builder.add_conditional_edges("llm_call", should_continue, ["tool_node", END])
+# Nodes and the routing function are wrapped in tracing spans (see tracing.py)
+agent_builder.add_node("fast_path", traced_node(tracer, "fast_path", fast_path))
+agent_builder.add_node("llm_call", traced_node(tracer, "llm_call", llm_call))
+agent_builder.add_node("tool_node", traced_node(tracer, "tool_node", tool_node))
+
+agent_builder.add_edge(START, "fast_path")
+agent_builder.add_conditional_edges(
+    "fast_path", traced_route(tracer, "route_after_fast_path", route_after_fast_path), ["llm_call", END]
+)
+agent_builder.add_conditional_edges(
+    "llm_call", traced_route(tracer, "should_continue", should_continue), ["tool_node", END]
+)
 agent_builder.add_edge("tool_node", "llm_call")
 
-agent = agent_builder.compile()
+
+def get_agent() -> CompiledStateGraph:
+    """Get or compile the agent graph (singleton).
+
+    Thread state is persisted in SQLite so a session can be resumed by thread
+    ID without replaying the conversation through the LLM. The model itself
+    is only created when `llm_call` runs for the first time.
+    """
+
+    global _agent_instance
+
+    if _agent_instance is None:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        open_budget_ledger(CHECKPOINT_DB)
+        checkpointer = SqliteSaver(sqlite3.connect(str(CHECKPOINT_DB), check_same_thread=False))
+        _agent_instance = agent_builder.compile(checkpointer=checkpointer)
+    return _agent_instance
 
 
 # ---------------------------------------------------------------------------
@@ -231,6 +589,12 @@ def print_agent_thought_process(messages: list[AnyMessage]) -> None:
         msg_type = getattr(m, "type", None)
         if msg_type == "ai" and getattr(m, "tool_calls", None):
             first_call = m.tool_calls[0]
+            if first_call["id"].startswith(PREFETCH_ID_PREFIX):
+                print(f"[PREFETCH] Ran tool speculatively: {first_call['name']}")
+                continue
+            if first_call["id"].startswith(FAST_PATH_ID_PREFIX):
+                print(f"[FAST PATH] Ran tool without LLM: {first_call['name']}")
+                continue
             print(f"[AGENT DECISION] Needs tool: {first_call['name']}")
             print(f"  Reasoning: {m.content}")
         elif msg_type == "tool":
@@ -246,12 +610,26 @@ def print_agent_thought_process(messages: list[AnyMessage]) -> None:
 
 
 def main() -> None:
+    # Conversation history is stored per thread in the checkpoint database.
+    # Pass a thread ID to resume an earlier session.
+    thread_id = sys.argv[1] if len(sys.argv) > 1 else os.getenv("AGENT_THREAD_ID", "default")
+    config = {"configurable": {"thread_id": thread_id}}
+    # Optional (LLM_WARM_UP): authenticate while the user types the first request
+    from workshop_common.llm import warm_up
+
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    agent = get_agent()
+
     print("Software License Procurement Agent (complete demo)")
     print("Type an empty line or Ctrl+C to exit.\n")
 
-    # Keep full conversation history across turns so the agent can
-    # remember previous questions and answers.
-    conversation: list[AnyMessage] = []
+    restored = agent.get_state(config).values.get("messages", [])
+    if restored:
+        print(f"Resumed thread '{thread_id}' with {len(restored)} messages.\n")
+
+    # How many requests the fast path answered without any LLM call
+    turns = 0
+    served_without_llm = 0
 
     while True:
         try:
@@ -264,26 +642,38 @@ def main() -> None:
             print("Goodbye.")
             break
 
-        # Add the new user message to the ongoing conversation
-        conversation.append(HumanMessage(content=user_text))
-
-        # Invoke the agent with the full history
-        state = agent.invoke({
-            "messages": conversation,
-            "llm_calls": 0,
-        })
+        # Only send the new user message; the checkpointer restores the
+        # earlier history of this thread.
+        with tracer.span("agent.turn", **{"thread.id": thread_id}) as turn:
+            state = agent.invoke(
+                {
+                    "messages": [HumanMessage(content=user_text)],
+                    "llm_calls": 0,
+                },
+                config,
+            )
+            turn.attributes["agent.llm_calls"] = state["llm_calls"]
         msgs = state["messages"]
-
-        # Update conversation with all messages produced in this turn
-        conversation = msgs
+        turns += 1
+        if state["llm_calls"] == 0:
+            served_without_llm += 1
 
         print_agent_thought_process(msgs)
+        spans = tracer.pop_trace(turn.trace_id)
+        if tracer.path is not None:
+            print(summarize(spans))
 
         # Show final assistant message (last AI message)
         final_ai = [m for m in msgs if getattr(m, "type", None) == "ai"]
         if final_ai:
             print(f"Assistant: {final_ai[-1].content}\n")
 
+    if FAST_PATH and turns:
+        print(
+            f"Fast path served {served_without_llm}/{turns} requests without an LLM call "
+            f"({served_without_llm / turns:.0%})."
+        )
+
 
 if __name__ == "__main__":
     main()
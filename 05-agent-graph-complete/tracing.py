@@ -0,0 +1,174 @@
+"""Lightweight span tracing for the license agent.
+
+Records one span per agent turn, graph node, tool call and routing decision,
+with wall time and LLM token usage. Finished spans are appended as JSON lines
+to `AGENT_TRACE_FILE` (if set). The fields follow the OpenTelemetry span data
+model (hex trace/span IDs, start/end in Unix nanoseconds, flat attributes),
+so they can be loaded into any OTLP-compatible backend or analysed with `jq`.
+"""
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """A single timed operation, shaped like an OpenTelemetry span."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    start_time_unix_nano: int
+    end_time_unix_nano: int = 0
+    status: str = "OK"
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Create nested spans and export them as JSON lines."""
+
+    # Finished spans are kept in memory for the last few traces only
+    MAX_BUFFERED_TRACES = 100
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._finished: OrderedDict[str, list[Span]] = OrderedDict()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Open a child span of the current span (or a new trace)."""
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent.span_id if parent else None,
+            start_time_unix_nano=time.time_ns(),
+            attributes=dict(attributes),
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "ERROR"
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            span.end_time_unix_nano = time.time_ns()
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self._finished.setdefault(span.trace_id, []).append(span)
+            self._finished.move_to_end(span.trace_id)
+            while len(self._finished) > self.MAX_BUFFERED_TRACES:
+                self._finished.popitem(last=False)
+            if self.path is not None:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def pop_trace(self, trace_id: str) -> list[Span]:
+        """Return and forget all finished spans of a trace."""
+        with self._lock:
+            return self._finished.pop(trace_id, [])
+
+
+def usage_attributes(messages: list[Any]) -> dict[str, int]:
+    """Sum `usage_metadata` token counts over the given messages."""
+    totals = {"llm.input_tokens": 0, "llm.output_tokens": 0, "llm.total_tokens": 0}
+    for m in messages:
+        usage = getattr(m, "usage_metadata", None) or {}
+        totals["llm.input_tokens"] += usage.get("input_tokens", 0)
+        totals["llm.output_tokens"] += usage.get("output_tokens", 0)
+        totals["llm.total_tokens"] += usage.get("total_tokens", 0)
+    return totals
+
+
+def traced_node(tracer: Tracer, name: str, fn: Callable) -> Callable:
+    """Wrap a LangGraph node so each run becomes a `node.<name>` span.
+
+    Token usage of any AI message returned by the node is added as span
+    attributes.
+    """
+
+    @wraps(fn)
+    def wrapper(state):
+        with tracer.span(f"node.{name}", **{"graph.node": name}) as span:
+            result = fn(state)
+            produced = result.get("messages", []) if isinstance(result, dict) else []
+            if any(getattr(m, "type", None) == "ai" for m in produced):
+                span.attributes.update(usage_attributes(produced))
+            span.attributes["node.messages_out"] = len(produced)
+            return result
+
+    return wrapper
+
+
+def traced_route(tracer: Tracer, name: str, fn: Callable) -> Callable:
+    """Wrap a conditional-edge function and record which path it chose."""
+
+    @wraps(fn)
+    def wrapper(state):
+        with tracer.span(f"route.{name}") as span:
+            decision = fn(state)
+            span.attributes["route.decision"] = str(decision)
+            return decision
+
+    return wrapper
+
+
+def summarize(spans: list[Span]) -> str:
+    """One-line summary of a finished turn for the CLI."""
+    turn = next((s for s in spans if s.parent_span_id is None), None)
+    parts = [f"turn {turn.duration_ms:.0f} ms" if turn else "turn"]
+    for node in ("llm_call", "tool_node"):
+        runs = [s for s in spans if s.name == f"node.{node}"]
+        if not runs:
+            continue
+        total_ms = sum(s.duration_ms for s in runs)
+        text = f"{node} x{len(runs)} {total_ms:.0f} ms"
+        tokens = sum(s.attributes.get("llm.total_tokens", 0) for s in runs)
+        if tokens:
+            text += f" ({tokens} tokens)"
+        parts.append(text)
+    routes = [s.attributes.get("route.decision") for s in spans if s.name.startswith("route.")]
+    if routes:
+        parts.append("route " + " -> ".join(routes))
+    return "[TRACE] " + ", ".join(parts)
+
+
+_trace_file = os.getenv("AGENT_TRACE_FILE")
+tracer = Tracer(Path(_trace_file) if _trace_file else None)
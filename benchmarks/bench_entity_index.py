@@ -0,0 +1,127 @@
+"""
+Scale test of the knowledge-graph entity resolution index.
+
+Fills `04-knowledge-graph/entity_index.py` with synthetic people and
+companies (`--entities`, default 200,000), then resolves a mix of lookups
+against it and reports p50/p95 latency per kind:
+
+- exact: a name that is already in the index,
+- variant: the same entity with a title, suffix or other id (`dr_...`, `... Inc.`),
+- token: a name with an extra initial (`Maria L. Chen`), found by blocking,
+- new: an unknown name (blocks are read, nothing matches).
+
+`matched` is the share of lookups that resolved to an existing entity.
+
+Before that it checks that entities of different types with the same name
+(the product `CloudSync`, the company `CloudSync Inc.`) stay separate, and
+exits with an error if they are merged.
+
+Usage:
+    uv run bench_entity_index.py
+    uv run bench_entity_index.py --entities 500000 --lookups 5000
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from run_benchmarks import REPO_ROOT, load_script, percentile
+
+FIRST = [
+    "maria", "david", "anna", "james", "yuki", "li", "sofia", "omar", "lena", "raj",
+    "emma", "noah", "mia", "lucas", "hana", "ken", "sara", "tom", "nina", "paul",
+]
+LAST = [
+    "chen", "park", "mueller", "tanaka", "garcia", "smith", "kowalski", "rossi", "singh", "kim",
+    "dubois", "ivanova", "haddad", "okafor", "nguyen", "jensen", "silva", "cohen", "sato", "brown",
+]
+SYLLABLES = ["tek", "vi", "sion", "da", "ta", "nex", "lo", "gic", "sys", "cor", "ra", "max", "on", "zen"]
+
+
+def person(rng: random.Random, i: int) -> dict:
+    name = f"{rng.choice(FIRST).title()} {rng.choice(LAST).title()}{i}"
+    return {"id": name.lower().replace(" ", "_"), "type": "Person", "name": name}
+
+
+def company(rng: random.Random, i: int) -> dict:
+    name = "".join(rng.choice(SYLLABLES) for _ in range(3)).title() + str(i)
+    return {"id": name.lower(), "type": "Organization", "name": f"{name} Inc."}
+
+
+def check_types(entity_index, path: Path) -> None:
+    """Raise if entities that share a name but not a type are merged."""
+    index = entity_index.EntityIndex(path, "CHECK")
+    cases = [
+        ({"id": "cloudsync_inc", "type": "Organization", "name": "CloudSync Inc."},
+         {"id": "cloudsync", "type": "Product", "name": "CloudSync"}),
+        ({"id": "paris", "type": "Location", "name": "Paris"},
+         {"id": "paris_hilton", "type": "Person", "name": "Paris Hilton", "aliases": ["Paris"]}),
+    ]
+    try:
+        for first, second in cases:
+            first_id = index.resolve(first)["id"]
+            second_id = index.resolve(second)["id"]
+            if first_id == second_id:
+                raise RuntimeError(f"{second['type']} {second['name']!r} was merged into {first['type']} {first_id!r}")
+            # Same type again: resolved exactly, not registered twice
+            if index.resolve(second)["id"] != second_id:
+                raise RuntimeError(f"{second['type']} {second['name']!r} did not resolve to {second_id!r}")
+    finally:
+        index.close()
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    count = int(args[args.index("--entities") + 1]) if "--entities" in args else 200_000
+    lookups = int(args[args.index("--lookups") + 1]) if "--lookups" in args else 2_000
+    entity_index = load_script(REPO_ROOT / "04-knowledge-graph" / "entity_index.py", "bench_entity_index")
+    rng = random.Random(0)
+    entities = [person(rng, i) if i % 2 else company(rng, i) for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_types(entity_index, Path(tmp) / "check.sqlite")
+        path = Path(tmp) / "entity_index.sqlite"
+        index = entity_index.EntityIndex(path, "BENCH")
+        start = time.perf_counter()
+        for entity in entities:
+            index.resolve(entity)
+        index.commit()
+        build_s = time.perf_counter() - start
+        size_mb = path.stat().st_size / 1e6
+        print(f"Indexed {count} entities in {build_s:.1f} s ({count / build_s:,.0f}/s), {size_mb:.1f} MB")
+
+        samples = rng.sample(entities, min(lookups, count))
+        people = [e for e in samples if e["type"] == "Person"]
+        kinds = {
+            "exact": samples,
+            "variant": [
+                {**e, "id": f"dr_{e['id']}", "name": f"Dr. {e['name']}"} if e["type"] == "Person"
+                else {**e, "id": f"{e['id']}_inc", "name": e["name"].replace(" Inc.", "")}
+                for e in samples
+            ],
+            "token": [
+                {**e, "id": e["id"].replace("_", "_q_"), "name": e["name"].replace(" ", " Q. ")} for e in people
+            ],
+            "new": [{**person(rng, count + i), "name": f"Zed Unknown{count + i}"} for i in range(len(samples))],
+        }
+
+        header = f"{'lookup':<8} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'matched':>8}"
+        print(header)
+        print("-" * len(header))
+        for kind, items in kinds.items():
+            latencies, new_before = [], index.stats.new
+            for item in items:
+                start = time.perf_counter()
+                index.resolve(item)
+                latencies.append((time.perf_counter() - start) * 1000)
+            matched = len(items) - (index.stats.new - new_before)
+            print(
+                f"{kind:<8} {len(items):>6} {percentile(latencies, 50):>8.3f} {percentile(latencies, 95):>8.3f} "
+                f"{matched / len(items):>8.0%}"
+            )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
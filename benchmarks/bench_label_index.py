@@ -0,0 +1,112 @@
+"""
+Entity linking of `chat_kg.py` (`04-knowledge-graph/label_index.py`) on a
+large synthetic graph.
+
+Builds an rdflib graph of `--entities` people (default 20,000), each with an
+`rdfs:label` and an `ex:works_for` link to one of 500 companies, then:
+
+1. builds the trigram `LabelIndex` from all labels and links `--questions`
+   questions (`Who does Maria Chen42 work for?`, a third of them with the
+   name lower-cased, a third as a possessive, `Maria Chen42's employer`):
+   p50/p95 and how many linked the right entity,
+2. answers the questions with the query the prompt used to ask for (label
+   scan with `FILTER(CONTAINS(LCASE(?label), ...))`) and with the linked URI
+   bound directly, and reports p50/p95 of both.
+
+The queries run on rdflib in-process, not on HANA. The absolute times
+differ, but so does the shape: the scan touches every label, the bound query
+only the entity's own triples.
+
+Usage:
+    uv run bench_label_index.py
+    uv run bench_label_index.py --entities 100000 --questions 100
+"""
+import random
+import sys
+import time
+
+from rdflib import RDFS, Graph, Literal, Namespace
+
+from run_benchmarks import REPO_ROOT, load_script, percentile
+
+EX = Namespace("http://workshop.example.org/")
+FIRST = ["Maria", "David", "Anna", "James", "Yuki", "Sofia", "Omar", "Lena", "Raj", "Emma"]
+LAST = ["Chen", "Park", "Mueller", "Tanaka", "Garcia", "Smith", "Kowalski", "Rossi", "Singh", "Kim"]
+COMPANIES = 500
+
+SCAN_QUERY = """PREFIX ex: <http://workshop.example.org/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?company WHERE {{
+  ?person rdfs:label ?label .
+  FILTER(CONTAINS(LCASE(?label), "{mention}"))
+  ?person ex:works_for ?c .
+  ?c rdfs:label ?company
+}}"""
+LINKED_QUERY = """PREFIX ex: <http://workshop.example.org/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?company WHERE {{
+  <{uri}> ex:works_for ?c .
+  ?c rdfs:label ?company
+}}"""
+
+
+def timed_query(graph: Graph, sparql: str) -> tuple[float, set[str]]:
+    start = time.perf_counter()
+    rows = {str(row[0]) for row in graph.query(sparql)}
+    return (time.perf_counter() - start) * 1000, rows
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    count = int(args[args.index("--entities") + 1]) if "--entities" in args else 20_000
+    questions = int(args[args.index("--questions") + 1]) if "--questions" in args else 50
+    label_index = load_script(REPO_ROOT / "04-knowledge-graph" / "label_index.py", "bench_label_index")
+    rng = random.Random(0)
+
+    graph = Graph()
+    labels: list[tuple[str, str]] = []
+    for i in range(COMPANIES):
+        company = EX[f"company{i}"]
+        graph.add((company, RDFS.label, Literal(f"Company {i} Ltd.")))
+        labels.append((str(company), f"Company {i} Ltd."))
+    people = []
+    for i in range(count):
+        person, name = EX[f"person{i}"], f"{rng.choice(FIRST)} {rng.choice(LAST)}{i}"
+        graph.add((person, RDFS.label, Literal(name)))
+        graph.add((person, EX.works_for, EX[f"company{rng.randrange(COMPANIES)}"]))
+        labels.append((str(person), name))
+        people.append((str(person), name))
+
+    start = time.perf_counter()
+    index = label_index.LabelIndex(labels)
+    print(f"Indexed {len(index)} labels in {time.perf_counter() - start:.2f} s")
+
+    link_ms, correct, scan_ms, linked_ms, same = [], 0, [], [], 0
+    for n, (uri, name) in enumerate(rng.sample(people, min(questions, count))):
+        question = (
+            f"Who does {name} work for?", f"who does {name.lower()} work for", f"What is {name}'s employer?"
+        )[n % 3]
+        start = time.perf_counter()
+        links = index.link(question)
+        link_ms.append((time.perf_counter() - start) * 1000)
+        correct += any(uri in link.uris for link in links)
+
+        scan_time, scan_rows = timed_query(graph, SCAN_QUERY.format(mention=name.lower()))
+        linked_time, linked_rows = timed_query(graph, LINKED_QUERY.format(uri=uri))
+        scan_ms.append(scan_time)
+        linked_ms.append(linked_time)
+        same += scan_rows == linked_rows
+
+    n = len(link_ms)
+    print(f"Linking: p50 {percentile(link_ms, 50):.2f} ms, p95 {percentile(link_ms, 95):.2f} ms, "
+          f"{correct}/{n} linked to the right entity")
+    header = f"{'query':<18} {'p50 ms':>8} {'p95 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    print(f"{'label scan':<18} {percentile(scan_ms, 50):>8.2f} {percentile(scan_ms, 95):>8.2f}")
+    print(f"{'linked URI':<18} {percentile(linked_ms, 50):>8.2f} {percentile(linked_ms, 95):>8.2f}")
+    print(f"Same answer in {same}/{n} questions")
+
+
+if __name__ == "__main__":
+    main()
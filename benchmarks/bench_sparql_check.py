@@ -0,0 +1,131 @@
+"""
+Wasted HANA round trips and failed turns with and without the local SPARQL
+check of `chat_kg.py` (`04-knowledge-graph/sparql_check.py`).
+
+Ingests the sample document offline, then asks `--turns` questions (default
+20) twice: with `KG_SPARQL_CHECK=0` and with the check and repair prompts.
+The offline LLM returns a broken query for a share of the questions
+(`--fault-rate`, default 0.4), spread evenly over four typical mistakes:
+
+- prefix: `ex:` used without `PREFIX ex:` (HANA raises an error),
+- graph: no `FROM <graph>` (HANA reads the empty default graph),
+- predicate: a misspelt predicate (runs, returns nothing),
+- syntax: a missing closing brace (HANA raises an error),
+
+and a correct query for every repair prompt. Each turn sends one query to
+HANA; the turn fails if that round trip raises an error or returns no rows
+(every question has an answer in the ingested graph).
+
+Usage:
+    uv run bench_sparql_check.py
+    uv run bench_sparql_check.py --turns 40 --fault-rate 0.2
+"""
+import sys
+from dataclasses import replace
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from run_benchmarks import KG_DOCUMENT, KG_QUESTIONS, REPO_ROOT, environ, load_script, percentile, run_chat, run_cli
+from workshop_common.fakes import OfflineBackends, default_responder
+
+GRAPH_URI = "BENCH_SPARQL_CHECK"
+VALID_QUERY = """```sparql
+PREFIX ex: <http://workshop.example.org/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT DISTINCT ?label FROM <{graph}>
+WHERE {{ ?s ex:mentioned_with ?o . ?o rdfs:label ?label }}
+LIMIT 20
+```"""
+FAULTS = {
+    "prefix": lambda q: q.replace("PREFIX ex: <http://workshop.example.org/>\n", ""),
+    "graph": lambda q: q.replace(f" FROM <{GRAPH_URI}>", ""),
+    "predicate": lambda q: q.replace("ex:mentioned_with", "ex:mentioned_wth"),
+    "syntax": lambda q: q.replace("?label }", "?label"),
+}
+
+
+class FaultyResponder:
+    """Offline LLM that gets a share of the generated SPARQL wrong."""
+
+    def __init__(self, fault_rate: float) -> None:
+        self.fault_rate = fault_rate
+        self.faults = list(FAULTS)
+        self.generated = 0
+        self.calls = 0
+
+    def __call__(self, messages: list[BaseMessage], tools: list[dict]) -> AIMessage:
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        query = VALID_QUERY.format(graph=GRAPH_URI)
+        if "Corrected SPARQL query:" in prompt:
+            return AIMessage(content=query)
+        if "SPARQL query:" in prompt:
+            # Exactly fault_rate of the queries, evenly spaced
+            self.generated += 1
+            if int(self.generated * self.fault_rate) > int((self.generated - 1) * self.fault_rate):
+                fault = self.faults.pop(0)
+                self.faults.append(fault)
+                query = FAULTS[fault](query)
+            return AIMessage(content=query)
+        return default_responder(messages, tools)
+
+
+def run_mode(check: bool, turns: int, fault_rate: float) -> dict:
+    responder = FaultyResponder(fault_rate)
+    backends = replace(OfflineBackends.from_env(), responder=responder)
+    settings = {"KG_GRAPH_URI": GRAPH_URI, "KG_ENTITY_INDEX": "off", "KG_SPARQL_CHECK": "1" if check else "0"}
+    with environ(**settings):
+        ingest_kg = load_script(REPO_ROOT / "04-knowledge-graph" / "ingest_kg.py", "bench_check_ingest_kg")
+        chat_kg = load_script(REPO_ROOT / "04-knowledge-graph" / "chat_kg.py", f"bench_check_chat_kg_{check}")
+    backends.patch(ingest_kg)
+    backends.patch(chat_kg)
+    run_cli(ingest_kg.main, ["ingest_kg.py", str(KG_DOCUMENT)])
+
+    counts = {"trips": 0, "errors": 0, "empty": 0}
+    execute = chat_kg.execute_sparql_select
+
+    def counted_execute(connection, sparql: str) -> list[dict]:
+        counts["trips"] += 1
+        try:
+            results = execute(connection, sparql)
+        except Exception:
+            counts["errors"] += 1
+            raise
+        counts["empty"] += not results
+        return results
+
+    chat_kg.execute_sparql_select = counted_execute
+    responder.calls = 0
+    questions = (KG_QUESTIONS * turns)[:turns]
+    latencies = run_chat(chat_kg.main, questions, ["chat_kg.py"])
+    return {
+        "turns": len(latencies),
+        "llm_calls": responder.calls,
+        "trips": counts["trips"],
+        "errors": counts["errors"],
+        "empty": counts["empty"],
+        "p50_ms": percentile([t * 1000 for t in latencies], 50),
+    }
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    turns = int(args[args.index("--turns") + 1]) if "--turns" in args else 20
+    fault_rate = float(args[args.index("--fault-rate") + 1]) if "--fault-rate" in args else 0.4
+
+    header = (
+        f"{'mode':<14} {'turns':>6} {'LLM calls':>10} {'HANA trips':>11} {'errors':>7} {'empty':>6} "
+        f"{'failed turns':>13} {'p50 ms':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, check in (("no check", False), ("check+repair", True)):
+        r = run_mode(check, turns, fault_rate)
+        print(
+            f"{name:<14} {r['turns']:>6} {r['llm_calls']:>10} {r['trips']:>11} {r['errors']:>7} {r['empty']:>6} "
+            f"{r['errors'] + r['empty']:>13} {r['p50_ms']:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Throughput and chunk-size variance of the ingestion splitters.
+
+Splits the Japanese and English sample documents, each repeated to about
+`--megabytes` (default 2), with:
+
+- `recursive/chars`: `RecursiveCharacterTextSplitter(500, 50)`, the default
+  `ingest.py` splitter (`RAG_SPLITTER=characters`),
+- `recursive/tokens`: the same splitter measuring tokens (256, 32),
+- `token-aware`: `splitter.TokenAwareSplitter(256, 32)` (`RAG_SPLITTER=tokens`),
+
+and reports MB/s (best of `--runs`) and the token size of the chunks: mean,
+standard deviation, coefficient of variation and how many exceed 256 tokens.
+
+Usage:
+    uv run bench_splitter.py
+    uv run bench_splitter.py --megabytes 10 --runs 5
+    uv run bench_splitter.py --tiktoken      # count tokens with tiktoken (cl100k_base)
+"""
+import statistics
+import sys
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from run_benchmarks import REPO_ROOT, load_script
+
+TEXT_EXAMPLES = REPO_ROOT / "03-cli-embedding" / "text-examples"
+DOCUMENTS = {
+    "ja": TEXT_EXAMPLES / "fuso-super-great-ja.md",
+    "en": TEXT_EXAMPLES / "results-mar2025.md",
+}
+CHUNK_TOKENS = 256
+OVERLAP_TOKENS = 32
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    target_mb = float(args[args.index("--megabytes") + 1]) if "--megabytes" in args else 2.0
+    runs = int(args[args.index("--runs") + 1]) if "--runs" in args else 3
+
+    splitter = load_script(REPO_ROOT / "03-cli-embedding" / "splitter.py", "bench_splitter_module")
+    count_tokens = splitter.tiktoken_counter() if "--tiktoken" in args else splitter.estimate_tokens
+    splitters = {
+        "recursive/chars": RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50),
+        "recursive/tokens": RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_TOKENS, chunk_overlap=OVERLAP_TOKENS, length_function=count_tokens
+        ),
+        "token-aware": splitter.TokenAwareSplitter(CHUNK_TOKENS, OVERLAP_TOKENS, count_tokens=count_tokens),
+    }
+
+    header = (
+        f"{'document':<12} {'splitter':<17} {'MB/s':>7} {'chunks':>7} {'mean tok':>9} "
+        f"{'stdev':>7} {'CV':>6} {'max':>6} {f'>{CHUNK_TOKENS}':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for language, path in DOCUMENTS.items():
+        text = path.read_text(encoding="utf-8")
+        text *= max(1, round(target_mb * 1e6 / len(text.encode("utf-8"))))
+        megabytes = len(text.encode("utf-8")) / 1e6
+        for name, text_splitter in splitters.items():
+            best = float("inf")
+            for _ in range(runs):
+                start = time.perf_counter()
+                chunks = text_splitter.split_text(text)
+                best = min(best, time.perf_counter() - start)
+            sizes = [count_tokens(chunk) for chunk in chunks]
+            mean = statistics.fmean(sizes)
+            stdev = statistics.pstdev(sizes)
+            print(
+                f"{f'{language} {megabytes:.1f}MB':<12} {name:<17} {megabytes / best:>7.1f} {len(chunks):>7} "
+                f"{mean:>9.1f} {stdev:>7.1f} {stdev / mean:>6.2f} {max(sizes):>6.0f} "
+                f"{sum(1 for s in sizes if s > CHUNK_TOKENS):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Storage, query latency and recall@k of compact vector columns.
+
+Embeds a corpus (the workshop documents, split like `ingest.py`) once at
+full size, then stores it once per `VectorStorage` setting – `REAL_VECTOR`
+and `HALF_VECTOR`, each at full and reduced dimensions – and runs the same
+queries against every copy. recall@k is measured against exact float32
+search over the full-size vectors.
+
+Usage:
+    uv run bench_vectors.py                              # offline: fake embeddings, in-memory store
+    uv run bench_vectors.py --dimensions 768,512,256 --k 5
+    uv run bench_vectors.py --live                       # real embedding model (AI Core credentials)
+    uv run bench_vectors.py --live --hana                # real HANA tables (created, then dropped)
+
+Offline, storage is computed from HANA's vector format (4-byte header +
+2 or 4 bytes per dimension) and latency is an in-process exact scan, so only
+the relative numbers mean something; recall depends on the embedding model
+and should be checked with `--live`. With `--hana` the storage is the
+in-memory size HANA reports for the vector column.
+"""
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from workshop_common.fakes import FakeEmbeddings, FakeHanaDB
+from workshop_common.vectors import VectorStorage, reduce_vector
+
+from run_benchmarks import RAG_QUESTIONS, REPO_ROOT, percentile
+
+CORPUS = [
+    REPO_ROOT / "03-cli-embedding" / "text-examples" / "results-mar2025.md",
+    REPO_ROOT / "03-cli-embedding" / "text-examples" / "fuso-super-great-ja.md",
+    REPO_ROOT / "04-knowledge-graph" / "sample-company.txt",
+    *sorted(REPO_ROOT.glob("*/README.md")),
+    *sorted((REPO_ROOT / "documentation").rglob("*.md")),
+]
+OFFLINE_DIMENSIONS = 1536  # like text-embedding-3-small
+TABLE_PREFIX = "BENCH_VECTORS"
+
+
+def load_chunks() -> list[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    docs = [
+        Document(page_content=path.read_text(encoding="utf-8"), metadata={"source": path.name})
+        for path in CORPUS
+        if path.exists()
+    ]
+    return splitter.split_documents(docs)
+
+
+def make_queries(chunks: list[Document]) -> list[str]:
+    """The RAG questions plus the opening words of every 4th chunk."""
+    queries = list(RAG_QUESTIONS)
+    for doc in chunks[::4]:
+        words = doc.page_content.split()
+        if len(words) >= 6:
+            queries.append(" ".join(words[:12]))
+    return queries
+
+
+def exact_top_k(query: list[float], vectors: list[list[float]], k: int) -> set[int]:
+    scores = [sum(a * b for a, b in zip(query, v)) for v in vectors]
+    return set(sorted(range(len(vectors)), key=scores.__getitem__, reverse=True)[:k])
+
+
+def open_store(storage: VectorStorage, embeddings, use_hana: bool):
+    """An empty vector store with the given column settings."""
+    if not use_hana:
+        return FakeHanaDB(embedding=embeddings, tables={}, **storage.hana_kwargs())
+
+    from langchain_hana import HanaDB
+    from workshop_common.hana import get_pool
+
+    table = f"{TABLE_PREFIX}_{storage.vector_type}_{storage.dimensions or 'FULL'}"
+    connection = get_pool().acquire()
+    drop_table(connection, table)
+    return HanaDB(embedding=embeddings, connection=connection, table_name=table, **storage.hana_kwargs())
+
+
+def drop_table(connection, table: str) -> None:
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f'DROP TABLE "{table}"')
+    except Exception:  # noqa: BLE001 - table did not exist
+        pass
+    finally:
+        cursor.close()
+
+
+def hana_vector_bytes(db) -> int:
+    """In-memory size of the vector column after a delta merge."""
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute(f'MERGE DELTA OF "{db.table_name}"')
+        cursor.execute(
+            "SELECT MEMORY_SIZE_IN_TOTAL FROM M_CS_COLUMNS "
+            "WHERE SCHEMA_NAME = CURRENT_SCHEMA AND TABLE_NAME = ? AND COLUMN_NAME = ?",
+            (db.table_name, db.vector_column),
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    finally:
+        cursor.close()
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    live = "--live" in args
+    use_hana = "--hana" in args
+    k = int(args[args.index("--k") + 1]) if "--k" in args else 5
+    dimensions = (
+        [int(d) for d in args[args.index("--dimensions") + 1].split(",")]
+        if "--dimensions" in args
+        else [512, 256]
+    )
+
+    if live or use_hana:
+        load_dotenv(REPO_ROOT / ".env")
+    if live:
+        from workshop_common.llm import get_embedding_model
+
+        embeddings = get_embedding_model(os.getenv("LLM_EMBEDDING_MODEL", "text-embedding-3-small"))
+    else:
+        embeddings = FakeEmbeddings(dimensions=OFFLINE_DIMENSIONS)
+
+    chunks = load_chunks()
+    queries = make_queries(chunks)
+    print(f"Embedding {len(chunks)} chunks and {len(queries)} queries...", file=sys.stderr)
+    vectors = embeddings.embed_documents([doc.page_content for doc in chunks])
+    query_vectors = embeddings.embed_documents(queries)
+    full_dimensions = len(vectors[0])
+    truth = [exact_top_k(q, vectors, k) for q in query_vectors]
+
+    settings = [VectorStorage("REAL_VECTOR"), VectorStorage("HALF_VECTOR")]
+    for d in dimensions:
+        if d < full_dimensions:
+            settings += [VectorStorage("REAL_VECTOR", d), VectorStorage("HALF_VECTOR", d)]
+
+    header = (
+        f"{'storage':<22} {'bytes/vec':>9} {'size KB':>9} {'vs full':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {f'recall@{k}':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    full_size = None
+    for storage in settings:
+        db = open_store(storage, storage.embeddings(embeddings), use_hana)
+        reduced = [reduce_vector(v, storage.dimensions or full_dimensions) for v in vectors]
+        texts = [doc.page_content for doc in chunks]
+        metadatas = [{"i": i} for i in range(len(chunks))]
+        db.add_texts(texts, metadatas, embeddings=reduced)
+
+        latencies, hits = [], 0
+        for query, expected in zip(query_vectors, truth):
+            query = reduce_vector(query, storage.dimensions or full_dimensions)
+            start = time.perf_counter()
+            found = db.similarity_search_by_vector(query, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({doc.metadata["i"] for doc in found} & expected)
+
+        size = hana_vector_bytes(db) if use_hana else len(chunks) * storage.bytes_per_vector(full_dimensions)
+        full_size = full_size or size
+        print(
+            f"{storage.label:<22} {storage.bytes_per_vector(full_dimensions):>9} {size / 1024:>9.1f} "
+            f"{size / full_size:>7.0%} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+            f"{hits / (k * len(truth)):>9.3f}"
+        )
+        if use_hana:
+            from workshop_common.hana import get_pool
+
+            drop_table(db.connection, db.table_name)
+            get_pool().release(db.connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+End-to-end benchmark suite for the exercises, fully offline.
+
+Runs the real exercise scripts (`ingest.py`, `chat_rag.py`, `ingest_kg.py`,
+`chat_kg.py`, `chat_hybrid.py` and the step-05 agent graph) with their SAP AI
+Core and HANA backends replaced by the deterministic fakes from
+`workshop_common.fakes`, including injected latency. For every scenario it
+reports throughput and latency percentiles and compares them with
+`baseline.json`.
+
+Chat scenarios are driven through their normal CLI loop: `input()` is
+replaced by a scripted feeder, and the time between two prompts is one turn.
+
+Usage:
+    uv run run_benchmarks.py                    # run + compare to baseline
+    uv run run_benchmarks.py --update-baseline  # store the results as new baseline
+    uv run run_benchmarks.py --only chat_rag --tolerance 0.1
+
+Exits with status 1 if any scenario's p50 latency or throughput regressed by
+more than the tolerance (default 20%).
+"""
+import builtins
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Iterator
+
+from workshop_common.fakes import Latency, OfflineBackends
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+
+RAG_DOCUMENT = REPO_ROOT / "03-cli-embedding" / "text-examples" / "results-mar2025.md"
+KG_DOCUMENT = REPO_ROOT / "04-knowledge-graph" / "sample-company.txt"
+
+RAG_QUESTIONS = [
+    "What was the revenue in March 2025?",
+    "Summarize the main results.",
+    "Which regions performed best?",
+    "What are the risks mentioned?",
+    "How did operating profit develop?",
+]
+# Triples per INSERT DATA batch for `ingest_kg.py --stream`
+KG_STREAM_BATCH_TRIPLES = 20
+# Graph branch timeout of `hybrid_kg_timeout`, below the offline SPARQL
+# generation time, so the answer never waits for the graph
+HYBRID_KG_TIMEOUT_S = "0.3"
+KG_QUESTIONS = [
+    "Who founded TechVision?",
+    "What products does the company offer?",
+    "Where is the company headquartered?",
+    "How many employees does the company have?",
+]
+# Long-ish user turns (pasted text + question), so the history grows quickly
+CHAT_PASSAGE = (RAG_DOCUMENT.read_text(encoding="utf-8")[:800]).replace("\n", " ")
+CHAT_MESSAGES = [
+    f"Here is an excerpt: {CHAT_PASSAGE} What are the key figures?",
+    f"And this part: {CHAT_PASSAGE} Which risks does it mention?",
+    f"Compare with this: {CHAT_PASSAGE} What changed?",
+    "Summarize our discussion so far in three bullet points.",
+]
+CHAT_TURNS = 30
+# Prefill cost per prompt token for the chat scenario, so a growing history
+# shows up as growing latency (the other scenarios keep the env default of 0)
+CHAT_PROMPT_TOKEN_MS = 0.25
+
+# Mixed workload for the router: simple look-ups plus reasoning questions
+ROUTER_QUESTIONS = RAG_QUESTIONS + [
+    "Compare the regions and explain why the best one outperformed the others.",
+    "Why did operating profit change, and what are the trade-offs for next quarter?",
+]
+# Simulated fast model: this fraction of the strong model's latencies
+FAST_MODEL_LATENCY_FACTOR = 0.4
+
+AGENT_REQUESTS = [
+    "I am from the IT team. Can I get an SAP license?",
+    "I am from the Marketing team. Can I get an Adobe license?",
+    "The Finance team needs SAP HANA.",
+    "Can the IT team get Adobe CC?",
+]
+
+
+@dataclass
+class Result:
+    scenario: str
+    ops: int
+    total_s: float
+    throughput_ops_s: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(scenario: str, latencies_s: list[float], total_s: float) -> Result:
+    ms = [v * 1000 for v in latencies_s]
+    return Result(
+        scenario=scenario,
+        ops=len(ms),
+        total_s=round(total_s, 3),
+        throughput_ops_s=round(len(ms) / total_s, 3) if total_s else 0.0,
+        p50_ms=round(percentile(ms, 50), 1),
+        p95_ms=round(percentile(ms, 95), 1),
+        p99_ms=round(percentile(ms, 99), 1),
+    )
+
+
+def load_script(path: Path, name: str) -> ModuleType:
+    """Import an exercise script by file path (folders are not packages)."""
+    sys.path.insert(0, str(path.parent))
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(path.parent))
+    return module
+
+
+class ScriptedInput:
+    """Replacement for `input()` that feeds prompts and times each turn."""
+
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = list(lines)
+        self.turns_s: list[float] = []
+        self._last: float | None = None
+
+    def __call__(self, prompt: str = "") -> str:
+        now = time.perf_counter()
+        if self._last is not None:
+            self.turns_s.append(now - self._last)
+        self._last = now
+        return self.lines.pop(0) if self.lines else ""
+
+
+def run_chat(main: Callable[[], None], questions: list[str], argv: list[str]) -> list[float]:
+    feeder = ScriptedInput(questions)
+    original_input, original_argv = builtins.input, sys.argv
+    builtins.input, sys.argv = feeder, argv
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main()
+    finally:
+        builtins.input, sys.argv = original_input, original_argv
+    return feeder.turns_s
+
+
+@contextlib.contextmanager
+def environ(**values: str) -> Iterator[None]:
+    """Temporarily set environment variables (read by the scripts' main())."""
+    original = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_cli(main: Callable[[], None], argv: list[str]) -> float:
+    original_argv = sys.argv
+    sys.argv = argv
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main()
+    finally:
+        sys.argv = original_argv
+    return time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+
+def bench_rag(backends: OfflineBackends, repeats: int) -> list[Result]:
+    ingest = load_script(REPO_ROOT / "03-cli-embedding" / "ingest.py", "bench_ingest")
+    chat_rag = load_script(REPO_ROOT / "03-cli-embedding" / "chat_rag.py", "bench_chat_rag")
+    backends.patch(ingest)
+    backends.patch(chat_rag)
+
+    start = time.perf_counter()
+    ingest_runs = [run_cli(ingest.main, ["ingest.py", str(RAG_DOCUMENT)]) for _ in range(repeats)]
+    results = [summarize("ingest", ingest_runs, time.perf_counter() - start)]
+
+    start = time.perf_counter()
+    turns = run_chat(chat_rag.main, RAG_QUESTIONS * repeats, ["chat_rag.py"])
+    results.append(summarize("chat_rag", turns, time.perf_counter() - start))
+    return results
+
+
+def bench_kg(backends: OfflineBackends, repeats: int) -> list[Result]:
+    # Entity resolution index of ingest_kg.py in a scratch file
+    with tempfile.TemporaryDirectory() as tmp, environ(KG_ENTITY_INDEX=str(Path(tmp) / "entity_index.sqlite")):
+        ingest_kg = load_script(REPO_ROOT / "04-knowledge-graph" / "ingest_kg.py", "bench_ingest_kg")
+        chat_kg = load_script(REPO_ROOT / "04-knowledge-graph" / "chat_kg.py", "bench_chat_kg")
+        backends.patch(ingest_kg)
+        backends.patch(chat_kg)
+
+        start = time.perf_counter()
+        ingest_runs = [run_cli(ingest_kg.main, ["ingest_kg.py", str(KG_DOCUMENT)]) for _ in range(repeats)]
+        results = [summarize("ingest_kg", ingest_runs, time.perf_counter() - start)]
+        expected = backends.triple_store.triples(ingest_kg.GRAPH_URI)
+
+        # --stream with small batches (written while the LLM generates) vs. one
+        # batch written after generation; both stream, so the LLM cost is the same
+        argv = ["ingest_kg.py", str(KG_DOCUMENT), "--stream"]
+        for scenario, batch in (("ingest_kg_stream", KG_STREAM_BATCH_TRIPLES), ("ingest_kg_stream_end", 1_000_000)):
+            with environ(KG_INSERT_BATCH_TRIPLES=str(batch)):
+                module = load_script(REPO_ROOT / "04-knowledge-graph" / "ingest_kg.py", f"bench_{scenario}")
+            backends.patch(module)
+            start = time.perf_counter()
+            runs = [run_cli(module.main, argv) for _ in range(repeats)]
+            results.append(summarize(scenario, runs, time.perf_counter() - start))
+            # Streaming must store the same (resolved) graph as the batch path
+            streamed = backends.triple_store.triples(module.GRAPH_URI)
+            if streamed != expected:
+                raise RuntimeError(
+                    f"{scenario}: {len(streamed)} triples, the non-streaming ingest stored {len(expected)} "
+                    f"({len(streamed ^ expected)} differ)"
+                )
+
+        start = time.perf_counter()
+        turns = run_chat(chat_kg.main, KG_QUESTIONS * repeats, ["chat_kg.py"])
+        results.append(summarize("chat_kg", turns, time.perf_counter() - start))
+        return results
+
+
+def bench_chat(backends: OfflineBackends, repeats: int) -> list[Result]:
+    """Long streaming chat session; `chat_tail` covers the last quarter of
+    the turns, so per-turn latency growing with the history is visible."""
+    backends = replace(
+        backends,
+        llm_prompt_token=Latency(
+            per_unit_ms=float(os.getenv("FAKE_LLM_PROMPT_TOKEN_MS", CHAT_PROMPT_TOKEN_MS))
+        ),
+    )
+    chat = load_script(REPO_ROOT / "02-cli-chat" / "main.py", "bench_chat")
+    backends.patch(chat)
+
+    turns: list[float] = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        lines = [CHAT_MESSAGES[i % len(CHAT_MESSAGES)] for i in range(CHAT_TURNS)]
+        turns.extend(run_chat(chat.main, lines, ["main.py"]))
+    total = time.perf_counter() - start
+    tail = [t for i, t in enumerate(turns) if i % CHAT_TURNS >= CHAT_TURNS * 3 // 4]
+    return [summarize("chat", turns, total), summarize("chat_tail", tail, total * len(tail) / len(turns))]
+
+
+def bench_routing(backends: OfflineBackends, repeats: int) -> list[Result]:
+    """The RAG chat with one model (`rag_single`) vs. routed between a fast
+    and a strong model (`rag_routed`) on the same mixed workload."""
+    fast_model = os.getenv("LLM_FAST_MODEL", "gpt-4.1-mini")
+
+    def scaled(latency: Latency) -> Latency:
+        return Latency(
+            latency.base_ms * FAST_MODEL_LATENCY_FACTOR,
+            latency.per_unit_ms * FAST_MODEL_LATENCY_FACTOR,
+            latency.jitter,
+        )
+
+    fast = replace(
+        backends,
+        llm_first_token=scaled(backends.llm_first_token),
+        llm_prompt_token=scaled(backends.llm_prompt_token),
+        llm_token=scaled(backends.llm_token),
+    )
+
+    def get_llm(model: str, **kwargs):
+        return (fast if model == fast_model else backends).init_llm(model, **kwargs)
+
+    ingest = load_script(REPO_ROOT / "03-cli-embedding" / "ingest.py", "bench_route_ingest")
+    backends.patch(ingest)
+    run_cli(ingest.main, ["ingest.py", str(RAG_DOCUMENT)])
+
+    results = []
+    for name, routing in (("rag_single", "0"), ("rag_routed", "1")):
+        chat_rag = load_script(REPO_ROOT / "03-cli-embedding" / "chat_rag.py", f"bench_{name}")
+        backends.patch(chat_rag)
+        chat_rag.get_llm = get_llm
+        start = time.perf_counter()
+        with environ(LLM_ROUTING=routing):
+            turns = run_chat(chat_rag.main, ROUTER_QUESTIONS * repeats, ["chat_rag.py"])
+        results.append(summarize(name, turns, time.perf_counter() - start))
+    return results
+
+
+def bench_multi_query(backends: OfflineBackends, repeats: int) -> list[Result]:
+    """Retrieval time per question with a single search (`retrieve`) and
+    with three query variants searched concurrently (`retrieve_multi`)."""
+    ingest = load_script(REPO_ROOT / "03-cli-embedding" / "ingest.py", "bench_mq_ingest")
+    backends.patch(ingest)
+    run_cli(ingest.main, ["ingest.py", str(RAG_DOCUMENT)])
+
+    chat_rag = load_script(REPO_ROOT / "03-cli-embedding" / "chat_rag.py", "bench_mq_chat_rag")
+    backends.patch(chat_rag)
+    results = []
+    with chat_rag.open_vector_store() as db, chat_rag.MultiQueryRetriever(
+        db, open_store=chat_rag.open_vector_store, mode="local", variants=3
+    ) as multi:
+        for name, retrieve in (
+            ("retrieve", lambda q: db.similarity_search(q, k=5)),
+            ("retrieve_multi", multi.invoke),
+        ):
+            latencies = []
+            start = time.perf_counter()
+            for question in RAG_QUESTIONS * repeats:
+                t0 = time.perf_counter()
+                retrieve(question)
+                latencies.append(time.perf_counter() - t0)
+            results.append(summarize(name, latencies, time.perf_counter() - start))
+    return results
+
+
+def bench_rag_eval(backends: OfflineBackends, repeats: int) -> list[Result]:
+    """The batch evaluation runner: questions answered 4 at a time."""
+    ingest = load_script(REPO_ROOT / "03-cli-embedding" / "ingest.py", "bench_eval_ingest")
+    backends.patch(ingest)
+    run_cli(ingest.main, ["ingest.py", str(RAG_DOCUMENT)])
+
+    eval_rag = load_script(REPO_ROOT / "03-cli-embedding" / "eval_rag.py", "bench_eval_rag")
+    backends.patch(eval_rag.chat_rag)
+    questions = eval_rag.load_questions(REPO_ROOT / "03-cli-embedding" / "eval-questions.jsonl")
+    evaluator = eval_rag.Evaluator(concurrency=4)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(evaluator.evaluate, questions * repeats))
+    finally:
+        evaluator.close()
+    total = time.perf_counter() - start
+    errors = [r.error for r in results if r.error]
+    if errors:
+        raise RuntimeError(f"rag_eval: {len(errors)} questions failed, e.g. {errors[0]}")
+    return [summarize("rag_eval", [r.total_ms / 1000 for r in results], total)]
+
+
+def bench_agent(backends: OfflineBackends, repeats: int) -> list[Result]:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["AGENT_CHECKPOINT_DB"] = str(Path(tmp) / "bench.sqlite")
+        agent = load_script(
+            REPO_ROOT / "05-agent-graph-complete" / "license_agent_complete.py", "bench_agent"
+        )
+        agent._model_instance = backends.init_llm(agent.MODEL)
+
+        start = time.perf_counter()
+        turns = run_chat(agent.main, AGENT_REQUESTS * repeats, ["license_agent_complete.py", "bench"])
+        result = summarize("agent", turns, time.perf_counter() - start)
+
+        if agent._ledger_conn is not None:
+            agent._ledger_conn.close()
+    return [result]
+
+
+def bench_hybrid(backends: OfflineBackends, repeats: int) -> list[Result]:
+    """Hybrid chat with both branches in time (`chat_hybrid`) and with the
+    graph branch cut off by its timeout (`hybrid_kg_timeout`)."""
+    ingest = load_script(REPO_ROOT / "03-cli-embedding" / "ingest.py", "bench_hybrid_ingest")
+    backends.patch(ingest)
+    run_cli(ingest.main, ["ingest.py", str(RAG_DOCUMENT)])
+    with environ(KG_ENTITY_INDEX="off"):
+        ingest_kg = load_script(REPO_ROOT / "04-knowledge-graph" / "ingest_kg.py", "bench_hybrid_ingest_kg")
+    backends.patch(ingest_kg)
+    run_cli(ingest_kg.main, ["ingest_kg.py", str(KG_DOCUMENT)])
+
+    results = []
+    questions = [q for pair in zip(RAG_QUESTIONS, KG_QUESTIONS) for q in pair]
+    for scenario, kg_timeout in (("chat_hybrid", "15"), ("hybrid_kg_timeout", HYBRID_KG_TIMEOUT_S)):
+        with environ(HYBRID_KG_TIMEOUT=kg_timeout):
+            chat_hybrid = load_script(REPO_ROOT / "04-knowledge-graph" / "chat_hybrid.py", f"bench_{scenario}")
+        backends.patch(chat_hybrid)
+        backends.patch(chat_hybrid.chat_rag)
+        start = time.perf_counter()
+        turns = run_chat(chat_hybrid.main, questions * repeats, ["chat_hybrid.py"])
+        results.append(summarize(scenario, turns, time.perf_counter() - start))
+    return results
+
+
+SCENARIOS: dict[str, Callable[[OfflineBackends, int], list[Result]]] = {
+    "rag": bench_rag,
+    "kg": bench_kg,
+    "chat": bench_chat,
+    "routing": bench_routing,
+    "multi_query": bench_multi_query,
+    "rag_eval": bench_rag_eval,
+    "agent": bench_agent,
+    "hybrid": bench_hybrid,
+}
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+
+def compare(results: list[Result], baseline: dict[str, dict], tolerance: float) -> bool:
+    """Print a comparison table; return True if nothing regressed."""
+    ok = True
+    header = f"{'scenario':<20} {'ops':>4} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  vs baseline"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (
+            f"{r.scenario:<20} {r.ops:>4} {r.throughput_ops_s:>8.2f} "
+            f"{r.p50_ms:>9.1f} {r.p95_ms:>9.1f} {r.p99_ms:>9.1f}  "
+        )
+        base = baseline.get(r.scenario)
+        if not base:
+            print(line + "(no baseline)")
+            continue
+        p50_delta = (r.p50_ms - base["p50_ms"]) / base["p50_ms"] if base["p50_ms"] else 0.0
+        tput_delta = (
+            (r.throughput_ops_s - base["throughput_ops_s"]) / base["throughput_ops_s"]
+            if base["throughput_ops_s"] else 0.0
+        )
+        regressed = p50_delta > tolerance or tput_delta < -tolerance
+        ok = ok and not regressed
+        status = "REGRESSION" if regressed else "ok"
+        print(line + f"p50 {p50_delta:+.1%}, ops/s {tput_delta:+.1%}  {status}")
+    return ok
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    repeats = int(args[args.index("--repeats") + 1]) if "--repeats" in args else 3
+    tolerance = float(args[args.index("--tolerance") + 1]) if "--tolerance" in args else 0.2
+    only = args[args.index("--only") + 1].split(",") if "--only" in args else list(SCENARIOS)
+
+    backends = OfflineBackends.from_env()
+    results: list[Result] = []
+    for name in only:
+        print(f"Running scenario '{name}'...", file=sys.stderr)
+        results.extend(SCENARIOS[name](backends, repeats))
+        # Scenarios share one pool of 4: a leaked connection fails later ones
+        in_use = backends.get_pool().metrics().in_use
+        if in_use:
+            raise RuntimeError(f"{name}: {in_use} HANA connections were not returned to the pool")
+
+    if "--update-baseline" in args:
+        stored = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+        stored.update({r.scenario: asdict(r) for r in results})
+        BASELINE_FILE.write_text(json.dumps(stored, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if not compare(results, baseline, tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
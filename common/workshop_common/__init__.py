@@ -0,0 +1,5 @@
+"""Helpers shared by the workshop exercises.
+
+Each exercise depends on this folder as a local (editable) package, see the
+`[tool.uv.sources]` section of the exercise's `pyproject.toml`.
+"""
@@ -0,0 +1,654 @@
+"""Deterministic offline stand-ins for SAP AI Core and SAP HANA Cloud.
+
+Lets the exercises run (and be benchmarked) without any remote service:
+
+- `FakeChatModel` – LangChain chat model replacing `init_llm(...)`. Answers
+  the workshop prompts (RAG answer, KG extraction JSON, SPARQL generation,
+  tool calling) deterministically and reports `usage_metadata`.
+- `FakeEmbeddings` – hashing-based embeddings replacing
+  `init_embedding_model(...)`; similar texts get similar vectors.
+- `FakeHanaDB` – in-memory vector store with the `HanaDB` interface used by
+  the exercises (`add_documents`, `delete(filter=...)`, `similarity_search`,
+  `as_retriever`).
+- `FakeHanaConnection` – `dbapi.Connection` look-alike that implements
+  `SPARQL_TABLE(...)` and `SYS.SPARQL_EXECUTE` on an in-memory rdflib
+  dataset, so the real `HanaRdfGraph` and the KG scripts work unchanged.
+
+Every backend takes a `Latency` to inject realistic delays. `OfflineBackends`
+bundles them and can patch an exercise module in place:
+
+    backends = OfflineBackends.from_env()
+    backends.patch(chat_rag)       # replaces get_llm, HanaDB, get_pool, ...
+
+Latency is configured via `FAKE_LLM_FIRST_TOKEN_MS`, `FAKE_LLM_PROMPT_TOKEN_MS`
+(per input token, default 0), `FAKE_LLM_TOKEN_MS`,
+`FAKE_EMBED_MS`, `FAKE_EMBED_PER_TEXT_MS`, `FAKE_HANA_MS`,
+`FAKE_HANA_INSERT_TRIPLE_MS` (per inserted triple) and
+`FAKE_LATENCY_JITTER` (relative, e.g. 0.1 = +/-10%).
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Sequence
+from types import ModuleType
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict, Field
+
+from workshop_common.hana import HanaConnectionPool
+from workshop_common.vectors import VECTOR_TYPES, to_half
+
+
+# ---------------------------------------------------------------------------
+# Latency injection
+# ---------------------------------------------------------------------------
+
+
+class Latency:
+    """Deterministic delay: `base_ms + units * per_unit_ms`, with seeded jitter."""
+
+    def __init__(
+        self, base_ms: float = 0.0, per_unit_ms: float = 0.0, jitter: float = 0.0, seed: int = 0
+    ) -> None:
+        self.base_ms = base_ms
+        self.per_unit_ms = per_unit_ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay_s(self, units: int = 0, include_base: bool = True) -> float:
+        ms = (self.base_ms if include_base else 0.0) + units * self.per_unit_ms
+        if self.jitter and ms:
+            with self._lock:
+                ms *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        return max(ms, 0.0) / 1000
+
+    def sleep(self, units: int = 0, include_base: bool = True) -> None:
+        delay = self.delay_s(units, include_base)
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self, units: int = 0, include_base: bool = True) -> None:
+        delay = self.delay_s(units, include_base)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def _env_ms(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# ---------------------------------------------------------------------------
+# LLM
+# ---------------------------------------------------------------------------
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token, at least one per word)."""
+    return max(len(text.split()), math.ceil(len(text) / 4)) if text else 0
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def _answer_text(prompt: str, max_words: int) -> str:
+    """Deterministic answer that reuses words from the prompt's context."""
+    context = prompt.split("Context:", 1)[-1] if "Context:" in prompt else prompt
+    words = re.findall(r"\w+", context)[:max_words]
+    digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+    return f"[offline answer {digest}] " + " ".join(words)
+
+
+def _extraction_json(prompt: str) -> str:
+    """Entities = capitalised phrases of the analysed text, linked in order."""
+    text = prompt.split("---", 2)[1] if prompt.count("---") >= 2 else prompt
+    names: list[str] = []
+    for match in re.finditer(r"\b[A-Z][\w&-]*(?: [A-Z][\w&-]*)*", text):
+        name = match.group(0)
+        if len(name) > 2 and name not in names:
+            names.append(name)
+    entities = [
+        {"id": re.sub(r"\W+", "_", n.lower()).strip("_"), "type": "Entity", "name": n}
+        for n in names
+    ]
+    relationships = [
+        {"subject": a["id"], "predicate": "mentioned_with", "object": b["id"]}
+        for a, b in zip(entities, entities[1:])
+    ]
+    return json.dumps({"entities": entities, "relationships": relationships})
+
+
+def _sparql_query(prompt: str) -> str:
+    match = re.search(r"FROM <([^>]+)>", prompt)
+    graph = match.group(1) if match else "DEFAULT"
+    return (
+        "```sparql\n"
+        "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>\n"
+        f"SELECT ?s ?label FROM <{graph}>\n"
+        "WHERE { ?s rdfs:label ?label }\n"
+        "LIMIT 20\n"
+        "```"
+    )
+
+
+def default_responder(messages: list[BaseMessage], tools: list[dict]) -> AIMessage:
+    """Answer the workshop prompts deterministically.
+
+    With tools bound, calls each read-only tool once per turn (one per round,
+    like a cautious model would), passing the user's text as the argument,
+    then answers with the collected tool results.
+    """
+    prompt = "\n".join(_message_text(m) for m in messages)
+
+    if tools:
+        turn_start = max(
+            (i for i, m in enumerate(messages) if m.type == "human"), default=0
+        )
+        turn = messages[turn_start:]
+        called = {c["name"] for m in turn for c in (getattr(m, "tool_calls", None) or [])}
+        user_text = _message_text(messages[turn_start]) if messages else ""
+        for spec in tools:
+            if spec["name"] in called or spec["name"].startswith("deduct"):
+                continue
+            args = {spec["args"][0]: user_text} if spec["args"] else {}
+            call_id = hashlib.sha1(f"{len(messages)}-{spec['name']}".encode()).hexdigest()[:12]
+            return AIMessage(
+                content="", tool_calls=[{"name": spec["name"], "args": args, "id": call_id}]
+            )
+        results = [_message_text(m) for m in turn if m.type == "tool"]
+        return AIMessage(content="[offline decision] " + " ".join(results))
+
+    if "Text to analyze:" in prompt:
+        return AIMessage(content=_extraction_json(prompt))
+    if "SPARQL query:" in prompt:
+        return AIMessage(content=_sparql_query(prompt))
+    return AIMessage(content=_answer_text(prompt, max_words=40))
+
+
+class FakeChatModel(BaseChatModel):
+    """Offline chat model with `invoke`, `stream`, `astream` and `bind_tools`.
+
+    `first_token_latency` is paid once per call, `prompt_token_latency` per
+    input token (prefill, so long histories are slower) and `token_latency`
+    per output token. `responder(messages, tools)` decides the reply.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str = "offline-model"
+    max_tokens: int | None = None
+    temperature: float | None = None
+    responder: Callable[[list[BaseMessage], list[dict]], AIMessage] = default_responder
+    first_token_latency: Latency = Field(default_factory=Latency)
+    prompt_token_latency: Latency = Field(default_factory=Latency)
+    token_latency: Latency = Field(default_factory=Latency)
+    tools: list[dict] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-workshop-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        specs = [{"name": t.name, "args": list(getattr(t, "args", {}) or {})} for t in tools]
+        return self.model_copy(update={"tools": specs})
+
+    def _reply(self, messages: list[BaseMessage]) -> AIMessage:
+        reply = self.responder(messages, self.tools)
+        prompt_tokens = sum(count_tokens(_message_text(m)) for m in messages)
+        completion_tokens = count_tokens(_message_text(reply)) or 1
+        reply.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        reply.response_metadata = {"model_name": self.model_name, "finish_reason": "stop"}
+        return reply
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reply = self._reply(messages)
+        self.first_token_latency.sleep()
+        self.prompt_token_latency.sleep(reply.usage_metadata["input_tokens"], include_base=False)
+        self.token_latency.sleep(reply.usage_metadata["output_tokens"], include_base=False)
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+    def _chunks(self, reply: AIMessage) -> Iterator[tuple[int, AIMessageChunk]]:
+        """One chunk per word, with the output tokens it adds, so a streamed
+        reply costs as many tokens as the same reply from `invoke`."""
+        text = _message_text(reply)
+        pieces = re.findall(r"\S+\s*", text) or [""]
+        charged = chars = 0
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            chars += len(piece)
+            # count_tokens() of the text so far (one word per piece)
+            tokens = reply.usage_metadata["output_tokens"] if last else max(i + 1, math.ceil(chars / 4))
+            tokens, charged = tokens - charged, tokens
+            yield tokens, AIMessageChunk(
+                content=piece,
+                tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": j}
+                    for j, c in enumerate(reply.tool_calls)
+                ] if last else [],
+                usage_metadata=reply.usage_metadata if last else None,
+                response_metadata=reply.response_metadata if last else {},
+            )
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages)
+        self.first_token_latency.sleep()
+        self.prompt_token_latency.sleep(reply.usage_metadata["input_tokens"], include_base=False)
+        for tokens, chunk in self._chunks(reply):
+            self.token_latency.sleep(tokens, include_base=False)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        await self.first_token_latency.asleep()
+        await self.prompt_token_latency.asleep(reply.usage_metadata["input_tokens"], include_base=False)
+        for tokens, chunk in self._chunks(reply):
+            await self.token_latency.asleep(tokens, include_base=False)
+            yield ChatGenerationChunk(message=chunk)
+
+
+# ---------------------------------------------------------------------------
+# Embeddings + vector store
+# ---------------------------------------------------------------------------
+
+
+def _tokens(text: str) -> list[str]:
+    # Latin words as whole tokens, every other letter (e.g. CJK) on its own
+    return re.findall(r"[a-z0-9]+|[^\sa-z0-9\W]", text.lower())
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashing embeddings: deterministic, normalised, fast."""
+
+    def __init__(self, dimensions: int = 256, latency: Latency | None = None) -> None:
+        self.dimensions = dimensions
+        self.latency = latency or Latency()
+
+    def _embed(self, text: str) -> list[float]:
+        vec = [0.0] * self.dimensions
+        for token in _tokens(text):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dimensions] += 1.0 if (h >> 63) == 0 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.latency.sleep(len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.latency.sleep(1)
+        return self._embed(text)
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class FakeHanaDB(VectorStore):
+    """In-memory stand-in for `langchain_hana.HanaDB` (cosine similarity).
+
+    Rows live in the `tables` dict passed in, so several instances (e.g.
+    ingest and chat) see the same data. Like HANA, a `HALF_VECTOR` column
+    rounds stored vectors to half precision and a fixed
+    `vector_column_length` rejects vectors of another size.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        connection: Any = None,
+        table_name: str = "EMBEDDINGS",
+        tables: dict[str, list[tuple[Document, list[float]]]] | None = None,
+        latency: Latency | None = None,
+        vector_column_type: str = "REAL_VECTOR",
+        vector_column_length: int = -1,
+        **kwargs: Any,
+    ) -> None:
+        self.embedding = embedding
+        self.connection = connection
+        self.table_name = table_name
+        self._tables = tables if tables is not None else {}
+        self._rows = self._tables.setdefault(table_name, [])
+        self.latency = latency or Latency()
+        self.vector_column_type = vector_column_type.upper()
+        self.vector_column_length = vector_column_length
+        if self.vector_column_type not in VECTOR_TYPES:
+            raise ValueError(
+                f"Unsupported vector column type {vector_column_type}, expected one of {', '.join(VECTOR_TYPES)}"
+            )
+        # Like a HANA table, the column keeps the length it was created with
+        stored = {len(vector) for _, vector in self._rows}
+        if vector_column_length > 0 and stored - {vector_column_length}:
+            raise ValueError(
+                f"Table {table_name} holds vectors of length {sorted(stored)}, not {vector_column_length}"
+            )
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = kwargs.get("embeddings") or self.embedding.embed_documents(texts)
+        self.latency.sleep(len(texts))
+        for text, metadata, vector in zip(texts, metadatas, vectors):
+            if self.vector_column_length > 0 and len(vector) != self.vector_column_length:
+                raise ValueError(
+                    f"Vector of length {len(vector)} does not fit column of length {self.vector_column_length}"
+                )
+            if self.vector_column_type == "HALF_VECTOR":
+                vector = to_half(vector)
+            self._rows.append((Document(page_content=text, metadata=dict(metadata)), vector))
+        return []
+
+    def delete(self, ids: list[str] | None = None, filter: dict | None = None, **kwargs: Any) -> bool:
+        self.latency.sleep()
+        if filter:
+            self._rows[:] = [
+                row for row in self._rows
+                if any(row[0].metadata.get(k) != v for k, v in filter.items())
+            ]
+        return True
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, filter: dict | None = None
+    ) -> list[tuple[Document, float]]:
+        self.latency.sleep()
+        rows = self._rows
+        if filter:
+            rows = [r for r in rows if all(r[0].metadata.get(k_) == v for k_, v in filter.items())]
+        scored = [(doc, _cosine(embedding, vec)) for doc, vec in rows]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, kwargs.get("filter"))]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k, kwargs.get("filter")
+        )
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] | None = None, **kwargs: Any) -> "FakeHanaDB":
+        store = cls(embedding=embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+
+# ---------------------------------------------------------------------------
+# HANA connection with an in-memory triple store
+# ---------------------------------------------------------------------------
+
+
+class FakeHanaError(Exception):
+    """Raised for SQL/SPARQL the fake connection cannot execute."""
+
+
+_UPDATE_KEYWORDS = re.compile(
+    r"^\s*(?:PREFIX\s+\S*\s*<[^>]*>\s*)*(INSERT|DELETE|CLEAR|DROP|CREATE|LOAD|COPY|MOVE|ADD|WITH)\b",
+    re.IGNORECASE,
+)
+_FROM_CLAUSE = re.compile(r"\bFROM\s+(?:NAMED\s+)?(?:<([^>]*)>|DEFAULT)", re.IGNORECASE)
+
+
+class FakeTripleStore:
+    """rdflib dataset that executes SPARQL the way HANA's endpoint would."""
+
+    def __init__(self) -> None:
+        import rdflib
+
+        self._rdflib = rdflib
+        self.dataset = rdflib.Dataset(default_union=False)
+        self._lock = threading.Lock()
+
+    def _graph_for(self, query: str) -> tuple[Any, str]:
+        match = _FROM_CLAUSE.search(query)
+        stripped = _FROM_CLAUSE.sub("", query)
+        if match and match.group(1):
+            return self.dataset.graph(self._rdflib.URIRef(match.group(1))), stripped
+        return self.dataset.default_graph, stripped
+
+    def execute(self, query: str, accept: str = "") -> str:
+        """Run a query/update; SELECT results as CSV, CONSTRUCT as Turtle."""
+        if _UPDATE_KEYWORDS.match(query):
+            self.update(query)
+            return ""
+        with self._lock:
+            try:
+                graph, stripped = self._graph_for(query)
+                result = graph.query(stripped)
+            except Exception as e:  # rdflib raises a variety of parse errors
+                raise FakeHanaError(f"SPARQL error: {e}") from e
+        if result.type == "CONSTRUCT":
+            return result.graph.serialize(format="turtle")
+        if result.type == "ASK":
+            return "true" if result.askAnswer else "false"
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow([str(v) for v in result.vars])
+        for row in result:
+            writer.writerow(["" if v is None else str(v) for v in row])
+        return out.getvalue()
+
+    def update(self, query: str) -> int:
+        """Run a SPARQL update; returns the number of triples it added."""
+        with self._lock:
+            before = self.triple_count()
+            try:
+                self.dataset.update(query)
+            except Exception as e:
+                raise FakeHanaError(f"SPARQL error: {e}") from e
+            return max(0, self.triple_count() - before)
+
+    def select(self, query: str) -> tuple[list[str], list[tuple]]:
+        """Run a SELECT and return (column names, rows) like SPARQL_TABLE."""
+        with self._lock:
+            graph, stripped = self._graph_for(query)
+            try:
+                result = graph.query(stripped)
+            except Exception as e:
+                raise FakeHanaError(f"SPARQL error: {e}") from e
+            columns = [str(v) for v in result.vars]
+            rows = [tuple(None if v is None else str(v) for v in row) for row in result]
+        return columns, rows
+
+    def triple_count(self) -> int:
+        return sum(len(g) for g in self.dataset.graphs())
+
+    def triples(self, graph_uri: str) -> set[tuple]:
+        """All triples of a named graph, for comparing two ingestions."""
+        with self._lock:
+            return set(self.dataset.graph(self._rdflib.URIRef(graph_uri)))
+
+
+class FakeCursor:
+    _SPARQL_TABLE = re.compile(r"SPARQL_TABLE\s*\(\s*'(.*)'\s*\)", re.DOTALL | re.IGNORECASE)
+
+    def __init__(self, connection: "FakeHanaConnection") -> None:
+        self.connection = connection
+        self.description: list[tuple] | None = None
+        self._rows: list[tuple] = []
+
+    def execute(self, sql: str, parameters: Any = None) -> None:
+        self.connection.latency.sleep()
+        match = self._SPARQL_TABLE.search(sql)
+        if match:
+            sparql = match.group(1).replace("''", "'")
+            columns, self._rows = self.connection.store.select(sparql)
+            self.description = [(c,) for c in columns]
+        elif re.search(r"\bFROM\s+DUMMY\b", sql, re.IGNORECASE):
+            self._rows, self.description = [(1,)], [("1",)]
+        else:
+            raise FakeHanaError(f"Unsupported SQL in offline mode: {sql[:80]}")
+
+    def callproc(self, name: str, parameters: Sequence[Any]) -> tuple:
+        self.connection.latency.sleep()
+        if name.upper() != "SYS.SPARQL_EXECUTE":
+            raise FakeHanaError(f"Unsupported procedure in offline mode: {name}")
+        query, headers = parameters[0], parameters[1]
+        accept = next(
+            (h.split(":", 1)[1].strip() for h in headers.split("\r\n") if h.lower().startswith("accept:")),
+            "",
+        )
+        if _UPDATE_KEYWORDS.match(query):
+            # Writing takes longer the more triples a statement inserts
+            self.connection.insert_latency.sleep(self.connection.store.update(query), include_base=False)
+            response = ""
+        else:
+            response = self.connection.store.execute(query, accept)
+        return (query, headers, response, "{}")
+
+    def fetchall(self) -> list[tuple]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> tuple | None:
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self) -> None:
+        pass
+
+
+class FakeHanaConnection:
+    """Minimal `dbapi.Connection` for the SPARQL paths of the exercises."""
+
+    def __init__(
+        self, store: FakeTripleStore, latency: Latency | None = None, insert_latency: Latency | None = None
+    ) -> None:
+        self.store = store
+        self.latency = latency or Latency()
+        # Per triple added by an update (on top of the round trip)
+        self.insert_latency = insert_latency or Latency()
+        self._open = True
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def isconnected(self) -> bool:
+        return self._open
+
+    def close(self) -> None:
+        self._open = False
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Bundle
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class OfflineBackends:
+    """All fakes with shared state, ready to patch into exercise modules."""
+
+    llm_first_token: Latency = field(default_factory=Latency)
+    llm_prompt_token: Latency = field(default_factory=Latency)
+    llm_token: Latency = field(default_factory=Latency)
+    embed: Latency = field(default_factory=Latency)
+    hana: Latency = field(default_factory=Latency)
+    hana_insert: Latency = field(default_factory=Latency)
+    responder: Callable[[list[BaseMessage], list[dict]], AIMessage] = default_responder
+    vector_tables: dict[str, list[tuple[Document, list[float]]]] = field(default_factory=dict)
+    _triple_store: FakeTripleStore | None = None
+    _pool: HanaConnectionPool | None = None
+
+    @classmethod
+    def from_env(cls, seed: int = 0) -> "OfflineBackends":
+        jitter = float(os.getenv("FAKE_LATENCY_JITTER", "0.1"))
+        return cls(
+            llm_first_token=Latency(_env_ms("FAKE_LLM_FIRST_TOKEN_MS", 300), jitter=jitter, seed=seed),
+            llm_prompt_token=Latency(per_unit_ms=_env_ms("FAKE_LLM_PROMPT_TOKEN_MS", 0), jitter=jitter, seed=seed + 4),
+            llm_token=Latency(per_unit_ms=_env_ms("FAKE_LLM_TOKEN_MS", 10), jitter=jitter, seed=seed + 1),
+            embed=Latency(
+                _env_ms("FAKE_EMBED_MS", 50), _env_ms("FAKE_EMBED_PER_TEXT_MS", 1), jitter, seed + 2
+            ),
+            hana=Latency(_env_ms("FAKE_HANA_MS", 15), jitter=jitter, seed=seed + 3),
+            hana_insert=Latency(per_unit_ms=_env_ms("FAKE_HANA_INSERT_TRIPLE_MS", 5), jitter=jitter, seed=seed + 5),
+        )
+
+    @property
+    def triple_store(self) -> FakeTripleStore:
+        if self._triple_store is None:
+            self._triple_store = FakeTripleStore()
+        return self._triple_store
+
+    def init_llm(self, model_name: str = "offline-model", **kwargs: Any) -> FakeChatModel:
+        return FakeChatModel(
+            model_name=model_name,
+            max_tokens=kwargs.get("max_tokens"),
+            temperature=kwargs.get("temperature"),
+            responder=self.responder,
+            first_token_latency=self.llm_first_token,
+            prompt_token_latency=self.llm_prompt_token,
+            token_latency=self.llm_token,
+        )
+
+    def init_embedding_model(self, model_name: str = "offline-embedding", **kwargs: Any) -> FakeEmbeddings:
+        return FakeEmbeddings(latency=self.embed)
+
+    def hana_db(self, embedding: Embeddings, connection: Any = None, table_name: str = "EMBEDDINGS", **kwargs: Any) -> FakeHanaDB:
+        # Column settings (vector_column_type/_length) go through, so the
+        # scripts' HALF_VECTOR and reduced-dimension paths are exercised
+        return FakeHanaDB(
+            embedding=embedding,
+            connection=connection,
+            table_name=table_name,
+            tables=self.vector_tables,
+            latency=self.hana,
+            **kwargs,
+        )
+
+    def get_pool(self) -> HanaConnectionPool:
+        if self._pool is None:
+            self._pool = HanaConnectionPool(
+                max_size=4, connect=lambda: FakeHanaConnection(self.triple_store, self.hana, self.hana_insert)
+            )
+        return self._pool
+
+    def patch(self, module: ModuleType) -> None:
+        """Point an exercise module's backends at the fakes."""
+        replacements = {
+            "init_llm": self.init_llm,
+            "init_embedding_model": self.init_embedding_model,
+            # workshop_common.llm factory, as imported by the exercises
+            "get_llm": self.init_llm,
+            "get_embedding_model": self.init_embedding_model,
+            "warm_up": lambda *args, **kwargs: None,
+            "HanaDB": self.hana_db,
+            "get_pool": self.get_pool,
+        }
+        for name, fake in replacements.items():
+            if hasattr(module, name):
+                setattr(module, name, fake)
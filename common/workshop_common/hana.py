@@ -0,0 +1,284 @@
+"""Shared, pooled SAP HANA Cloud connections.
+
+All exercises get their HANA connections from one process-wide pool instead
+of opening a fresh TLS connection each time:
+
+- The pool is bounded (`HANA_POOL_SIZE`) and creates connections lazily.
+- Idle connections are health-checked before reuse (`SELECT 1 FROM DUMMY`
+  once they were idle longer than `HANA_HEALTH_CHECK_INTERVAL` seconds) and
+  transparently reconnected if the session was dropped, e.g. by an idle
+  timeout.
+- `metrics()` reports connections in use and time spent waiting for one.
+
+Usage:
+    from workshop_common.hana import get_pool
+
+    with get_pool().connection() as connection:
+        cursor = connection.cursor()
+        ...
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from hdbcli import dbapi
+
+
+def connect_from_env() -> dbapi.Connection:
+    """Open a new connection using the `HANA_*` variables from `.env`."""
+    return dbapi.connect(
+        address=os.getenv("HANA_DB_ADDRESS"),
+        port=int(os.getenv("HANA_DB_PORT", "443")),
+        user=os.getenv("HANA_DB_USER"),
+        password=os.getenv("HANA_DB_PASSWORD"),
+        autocommit=True,
+        sslValidateCertificate=False,
+    )
+
+
+class PooledConnection:
+    """A HANA connection that reconnects itself when the session is gone.
+
+    Behaves like a `dbapi.Connection` (attribute access is delegated), so it
+    can be passed to `HanaDB`, `HanaRdfGraph` or used directly. Every call to
+    `cursor()` first makes sure the underlying session is still alive.
+    """
+
+    def __init__(self, pool: "HanaConnectionPool") -> None:
+        self._pool = pool
+        self._raw: dbapi.Connection = pool._connect()
+        self._last_used = time.monotonic()
+
+    def cursor(self, *args: Any, **kwargs: Any) -> dbapi.Cursor:
+        self.ensure_alive()
+        self._last_used = time.monotonic()
+        return self._raw.cursor(*args, **kwargs)
+
+    def ensure_alive(self) -> None:
+        """Reconnect if the session was dropped while the connection was idle."""
+        idle = time.monotonic() - self._last_used
+        if self._raw.isconnected() and idle < self._pool.health_check_interval:
+            return
+        if self._raw.isconnected() and self._ping():
+            return
+        self.reconnect()
+
+    def reconnect(self) -> None:
+        try:
+            self._raw.close()
+        except dbapi.Error:
+            pass
+        self._raw = self._pool._connect()
+        self._pool._record_reconnect()
+
+    def close(self) -> None:
+        try:
+            self._raw.close()
+        except dbapi.Error:
+            pass
+
+    def _ping(self) -> bool:
+        try:
+            cursor = self._raw.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM DUMMY")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except dbapi.Error:
+            self._pool._record_failed_health_check()
+            return False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+@dataclass
+class PoolMetrics:
+    """Snapshot of pool usage."""
+
+    size: int
+    in_use: int
+    idle: int
+    acquires: int
+    total_wait_ms: float
+    max_wait_ms: float
+    timeouts: int
+    connects: int
+    reconnects: int
+    failed_health_checks: int
+
+    @property
+    def avg_wait_ms(self) -> float:
+        return self.total_wait_ms / self.acquires if self.acquires else 0.0
+
+    def format(self) -> str:
+        return (
+            f"HANA pool: {self.in_use} in use, {self.idle} idle (max {self.size}), "
+            f"{self.acquires} acquires, wait avg {self.avg_wait_ms:.1f} ms / "
+            f"max {self.max_wait_ms:.1f} ms, {self.timeouts} timeouts, "
+            f"{self.connects} connects, {self.reconnects} reconnects"
+        )
+
+
+class HanaConnectionPool:
+    """Bounded pool of `PooledConnection`s with health checks and metrics."""
+
+    def __init__(
+        self,
+        max_size: int = 4,
+        acquire_timeout: float = 30.0,
+        health_check_interval: float = 60.0,
+        connect: Callable[[], dbapi.Connection] = connect_from_env,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._connect_fn = connect
+
+        self._cond = threading.Condition()
+        self._idle: list[PooledConnection] = []
+        self._in_use = 0
+        self._closed = False
+
+        self._acquires = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._timeouts = 0
+        self._connects = 0
+        self._reconnects = 0
+        self._failed_health_checks = 0
+
+    def acquire(self, timeout: float | None = None) -> PooledConnection:
+        """Borrow a connection, waiting up to `timeout` seconds for a free one.
+
+        Raises TimeoutError if the pool stays exhausted.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        create = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn = None
+                    create = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise TimeoutError(
+                        f"No HANA connection available within {timeout:.1f}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._record_wait((time.monotonic() - start) * 1000)
+
+        try:
+            # Connect / health-check outside the lock so other threads can proceed
+            if create:
+                conn = PooledConnection(self)
+            else:
+                conn.ensure_alive()
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        """Return a borrowed connection to the pool."""
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[PooledConnection]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close all idle connections; borrowed ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def metrics(self) -> PoolMetrics:
+        with self._cond:
+            return PoolMetrics(
+                size=self.max_size,
+                in_use=self._in_use,
+                idle=len(self._idle),
+                acquires=self._acquires,
+                total_wait_ms=self._total_wait_ms,
+                max_wait_ms=self._max_wait_ms,
+                timeouts=self._timeouts,
+                connects=self._connects,
+                reconnects=self._reconnects,
+                failed_health_checks=self._failed_health_checks,
+            )
+
+    # -- bookkeeping used by PooledConnection --------------------------------
+
+    def _connect(self) -> dbapi.Connection:
+        raw = self._connect_fn()
+        with self._cond:
+            self._connects += 1
+        return raw
+
+    def _record_wait(self, wait_ms: float) -> None:
+        # Called with the lock held
+        self._acquires += 1
+        self._total_wait_ms += wait_ms
+        self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+
+    def _record_reconnect(self) -> None:
+        with self._cond:
+            self._reconnects += 1
+
+    def _record_failed_health_check(self) -> None:
+        with self._cond:
+            self._failed_health_checks += 1
+
+
+_pool: HanaConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> HanaConnectionPool:
+    """Get or create the process-wide pool (configured via `HANA_POOL_*`)."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = HanaConnectionPool(
+                max_size=int(os.getenv("HANA_POOL_SIZE", "4")),
+                acquire_timeout=float(os.getenv("HANA_POOL_TIMEOUT", "30")),
+                health_check_interval=float(os.getenv("HANA_HEALTH_CHECK_INTERVAL", "60")),
+            )
+        return _pool
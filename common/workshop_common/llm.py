@@ -0,0 +1,202 @@
+"""Shared, warm SAP AI Core model clients.
+
+`init_llm(MODEL, ...)` without a `proxy_client` builds a brand-new proxy
+client on every call: a new OAuth token, a new deployment lookup and, inside
+the model, a new HTTP connection pool. This module keeps one proxy client per
+process and caches model instances, so every caller in the process shares
+the same token and keep-alive connections:
+
+- `get_proxy_client()` – the process-wide proxy client (token + deployments).
+- `get_llm(model, max_tokens, temperature)` – cached per
+  (model, max_tokens, temperature).
+- `get_embedding_model(model, dimensions)` – cached per model name and
+  requested dimensions.
+- `warm_up(...)` – optionally pays for auth, deployment lookup and the first
+  TLS handshake in a background thread, so the first user prompt does not.
+
+Models are wrapped with the per-model rate limiter from
+`workshop_common.ratelimit` (RPM/TPM buckets, adaptive concurrency, 429
+retry). Without `LLM_RATE_LIMITS` only the retry and metrics are active;
+the concurrency limit applies only to models with a `max_concurrency`.
+
+Usage:
+    from workshop_common.llm import get_llm, warm_up
+
+    warm_up(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    ...
+    llm = get_llm(MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+
+Requires `sap-ai-sdk-gen`; it is imported lazily so the other helpers in
+this package work without it.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+WARM_UP_MODES = ("off", "auth", "ping")
+
+_proxy_client: Any = None
+_llms: dict[tuple[str, int, float], Any] = {}
+_embedding_models: dict[tuple[str, int | None], Any] = {}
+# Re-entrant: get_llm() creates the proxy client while holding the lock.
+# Holding it during creation also makes a caller wait for an in-flight
+# warm-up instead of building a second client.
+_lock = threading.RLock()
+
+
+@dataclass
+class FactoryStats:
+    """How often the caches saved a client/model construction."""
+
+    proxy_clients_created: int = 0
+    models_created: int = 0
+    model_cache_hits: int = 0
+    warm_up_ms: float | None = None
+    warm_up_error: str | None = None
+
+    def format(self) -> str:
+        warm = "not run" if self.warm_up_ms is None else f"{self.warm_up_ms:.0f} ms"
+        if self.warm_up_error:
+            warm = f"failed ({self.warm_up_error})"
+        return (
+            f"LLM clients: {self.proxy_clients_created} proxy client(s), "
+            f"{self.models_created} model(s) created, {self.model_cache_hits} cache hits, "
+            f"warm-up {warm}"
+        )
+
+
+_stats = FactoryStats()
+
+
+def get_proxy_client() -> Any:
+    """Get or create the process-wide Generative AI Hub proxy client.
+
+    Credentials come from the `AICORE_*` variables in `.env`. The client
+    caches its OAuth token and deployment list, so sharing it means both are
+    fetched once per process instead of once per model.
+    """
+    global _proxy_client
+
+    with _lock:
+        if _proxy_client is None:
+            from gen_ai_hub.proxy.core.proxy_clients import get_proxy_client as new_proxy_client
+
+            _proxy_client = new_proxy_client("gen-ai-hub")
+            _stats.proxy_clients_created += 1
+        return _proxy_client
+
+
+def get_llm(model: str, max_tokens: int = 256, temperature: float = 0.0) -> Any:
+    """Get a cached chat model for (model, max_tokens, temperature).
+
+    Reusing the instance also reuses its HTTP client, i.e. the keep-alive
+    connections to the inference endpoint.
+    """
+    key = (model, int(max_tokens), float(temperature))
+    with _lock:
+        llm = _llms.get(key)
+        if llm is not None:
+            _stats.model_cache_hits += 1
+            return llm
+
+        from gen_ai_hub.proxy.langchain.init_models import init_llm
+        from workshop_common.ratelimit import RateLimitedChatModel, get_limiter
+
+        llm = init_llm(
+            model,
+            proxy_client=get_proxy_client(),
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        llm = RateLimitedChatModel(inner=llm, limiter=get_limiter(model))
+        _llms[key] = llm
+        _stats.models_created += 1
+        return llm
+
+
+def get_embedding_model(model: str, dimensions: int | None = None) -> Any:
+    """Get a cached embedding model sharing the process-wide proxy client.
+
+    `embed_documents` is split into batches of `LLM_EMBED_BATCH_SIZE` texts
+    (default 64) that run in parallel within the model's rate limits.
+
+    `dimensions` asks models that support it (OpenAI `text-embedding-3-*`)
+    for shorter vectors; other models ignore it, see
+    `workshop_common.vectors.VectorStorage.embeddings` for a client-side cut.
+    """
+    key = (model, dimensions)
+    with _lock:
+        embeddings = _embedding_models.get(key)
+        if embeddings is not None:
+            _stats.model_cache_hits += 1
+            return embeddings
+
+        from gen_ai_hub.proxy.langchain.init_models import init_embedding_model
+        from workshop_common.ratelimit import RateLimitedEmbeddings, get_limiter
+
+        inner = init_embedding_model(model, proxy_client=get_proxy_client())
+        if dimensions and "dimensions" in getattr(type(inner), "model_fields", {}):
+            inner.dimensions = dimensions
+        embeddings = RateLimitedEmbeddings(
+            inner,
+            limiter=get_limiter(model),
+            batch_size=int(os.getenv("LLM_EMBED_BATCH_SIZE", "64")),
+        )
+        _embedding_models[key] = embeddings
+        _stats.models_created += 1
+        return embeddings
+
+
+def warm_up(
+    model: str,
+    max_tokens: int = 256,
+    temperature: float = 0.0,
+    mode: str | None = None,
+    background: bool = True,
+) -> threading.Thread | None:
+    """Prepare the model before the first prompt needs it.
+
+    `mode` (default: env `LLM_WARM_UP`, else "off"):
+    - "off":  do nothing.
+    - "auth": create the proxy client (OAuth token + deployment lookup) and
+              the model instance.
+    - "ping": additionally send a 1-token request so the TLS connection to
+              the inference endpoint is open and kept alive. Costs one tiny
+              request.
+
+    With `background=True` the work runs in a daemon thread and the thread is
+    returned; a later `get_llm()` for the same key waits for it instead of
+    repeating it. Failures are recorded in `stats()` and otherwise ignored –
+    the real call will surface them.
+    """
+    mode = (mode or os.getenv("LLM_WARM_UP", "off")).strip().lower()
+    if mode not in WARM_UP_MODES:
+        raise ValueError(f"LLM_WARM_UP must be one of {', '.join(WARM_UP_MODES)}, got '{mode}'")
+    if mode == "off":
+        return None
+
+    def run() -> None:
+        start = time.perf_counter()
+        try:
+            llm = get_llm(model, max_tokens=max_tokens, temperature=temperature)
+            if mode == "ping":
+                llm.invoke("ping", max_tokens=1)
+        except Exception as e:  # noqa: BLE001 - the first real call reports it
+            _stats.warm_up_error = f"{type(e).__name__}: {e}"
+        finally:
+            _stats.warm_up_ms = (time.perf_counter() - start) * 1000
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="llm-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def stats() -> FactoryStats:
+    """Snapshot of cache and warm-up statistics."""
+    with _lock:
+        return FactoryStats(**vars(_stats))
@@ -0,0 +1,560 @@
+"""Client-side rate limiting for SAP AI Core model calls.
+
+SAP AI Core enforces request and token quotas per deployment. Without a
+client-side limit, parallel ingestion or several chat sessions run into
+HTTP 429 and the script fails. `AdaptiveLimiter` (one per model) combines:
+
+- **Token buckets** for requests per minute (RPM) and tokens per minute
+  (TPM). Calls wait for budget instead of being rejected upstream. Token
+  estimates are corrected with the real usage after each call.
+- **Adaptive concurrency (AIMD)**, if `max_concurrency` is configured: the
+  number of calls in flight grows by one per "window" of successful calls
+  and is halved on a 429 (or shrunk slightly when latency degrades), so
+  throughput settles just below quota.
+- **Retry** of 429s with exponential backoff and full jitter, honoring a
+  `Retry-After` header when the server sends one.
+- **Metrics**: `metrics().format()` shows throughput, throttles, retries and
+  the current concurrency limit.
+
+`RateLimitedChatModel` and `RateLimitedEmbeddings` wrap LangChain models;
+`workshop_common.llm.get_llm()` / `get_embedding_model()` return wrapped
+models, so the exercises are covered without code changes.
+
+Limits come from `LLM_RATE_LIMITS` (JSON, per model, "*" = default):
+
+    LLM_RATE_LIMITS='{"gpt-4.1": {"rpm": 60, "tpm": 100000}, "*": {"max_concurrency": 8}}'
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+T = TypeVar("T")
+
+# Parallel embedding batches when the model has no concurrency limit
+EMBED_WORKERS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: ~4 ASCII characters per token,
+    1 per other character (CJK scripts are roughly one token per character).
+
+    The one estimate used for rate limits, routing, chat history, chunk
+    sizes and prompt budgets, so they agree with each other. Rounded up, so
+    the estimates of the parts of a text never add up to less than the whole.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for HTTP 429 / "Too Many Requests" errors from any client library.
+
+    Only the status code (`status_code` or `status`, on the error or its
+    `response`) and the reason phrase count: a bare "429" in a message can
+    just as well be an ID or a token count.
+    """
+    response = getattr(error, "response", None)
+    for source in (error, response):
+        for name in ("status_code", "status"):
+            if getattr(source, name, None) == 429:
+                return True
+    return "too many requests" in str(error).lower()
+
+
+def retry_after_s(error: BaseException) -> float | None:
+    """`Retry-After` header of the failed response, if any (seconds)."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute; `None` means unlimited."""
+
+    def __init__(self, per_minute: float | None) -> None:
+        self.capacity = float(per_minute) if per_minute else None
+        self.level = self.capacity or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.capacity is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_s(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 = now)."""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        # Requests bigger than the bucket go through once it is full
+        amount = min(amount, self.capacity)
+        missing = amount - self.level
+        return 0.0 if missing <= 0 else missing * 60 / self.capacity
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity is None:
+            return
+        self._refill(now)
+        # May go negative when the real usage exceeds the estimate
+        self.level -= amount
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay_s: float = 1.0
+    max_delay_s: float = 30.0
+
+    def delay_s(self, attempt: int, error: BaseException | None = None) -> float:
+        server_hint = retry_after_s(error) if error is not None else None
+        if server_hint is not None:
+            return min(server_hint, self.max_delay_s)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2**attempt))
+
+
+@dataclass
+class LimiterMetrics:
+    """Snapshot of one model's limiter."""
+
+    model: str
+    requests: int
+    successes: int
+    throttled: int
+    retries: int
+    failures: int
+    tokens: int
+    in_flight: int
+    concurrency_limit: float | None
+    total_wait_s: float
+    elapsed_s: float
+
+    @property
+    def requests_per_min(self) -> float:
+        return self.successes / self.elapsed_s * 60 if self.elapsed_s else 0.0
+
+    @property
+    def tokens_per_min(self) -> float:
+        return self.tokens / self.elapsed_s * 60 if self.elapsed_s else 0.0
+
+    def format(self) -> str:
+        return (
+            f"Rate limiter {self.model}: {self.successes}/{self.requests} ok, "
+            f"{self.throttled} throttled (429), {self.retries} retries, {self.failures} failed, "
+            f"{self.requests_per_min:.0f} req/min, {self.tokens_per_min:.0f} tokens/min, "
+            f"concurrency {self.in_flight}/"
+            f"{int(self.concurrency_limit) if self.concurrency_limit is not None else 'no limit'}, "
+            f"waited {self.total_wait_s:.1f} s"
+        )
+
+
+class AdaptiveLimiter:
+    """RPM/TPM token buckets + AIMD concurrency limit + 429 retry for one model.
+
+    `max_concurrency=None` turns the concurrency limit off: calls are only
+    held back by the buckets.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        max_concurrency: int | None = 16,
+        initial_concurrency: int = 4,
+        latency_factor: float = 3.0,
+        retry: RetryPolicy | None = None,
+    ) -> None:
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.latency_factor = latency_factor
+        self.retry = retry or RetryPolicy()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._limit = float(min(initial_concurrency, max_concurrency)) if max_concurrency else None
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._best_latency_s: float | None = None
+        self._started = time.monotonic()
+
+        self._n_requests = 0
+        self._successes = 0
+        self._throttled = 0
+        self._retries = 0
+        self._failures = 0
+        self._used_tokens = 0
+        self._total_wait_s = 0.0
+
+    # -- admission -------------------------------------------------------------
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take a slot if possible (returns 0), else the seconds to wait."""
+        now = time.monotonic()
+        if self._limit is not None and self._in_flight >= int(self._limit):
+            return 0.05  # woken up by release(); poll as a fallback
+        wait = max(self._requests.wait_s(1, now), self._tokens.wait_s(tokens, now))
+        if wait > 0:
+            return wait
+        self._requests.take(1, now)
+        self._tokens.take(tokens, now)
+        self._in_flight += 1
+        self._n_requests += 1
+        return 0.0
+
+    def acquire(self, tokens: int = 0) -> None:
+        start = time.monotonic()
+        with self._cond:
+            while (wait := self._try_acquire(tokens)) > 0:
+                self._cond.wait(min(wait, 1.0))
+            self._total_wait_s += time.monotonic() - start
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._try_acquire(tokens)
+                if wait == 0:
+                    self._total_wait_s += time.monotonic() - start
+                    return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(
+        self,
+        latency_s: float | None,
+        estimated_tokens: int = 0,
+        actual_tokens: int | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """Return the slot and feed the outcome into the AIMD controller.
+
+        `latency_s` is the congestion signal; pass None if the call's
+        duration says nothing about upstream load.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            if error is not None and is_rate_limit_error(error):
+                self._throttled += 1
+                # Multiplicative decrease
+                if self._limit is not None:
+                    self._limit = max(1.0, self._limit / 2)
+            elif error is not None:
+                self._failures += 1
+            else:
+                self._successes += 1
+                tokens = actual_tokens if actual_tokens is not None else estimated_tokens
+                self._used_tokens += tokens
+                if actual_tokens is not None:
+                    # Correct the estimate taken at admission
+                    self._tokens.take(actual_tokens - estimated_tokens, now)
+                self._on_latency(latency_s)
+            self._cond.notify_all()
+
+    def _on_latency(self, latency_s: float | None) -> None:
+        # Called with the lock held
+        if self._limit is None:
+            return
+        if latency_s is None:
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            return
+        best = self._best_latency_s
+        self._best_latency_s = latency_s if best is None else min(best, latency_s)
+        if best is not None and latency_s > best * self.latency_factor:
+            # Upstream is queueing: back off gently
+            self._limit = max(1.0, self._limit * 0.9)
+        else:
+            # Additive increase: +1 per `limit` successful calls
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+    # -- calls with retry --------------------------------------------------------
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        tokens: int = 0,
+        usage: Callable[[T], int | None] | None = None,
+        latency_signal: bool = True,
+    ) -> T:
+        """Run `fn()` under the limiter, retrying 429s with jittered backoff.
+
+        `usage(result)` returns the real token count; set `latency_signal`
+        to False when the call duration depends on the answer length.
+        """
+        for attempt in range(self.retry.max_retries + 1):
+            self.acquire(tokens)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(time.monotonic() - start, tokens, error=e)
+                if not is_rate_limit_error(e) or attempt == self.retry.max_retries:
+                    raise
+                self._count_retry()
+                time.sleep(self.retry.delay_s(attempt, e))
+                continue
+            latency = time.monotonic() - start if latency_signal else None
+            self.release(latency, tokens, usage(result) if usage else None)
+            return result
+        raise AssertionError("unreachable")
+
+    async def acall(
+        self,
+        fn: Callable[[], Any],
+        tokens: int = 0,
+        usage: Callable[[Any], int | None] | None = None,
+        latency_signal: bool = True,
+    ) -> Any:
+        """Async variant of `call()`; `fn()` returns an awaitable."""
+        for attempt in range(self.retry.max_retries + 1):
+            await self.aacquire(tokens)
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                self.release(time.monotonic() - start, tokens, error=e)
+                if not is_rate_limit_error(e) or attempt == self.retry.max_retries:
+                    raise
+                self._count_retry()
+                await asyncio.sleep(self.retry.delay_s(attempt, e))
+                continue
+            latency = time.monotonic() - start if latency_signal else None
+            self.release(latency, tokens, usage(result) if usage else None)
+            return result
+        raise AssertionError("unreachable")
+
+    def _count_retry(self) -> None:
+        with self._cond:
+            self._retries += 1
+
+    def metrics(self) -> LimiterMetrics:
+        with self._cond:
+            return LimiterMetrics(
+                model=self.model,
+                requests=self._n_requests,
+                successes=self._successes,
+                throttled=self._throttled,
+                retries=self._retries,
+                failures=self._failures,
+                tokens=self._used_tokens,
+                in_flight=self._in_flight,
+                concurrency_limit=self._limit,
+                total_wait_s=self._total_wait_s,
+                elapsed_s=time.monotonic() - self._started,
+            )
+
+    @property
+    def concurrency_limit(self) -> int | None:
+        """Current cap on concurrent calls, or None without `max_concurrency`."""
+        with self._cond:
+            return int(self._limit) if self._limit is not None else None
+
+
+# ---------------------------------------------------------------------------
+# LangChain wrappers
+# ---------------------------------------------------------------------------
+
+
+def _messages_tokens(messages: list[BaseMessage]) -> int:
+    return sum(estimate_tokens(str(m.content)) for m in messages)
+
+
+def _result_tokens(result: ChatResult) -> int | None:
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Chat model wrapper that routes every call through an `AdaptiveLimiter`.
+
+    Supports invoke/stream (sync and async) and `bind_tools`. Streams are
+    retried only if the 429 arrives before the first chunk.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    limiter: AdaptiveLimiter
+
+    @property
+    def _llm_type(self) -> str:
+        return f"rate-limited-{self.inner._llm_type}"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        # Let the wrapped model format the tools, then bind the same kwargs here
+        bound = self.inner.bind_tools(tools, **kwargs)
+        if isinstance(bound, BaseChatModel):
+            return self.model_copy(update={"inner": bound})
+        return self.bind(**bound.kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.limiter.call(
+            lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=_messages_tokens(messages),
+            usage=_result_tokens,
+            latency_signal=False,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self.limiter.acall(
+            lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=_messages_tokens(messages),
+            usage=_result_tokens,
+            latency_signal=False,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens = _messages_tokens(messages)
+        limiter = self.limiter
+        for attempt in range(limiter.retry.max_retries + 1):
+            limiter.acquire(tokens)
+            stream = _StreamOutcome()
+            try:
+                for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    stream.on_chunk(chunk)
+                    yield chunk
+            except Exception as e:
+                stream.error = e
+            finally:
+                # Also runs when the consumer stops reading early
+                stream.release(limiter, tokens)
+            if not stream.should_retry(limiter, attempt):
+                return
+            time.sleep(limiter.retry.delay_s(attempt, stream.error))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = _messages_tokens(messages)
+        limiter = self.limiter
+        for attempt in range(limiter.retry.max_retries + 1):
+            await limiter.aacquire(tokens)
+            stream = _StreamOutcome()
+            try:
+                async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    stream.on_chunk(chunk)
+                    yield chunk
+            except Exception as e:
+                stream.error = e
+            finally:
+                stream.release(limiter, tokens)
+            if not stream.should_retry(limiter, attempt):
+                return
+            await asyncio.sleep(limiter.retry.delay_s(attempt, stream.error))
+
+
+class _StreamOutcome:
+    """Bookkeeping for one streamed attempt."""
+
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+        self.first_chunk_s: float | None = None
+        self.used_tokens: int | None = None
+        self.error: BaseException | None = None
+
+    def on_chunk(self, chunk: ChatGenerationChunk) -> None:
+        if self.first_chunk_s is None:
+            self.first_chunk_s = time.monotonic() - self.start
+        usage = getattr(chunk.message, "usage_metadata", None)
+        if usage:
+            self.used_tokens = (self.used_tokens or 0) + usage.get("total_tokens", 0)
+
+    def release(self, limiter: AdaptiveLimiter, estimated_tokens: int) -> None:
+        # Time to first chunk is the congestion signal (total time depends
+        # on the answer length)
+        limiter.release(
+            self.first_chunk_s,
+            estimated_tokens,
+            None if self.error else self.used_tokens,
+            error=self.error,
+        )
+
+    def should_retry(self, limiter: AdaptiveLimiter, attempt: int) -> bool:
+        """Raise non-retryable errors; True if a 429 before any chunk should be retried."""
+        if self.error is None:
+            return False
+        if (
+            self.first_chunk_s is not None
+            or not is_rate_limit_error(self.error)
+            or attempt == limiter.retry.max_retries
+        ):
+            raise self.error
+        limiter._count_retry()
+        return True
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings wrapper: batches `embed_documents` and runs the batches in
+    parallel, as many at a time as the limiter's concurrency limit allows."""
+
+    def __init__(self, inner: Embeddings, limiter: AdaptiveLimiter, batch_size: int = 64) -> None:
+        self.inner = inner
+        self.limiter = limiter
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._embed_batch(texts) if texts else []
+        # Workers beyond the current limit just wait in acquire()
+        workers = self.limiter.max_concurrency or EMBED_WORKERS
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            results = pool.map(self._embed_batch, batches)
+            return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.limiter.call(lambda: self.inner.embed_query(text), tokens=estimate_tokens(text))
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        tokens = sum(estimate_tokens(t) for t in texts)
+        return self.limiter.call(lambda: self.inner.embed_documents(texts), tokens=tokens)
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits_for(model: str) -> dict[str, Any]:
+    config = json.loads(os.getenv("LLM_RATE_LIMITS", "") or "{}")
+    return {**config.get("*", {}), **config.get(model, {})}
+
+
+def get_limiter(model: str) -> AdaptiveLimiter:
+    """Get or create the process-wide limiter for `model` (see `LLM_RATE_LIMITS`)."""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limits = _limits_for(model)
+            limiter = _limiters[model] = AdaptiveLimiter(
+                model,
+                rpm=limits.get("rpm"),
+                tpm=limits.get("tpm"),
+                # Opt-in: without max_concurrency only the buckets apply
+                max_concurrency=int(limits["max_concurrency"]) if "max_concurrency" in limits else None,
+                initial_concurrency=int(limits.get("initial_concurrency", 4)),
+                retry=RetryPolicy(max_retries=int(limits.get("max_retries", 5))),
+            )
+        return limiter
+
+
+def all_metrics() -> list[LimiterMetrics]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.metrics() for limiter in limiters]
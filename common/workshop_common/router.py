@@ -0,0 +1,144 @@
+"""Latency-aware routing between a fast and a strong model.
+
+With a single `LLM_MODEL`, "thanks, and in euros?" pays the same latency as
+"compare the risks of both regions and explain the trade-offs". The router
+classifies every request with cheap local heuristics – no extra LLM call –
+and sends simple requests to a fast model while hard ones go to the strong
+model:
+
+- tool calls required                          -> strong
+- large RAG context / history                  -> strong
+- long question or several questions           -> strong
+- reasoning keywords (why, compare, explain...) -> strong
+- everything else                              -> fast
+
+Latency and token usage are recorded per route with the shared
+`TelemetryCollector`, so the split can be checked against real traffic.
+
+Usage:
+    router = ModelRouter.from_env(max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+    decision = router.classify(question, context=context)
+    with router.track(decision) as call:
+        for chunk in router.llm(decision).stream(prompt):
+            call.on_chunk(chunk)
+    print(router.format_stats())
+
+Configuration: `LLM_ROUTING=1` enables routing (otherwise every request goes
+to `LLM_MODEL`), `LLM_FAST_MODEL` names the fast model and
+`LLM_ROUTE_CONTEXT_TOKENS` (default 1500) is the context size above which a
+request counts as hard.
+"""
+import os
+import re
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from workshop_common.ratelimit import estimate_tokens
+from workshop_common.telemetry import CallTracker, TelemetryCollector
+
+HARD_PATTERN = re.compile(
+    r"\b(why|how does|how do|compare|comparison|explain|analy[sz]e|reason|step by step|"
+    r"calculate|derive|prove|trade-?offs?|pros and cons|plan|design|implement|evaluate|"
+    r"warum|vergleiche|erkl[aä]re)\b|```",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class RouteDecision:
+    route: str  # "fast", "strong" or "default" (routing disabled)
+    model: str
+    reasons: list[str] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        """Telemetry key; plain model name when routing is disabled."""
+        return self.model if self.route == "default" else f"{self.route} ({self.model})"
+
+
+class ModelRouter:
+    """Heuristic fast/strong model selection with per-route telemetry."""
+
+    def __init__(
+        self,
+        fast_model: str,
+        strong_model: str,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        enabled: bool = True,
+        simple_max_words: int = 25,
+        max_context_tokens: int = 1500,
+        get_model: Callable[..., Any] | None = None,
+        telemetry: TelemetryCollector | None = None,
+    ) -> None:
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.enabled = enabled
+        self.simple_max_words = simple_max_words
+        self.max_context_tokens = max_context_tokens
+        self._get_model = get_model
+        self.telemetry = telemetry or TelemetryCollector()
+
+    @classmethod
+    def from_env(cls, max_tokens: int = 256, temperature: float = 0.0, **kwargs: Any) -> "ModelRouter":
+        return cls(
+            fast_model=os.getenv("LLM_FAST_MODEL", "gpt-4.1-mini"),
+            strong_model=os.getenv("LLM_MODEL", "gpt-4.1"),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            enabled=os.getenv("LLM_ROUTING", "0") == "1",
+            max_context_tokens=int(os.getenv("LLM_ROUTE_CONTEXT_TOKENS", "1500")),
+            **kwargs,
+        )
+
+    def classify(
+        self,
+        question: str,
+        context: str = "",
+        history_tokens: int = 0,
+        needs_tools: bool = False,
+    ) -> RouteDecision:
+        """Pick a route from the request shape alone (microseconds, no I/O)."""
+        if not self.enabled:
+            return RouteDecision("default", self.strong_model, ["routing disabled"])
+
+        reasons = []
+        if needs_tools:
+            reasons.append("needs tools")
+        context_tokens = (estimate_tokens(context) if context else 0) + history_tokens
+        if context_tokens > self.max_context_tokens:
+            reasons.append(f"large context (~{context_tokens} tokens)")
+        words = len(question.split())
+        if words > self.simple_max_words:
+            reasons.append(f"long question ({words} words)")
+        if question.count("?") > 1:
+            reasons.append("several questions")
+        match = HARD_PATTERN.search(question)
+        if match:
+            reasons.append(f"reasoning keyword '{match.group(0).strip()}'")
+
+        if reasons:
+            return RouteDecision("strong", self.strong_model, reasons)
+        return RouteDecision("fast", self.fast_model, ["short, simple request"])
+
+    def llm(self, decision: RouteDecision) -> Any:
+        """The (cached) chat model for a decision.
+
+        Uses `get_model(model, max_tokens=..., temperature=...)` if given,
+        else `workshop_common.llm.get_llm`.
+        """
+        get_model = self._get_model
+        if get_model is None:
+            from workshop_common.llm import get_llm as get_model
+        return get_model(decision.model, max_tokens=self.max_tokens, temperature=self.temperature)
+
+    def track(self, decision: RouteDecision) -> AbstractContextManager[CallTracker]:
+        """Time a call on this route (see `TelemetryCollector.track`)."""
+        return self.telemetry.track(decision.label)
+
+    def format_stats(self) -> str:
+        """Per-route requests, tokens and latency percentiles."""
+        return self.telemetry.format_summary()
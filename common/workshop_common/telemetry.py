@@ -0,0 +1,299 @@
+"""Usage and latency telemetry for LLM calls.
+
+Every LangChain response carries `usage_metadata` (input/output tokens) and
+`response_metadata` (model name, provider token details). `TelemetryCollector`
+aggregates them per model:
+
+- prompt, completion and cached prompt tokens (totals + histograms),
+- end-to-end latency and time to first token (histograms, p50/p95/p99),
+- throughput (requests/s, completion tokens/s since start).
+
+Snapshots are appended as JSON lines to a local file every
+`TELEMETRY_INTERVAL` seconds (and once on `close()`), so trends under load
+can be plotted or diffed later.
+
+Usage:
+    from workshop_common.telemetry import TelemetryCollector
+
+    telemetry = TelemetryCollector.from_env()
+
+    # invoke(): time the call and record the response
+    with telemetry.track(MODEL) as call:
+        response = llm.invoke(prompt)
+        call.finish(response)
+
+    # stream(): feed every chunk, TTFT is taken from the first one
+    with telemetry.track(MODEL) as call:
+        for chunk in llm.stream(history):
+            call.on_chunk(chunk)
+
+    print(telemetry.format_summary())
+    telemetry.close()
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+# Upper bucket bounds; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style) with percentile estimates."""
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th percentile.
+
+        Values in the open-ended last bucket report the observed maximum.
+        """
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return float(self.bounds[i]) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        labels = [f"le_{b}" for b in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@dataclass
+class ModelStats:
+    """Aggregated telemetry for one model."""
+
+    requests: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+    ttft_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+    prompt_tokens_hist: Histogram = field(default_factory=lambda: Histogram(TOKEN_BUCKETS))
+    completion_tokens_hist: Histogram = field(default_factory=lambda: Histogram(TOKEN_BUCKETS))
+
+    def to_dict(self, elapsed_s: float) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+            "requests_per_s": round(self.requests / elapsed_s, 3) if elapsed_s else 0.0,
+            "completion_tokens_per_s": round(self.completion_tokens / elapsed_s, 3) if elapsed_s else 0.0,
+            "latency_ms": self.latency_ms.to_dict(),
+            "ttft_ms": self.ttft_ms.to_dict(),
+            "prompt_tokens_hist": self.prompt_tokens_hist.to_dict(),
+            "completion_tokens_hist": self.completion_tokens_hist.to_dict(),
+        }
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+
+def extract_usage(message: Any) -> Usage:
+    """Read token counts from a LangChain message (or aggregated chunk).
+
+    Prefers the standardized `usage_metadata`; falls back to the provider's
+    `response_metadata["token_usage"]` (OpenAI style) for cached tokens.
+    """
+    usage = Usage()
+    meta = getattr(message, "usage_metadata", None) or {}
+    usage.prompt_tokens = int(meta.get("input_tokens") or 0)
+    usage.completion_tokens = int(meta.get("output_tokens") or 0)
+    usage.cached_tokens = int((meta.get("input_token_details") or {}).get("cache_read") or 0)
+
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    if not usage.prompt_tokens:
+        usage.prompt_tokens = int(token_usage.get("prompt_tokens") or 0)
+    if not usage.completion_tokens:
+        usage.completion_tokens = int(token_usage.get("completion_tokens") or 0)
+    if not usage.cached_tokens:
+        details = token_usage.get("prompt_tokens_details") or {}
+        usage.cached_tokens = int(details.get("cached_tokens") or 0)
+    return usage
+
+
+class CallTracker:
+    """Times one LLM call; created by `TelemetryCollector.track()`."""
+
+    def __init__(self, collector: "TelemetryCollector", model: str) -> None:
+        self.collector = collector
+        self.model = model
+        self.start = time.perf_counter()
+        self.first_token_s: float | None = None
+        self.usage = Usage()
+        self._finished = False
+
+    def on_chunk(self, chunk: Any) -> None:
+        """Call for every streamed chunk; usage is summed over all chunks."""
+        if self.first_token_s is None and getattr(chunk, "content", None):
+            self.first_token_s = time.perf_counter() - self.start
+        chunk_usage = extract_usage(chunk)
+        self.usage.prompt_tokens += chunk_usage.prompt_tokens
+        self.usage.completion_tokens += chunk_usage.completion_tokens
+        self.usage.cached_tokens += chunk_usage.cached_tokens
+
+    def finish(self, response: Any = None) -> None:
+        """Record the call; pass the full response for non-streaming calls."""
+        if self._finished:
+            return
+        self._finished = True
+        if response is not None:
+            self.usage = extract_usage(response)
+        self.collector.record(
+            self.model,
+            latency_s=time.perf_counter() - self.start,
+            ttft_s=self.first_token_s,
+            usage=self.usage,
+        )
+
+
+class TelemetryCollector:
+    """Thread-safe per-model aggregation with periodic JSONL snapshots."""
+
+    def __init__(self, path: str | Path | None = None, interval_s: float = 30.0) -> None:
+        self.path = Path(path) if path else None
+        self.interval_s = interval_s
+        self.started = time.monotonic()
+        self._models: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        if self.path and interval_s > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="telemetry", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_env(cls, default_path: str | Path | None = None) -> "TelemetryCollector":
+        """Configure from `TELEMETRY_FILE` (empty disables snapshots) and
+        `TELEMETRY_INTERVAL` (seconds, default 30)."""
+        path = os.getenv("TELEMETRY_FILE", str(default_path) if default_path else "")
+        return cls(path=path or None, interval_s=float(os.getenv("TELEMETRY_INTERVAL", "30")))
+
+    @contextmanager
+    def track(self, model: str) -> Iterator[CallTracker]:
+        """Time one call. Records on `finish()` or at the end of the block;
+        an exception counts as an error for the model."""
+        tracker = CallTracker(self, model)
+        try:
+            yield tracker
+        except BaseException:
+            with self._lock:
+                self._stats(model).errors += 1
+                self._dirty = True
+            raise
+        tracker.finish()
+
+    def record(
+        self,
+        model: str,
+        latency_s: float,
+        ttft_s: float | None = None,
+        usage: Usage | None = None,
+    ) -> None:
+        usage = usage or Usage()
+        with self._lock:
+            stats = self._stats(model)
+            stats.requests += 1
+            stats.prompt_tokens += usage.prompt_tokens
+            stats.completion_tokens += usage.completion_tokens
+            stats.cached_tokens += usage.cached_tokens
+            stats.latency_ms.observe(latency_s * 1000)
+            if ttft_s is not None:
+                stats.ttft_ms.observe(ttft_s * 1000)
+            stats.prompt_tokens_hist.observe(usage.prompt_tokens)
+            stats.completion_tokens_hist.observe(usage.completion_tokens)
+            self._dirty = True
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "elapsed_s": round(elapsed, 3),
+                "models": {name: stats.to_dict(elapsed) for name, stats in self._models.items()},
+            }
+
+    def flush(self) -> None:
+        """Append a snapshot to the file if anything changed since the last one."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def close(self) -> None:
+        """Stop the background writer and write a final snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def format_summary(self) -> str:
+        snap = self.snapshot()
+        lines = []
+        for name, s in snap["models"].items():
+            ttft = s["ttft_ms"]
+            ttft_text = f", TTFT p50 {ttft['p50']:.0f} ms" if ttft["count"] else ""
+            lines.append(
+                f"{name}: {s['requests']} requests ({s['errors']} errors), "
+                f"tokens in/out/cached {s['prompt_tokens']}/{s['completion_tokens']}/{s['cached_tokens']}, "
+                f"latency p50 {s['latency_ms']['p50']:.0f} ms / p95 {s['latency_ms']['p95']:.0f} ms"
+                f"{ttft_text}, {s['completion_tokens_per_s']:.1f} tokens/s"
+            )
+        return "\n".join(lines) or "No LLM calls recorded."
+
+    def _stats(self, model: str) -> ModelStats:
+        # Called with the lock held
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = ModelStats()
+        return stats
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.flush()
@@ -0,0 +1,118 @@
+"""Compact vector storage for the HANA vector store.
+
+`text-embedding-3-small` returns 1536 float32 values per chunk. HANA stores
+and scans them as `REAL_VECTOR` (4 bytes per dimension), so memory and
+search cost grow with dimensions x rows. Two knobs shrink that:
+
+- `HALF_VECTOR` column type: 2 bytes per dimension (HANA Cloud QRC 2/2025+).
+- Fewer dimensions: `text-embedding-3-*` models are trained so that a
+  prefix of the vector, re-normalised, is itself a good embedding. The model
+  can return it directly (`dimensions` request parameter); for other models
+  the vector is truncated client-side.
+
+Ingestion and queries must use the same settings, so both read them from the
+environment via `VectorStorage.from_env()`:
+
+    storage = VectorStorage.from_env()
+    embeddings = storage.embeddings(get_embedding_model(MODEL, dimensions=storage.dimensions))
+    db = HanaDB(embedding=embeddings, connection=connection, table_name=TABLE, **storage.hana_kwargs())
+
+Configuration: `RAG_VECTOR_TYPE` (`REAL_VECTOR` or `HALF_VECTOR`) and
+`RAG_EMBEDDING_DIMENSIONS` (empty/0 = the model's full size). HANA checks the
+column type and length of an existing table, so changing them needs a new
+(or re-created) `HANA_TABLE_NAME`.
+"""
+import math
+import os
+import struct
+from dataclasses import dataclass
+
+from langchain_core.embeddings import Embeddings
+
+VECTOR_TYPES = ("REAL_VECTOR", "HALF_VECTOR")
+BYTES_PER_VALUE = {"REAL_VECTOR": 4, "HALF_VECTOR": 2}
+# HANA's binary vector format starts with the dimension count
+HEADER_BYTES = 4
+
+
+def reduce_vector(vector: list[float], dimensions: int) -> list[float]:
+    """First `dimensions` values, re-normalised to unit length."""
+    if len(vector) <= dimensions:
+        return vector
+    prefix = vector[:dimensions]
+    norm = math.sqrt(sum(v * v for v in prefix)) or 1.0
+    return [v / norm for v in prefix]
+
+
+def to_half(vector: list[float]) -> list[float]:
+    """Round values to half precision, as stored in a `HALF_VECTOR` column."""
+    return list(struct.unpack(f"<{len(vector)}e", struct.pack(f"<{len(vector)}e", *vector)))
+
+
+class ReducedEmbeddings(Embeddings):
+    """Embeddings cut to `dimensions` (no-op if the model already returns them)."""
+
+    def __init__(self, inner: Embeddings, dimensions: int) -> None:
+        self.inner = inner
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [reduce_vector(v, self.dimensions) for v in self.inner.embed_documents(texts)]
+
+    def embed_query(self, text: str) -> list[float]:
+        return reduce_vector(self.inner.embed_query(text), self.dimensions)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [reduce_vector(v, self.dimensions) for v in await self.inner.aembed_documents(texts)]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return reduce_vector(await self.inner.aembed_query(text), self.dimensions)
+
+
+@dataclass(frozen=True)
+class VectorStorage:
+    """Column type and dimensions of the vector column."""
+
+    vector_type: str = "REAL_VECTOR"
+    dimensions: int | None = None  # None = full model size
+
+    def __post_init__(self) -> None:
+        if self.vector_type not in VECTOR_TYPES:
+            raise ValueError(
+                f"RAG_VECTOR_TYPE must be one of {', '.join(VECTOR_TYPES)}, got '{self.vector_type}'"
+            )
+
+    @classmethod
+    def from_env(cls) -> "VectorStorage":
+        dimensions = int(os.getenv("RAG_EMBEDDING_DIMENSIONS") or 0)
+        return cls(
+            vector_type=os.getenv("RAG_VECTOR_TYPE", "REAL_VECTOR").strip().upper(),
+            dimensions=dimensions or None,
+        )
+
+    @property
+    def label(self) -> str:
+        return f"{self.vector_type}({self.dimensions or 'full'})"
+
+    def hana_kwargs(self) -> dict:
+        """Keyword arguments for `HanaDB(...)`."""
+        return {
+            "vector_column_type": self.vector_type,
+            "vector_column_length": self.dimensions or -1,
+        }
+
+    def embeddings(self, embeddings: Embeddings) -> Embeddings:
+        """Wrap `embeddings` so every vector has the configured dimensions."""
+        if self.dimensions is None:
+            return embeddings
+        return ReducedEmbeddings(embeddings, self.dimensions)
+
+    def stored(self, vector: list[float]) -> list[float]:
+        """The vector as HANA keeps it (reduced, rounded for HALF_VECTOR)."""
+        if self.dimensions is not None:
+            vector = reduce_vector(vector, self.dimensions)
+        return to_half(vector) if self.vector_type == "HALF_VECTOR" else vector
+
+    def bytes_per_vector(self, full_dimensions: int) -> int:
+        dimensions = min(self.dimensions or full_dimensions, full_dimensions)
+        return HEADER_BYTES + dimensions * BYTES_PER_VALUE[self.vector_type]
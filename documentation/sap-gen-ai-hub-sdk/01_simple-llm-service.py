@@ -1,9 +1,18 @@
 """LLM service using SAP Generative AI Hub SDK with chat history support."""
 import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import json
 import logging
-from typing import AsyncGenerator, Optional
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models.chat_models import BaseChatModel
 from gen_ai_hub.proxy.langchain import init_llm
@@ -12,48 +21,728 @@ from gen_ai_hub.proxy.core.proxy_clients import get_proxy_client
 from app.core.config import settings
 from app.services.session_storage import SessionStorage
 
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; images are then sent as uploaded
+    Image = None
+
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# Singleton LLM instance
-_llm_instance: Optional[BaseChatModel] = None
+SYSTEM_PROMPT = "You are a helpful AI assistant for financial data analysis. You can analyze both text and images. Answer questions clearly and concisely. When providing tables, use proper markdown table format with newlines between rows."
+
+# Shared clients: one proxy client (OAuth token + deployment list) per process
+# and one model per (model, max_tokens, temperature). Reusing a model instance
+# also reuses its HTTP client, i.e. keep-alive connections to AI Core.
 _proxy_client_instance: Optional[BaseProxyClient] = None
+_llm_instances: Dict[Tuple[str, int, float], BaseChatModel] = {}
+_llm_lock = threading.Lock()
+
+
+def _get_proxy_client() -> BaseProxyClient:
+    """Get or create the shared proxy client. Call with `_llm_lock` held."""
+    global _proxy_client_instance
+
+    if _proxy_client_instance is None:
+        logger.info("Initializing proxy client (first time)")
+        _proxy_client_instance = get_proxy_client(
+            proxy_server_url=settings.aicore_base_url or None,
+            auth_url=settings.aicore_auth_url or None,
+            client_id=settings.aicore_client_id or None,
+            client_secret=settings.aicore_client_secret or None,
+            resource_group=settings.aicore_resource_group or None,
+        )
+    return _proxy_client_instance
 
 
-def _get_llm() -> BaseChatModel:
+def get_llm(
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    temperature: Optional[float] = None,
+) -> BaseChatModel:
     """
-    Get or initialize the LLM instance (singleton pattern).
+    Get a cached LLM instance for (model, max_tokens, temperature).
+    
+    Defaults come from the settings. All instances share one proxy client,
+    so the auth token and deployment lookup are paid once per process.
     
     Returns:
         Initialized LLM instance
     """
-    global _llm_instance, _proxy_client_instance
+    key = (
+        model or settings.llm_model,
+        int(max_tokens if max_tokens is not None else settings.llm_max_tokens),
+        float(temperature if temperature is not None else settings.llm_temperature),
+    )
+    
+    with _llm_lock:
+        llm = _llm_instances.get(key)
+        if llm is None:
+            logger.info(f"Initializing LLM instance for {key}")
+            llm = init_llm(
+                model_name=key[0],
+                proxy_client=_get_proxy_client(),
+                max_tokens=key[1],
+                temperature=key[2],
+            )
+            _llm_instances[key] = llm
+            logger.info(f"LLM initialized successfully with model: {key[0]}")
+        else:
+            logger.debug("Reusing existing LLM instance")
+    
+    return llm
+
+
+async def warm_up_llm(ping: bool = False) -> None:
+    """
+    Prepare the default LLM before the first request (e.g. on app startup).
+    
+    Fetches the auth token and deployments and creates the model. With
+    `ping=True` also sends a 1-token request so the connection to the
+    inference endpoint is already open. Errors are logged, not raised.
+    """
+    start = time.perf_counter()
+    try:
+        llm = await asyncio.to_thread(get_llm)
+        if ping:
+            await llm.ainvoke("ping", max_tokens=1)
+        logger.info(f"LLM warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        logger.warning(f"LLM warm-up failed: {str(e)}")
+
+
+@dataclass
+class EncodedImage:
+    """An attachment as it is sent to the model (downscaled, recompressed)."""
+    
+    url: str                    # data:{mime};base64,...
+    caption: str                # text stand-in when the image is left out
+    original_bytes: int
+    
+    @property
+    def size_bytes(self) -> int:
+        return len(self.url)
+
+
+class ImagePipeline:
+    """
+    Downscale and recompress image attachments once, cache the result.
+    
+    Uploaded photos and screenshots are often several MB at full camera
+    resolution, while the model scales them down to roughly 1-2k pixels
+    anyway. Every image is resized so its longer side is at most
+    `max_dimension` and re-encoded (JPEG at `quality`, PNG if it has
+    transparency); the original is kept if that does not make it smaller.
+    Results are cached by a hash of the uploaded data in an LRU of
+    `max_cache_bytes`, so a session rebuild or the same image in another
+    session is not processed again. Without Pillow, images pass through.
+    """
     
-    if _llm_instance is None:
-        logger.info("Initializing LLM instance (first time)")
+    def __init__(self, max_dimension: int = 1024, quality: int = 85, max_cache_bytes: int = 32 * 1024 * 1024):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.max_cache_bytes = max_cache_bytes
+        self._entries: "OrderedDict[str, EncodedImage]" = OrderedDict()
+        self._by_url: Dict[str, EncodedImage] = {}
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if Image is None:
+            logger.warning("Pillow is not installed; image attachments are sent at original size")
+    
+    def encode(self, attachment) -> EncodedImage:
+        """The processed image for a stored attachment (cached)."""
+        key = hashlib.sha256(attachment.data.encode("ascii")).hexdigest()
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.cache_hits += 1
+                return image
         
-        # Initialize proxy client
-        _proxy_client_instance = get_proxy_client(
-            proxy_server_url=settings.aicore_base_url or None,
-            auth_url=settings.aicore_auth_url or None,
-            client_id=settings.aicore_client_id or None,
-            client_secret=settings.aicore_client_secret or None,
-            resource_group=settings.aicore_resource_group or None,
+        # Process outside the lock; a concurrent duplicate only costs time
+        image = self._process(attachment)
+        with self._lock:
+            self.processed += 1
+            self.bytes_in += image.original_bytes
+            self.bytes_out += image.size_bytes
+            if key not in self._entries:
+                self._entries[key] = image
+                self._by_url[image.url] = image
+                self._size_bytes += image.size_bytes
+                self._evict()
+        return image
+    
+    def caption(self, url: str) -> str:
+        """Caption for a data URL produced by `encode` (generic if evicted)."""
+        image = self._by_url.get(url)
+        return image.caption if image is not None else "[Image from an earlier message omitted]"
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cached_images": len(self._entries),
+                "cache_bytes": self._size_bytes,
+                "processed": self.processed,
+                "cache_hits": self.cache_hits,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+    
+    def _process(self, attachment) -> EncodedImage:
+        mime_type = attachment.mime_type
+        data = attachment.data
+        name = getattr(attachment, "caption", None) or getattr(attachment, "filename", None) or "image"
+        dimensions = ""
+        if Image is not None:
+            try:
+                raw = base64.b64decode(data, validate=True)
+                with Image.open(io.BytesIO(raw)) as img:
+                    dimensions = f", {img.width}x{img.height}"
+                    # Keep animations as they are; one frame would change the meaning
+                    if not getattr(img, "is_animated", False):
+                        resized = max(img.size) > self.max_dimension
+                        img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+                        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+                        out = io.BytesIO()
+                        if has_alpha:
+                            img.save(out, format="PNG", optimize=True)
+                            out_mime = "image/png"
+                        else:
+                            img.convert("RGB").save(out, format="JPEG", quality=self.quality, optimize=True)
+                            out_mime = "image/jpeg"
+                        if resized or out.tell() < len(raw):
+                            mime_type = out_mime
+                            data = base64.b64encode(out.getvalue()).decode("ascii")
+            except (binascii.Error, OSError, ValueError, Image.DecompressionBombError) as e:
+                logger.warning(f"Could not process image attachment ({mime_type}), sending it unchanged: {str(e)}")
+        
+        return EncodedImage(
+            url=f"data:{mime_type};base64,{data}",
+            caption=f"[Image from an earlier message omitted: {name}{dimensions}]",
+            original_bytes=len(attachment.data),
         )
+    
+    def _evict(self) -> None:
+        # Called with the lock held
+        while len(self._entries) > 1 and self._size_bytes > self.max_cache_bytes:
+            _, image = self._entries.popitem(last=False)
+            self._by_url.pop(image.url, None)
+            self._size_bytes -= image.size_bytes
+
+
+_image_pipeline = ImagePipeline(
+    max_dimension=getattr(settings, "llm_image_max_dimension", 1024),
+    quality=getattr(settings, "llm_image_quality", 85),
+    max_cache_bytes=getattr(settings, "llm_image_cache_bytes", 32 * 1024 * 1024),
+)
+
+
+def _convert_message(msg) -> Tuple[Optional[BaseMessage], int]:
+    """
+    Convert a stored session message to a LangChain message.
+    
+    Returns:
+        The message (None for unsupported roles) and its approximate size in bytes
+    """
+    if msg.role == "user":
+        # Check if message has image attachments
+        if msg.attachments:
+            # Build multimodal content array (OpenAI format)
+            content = []
+            size = 0
+            
+            # Add text if present
+            if msg.content:
+                content.append({
+                    "type": "text",
+                    "text": msg.content
+                })
+                size += len(msg.content)
+            
+            # Add images (downscaled and recompressed once, see ImagePipeline)
+            for attachment in msg.attachments:
+                image = _image_pipeline.encode(attachment)
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image.url
+                    }
+                })
+                size += image.size_bytes
+            
+            logger.debug(f"Converted multimodal message with {len(msg.attachments)} attachment(s)")
+            return HumanMessage(content=content), size
+        # Text-only message
+        return HumanMessage(content=msg.content), len(msg.content)
+    if msg.role == "assistant":
+        # Assistant messages remain text-only
+        return AIMessage(content=msg.content), len(msg.content)
+    return None, 0
+
+
+def _fingerprint(msg) -> Tuple[str, int, int, Tuple[int, ...]]:
+    """Cheap identity of a stored message, to detect edited or replaced history."""
+    attachments = tuple(len(a.data) for a in (getattr(msg, "attachments", None) or ()))
+    return (msg.role, len(msg.content or ""), hash(msg.content), attachments)
+
+
+@dataclass
+class _CachedSession:
+    messages: List[BaseMessage] = field(default_factory=list)
+    # One per stored message already converted, so an edit anywhere in the
+    # history (not only of the last message) is detected
+    fingerprints: List[Tuple[str, int, int, Tuple[int, ...]]] = field(default_factory=list)
+    size_bytes: int = 0
+    
+    @property
+    def converted(self) -> int:
+        """Number of stored messages already converted."""
+        return len(self.fingerprints)
+
+
+class SessionMessageCache:
+    """
+    LRU cache of converted LangChain messages per session.
+    
+    Each request only converts the stored messages that were appended since
+    the previous request; image attachments are processed into data URLs once.
+    Sessions are evicted least-recently-used first when the cache holds more
+    than `max_sessions` sessions or `max_bytes` of message content. The lock
+    only guards the cache entries; conversion runs outside it, so sessions
+    do not wait for each other's image processing.
+    
+    To detect an edit anywhere in the history, every request fingerprints
+    all stored messages (role, length, hash of the text, attachment sizes).
+    That is linear in the history's text, but hashing is far cheaper than
+    converting, runs outside the lock too, and is cached by Python for a
+    string object that the storage returns again.
+    """
+    
+    def __init__(self, max_sessions: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get_messages(self, session_id: str, stored_messages: list) -> List[BaseMessage]:
+        """Return the converted history for `stored_messages` (a new list)."""
+        fingerprints = [_fingerprint(msg) for msg in stored_messages]
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and not self._is_prefix(entry, fingerprints):
+                # History was cleared or edited: rebuild from scratch
+                self._drop(session_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                cached: List[BaseMessage] = []
+                converted_before = 0
+            else:
+                self.hits += 1
+                self._sessions.move_to_end(session_id)
+                cached = list(entry.messages)
+                converted_before = entry.converted
         
-        # Initialize LLM with LangChain wrapper
-        _llm_instance = init_llm(
-            model_name=settings.llm_model,
-            proxy_client=_proxy_client_instance,
-            max_tokens=settings.llm_max_tokens,
-            temperature=settings.llm_temperature,
+        # Convert outside the lock: images are decoded and resized here, and
+        # other sessions must not wait for that
+        new_messages = stored_messages[converted_before:]
+        converted = [_convert_message(msg) for msg in new_messages]
+        new_converted = [message for message, _ in converted if message is not None]
+        
+        if new_messages:
+            with self._lock:
+                current = self._sessions.get(session_id)
+                if current is entry and (entry is None or entry.converted == converted_before):
+                    if entry is None:
+                        entry = self._sessions[session_id] = _CachedSession()
+                    size = sum(size for _, size in converted)
+                    entry.messages.extend(new_converted)
+                    entry.fingerprints.extend(fingerprints[converted_before:])
+                    entry.size_bytes += size
+                    self._size_bytes += size
+                    self._sessions.move_to_end(session_id)
+                    self._evict(keep=session_id)
+                # else: a concurrent request of the same session got there
+                # first; its result is as good as ours, keep it
+            logger.debug(f"Converted {len(new_messages)} new message(s) for session {session_id}")
+        
+        return cached + new_converted
+    
+    def invalidate(self, session_id: str) -> None:
+        """Forget a session, e.g. after it was deleted."""
+        with self._lock:
+            self._drop(session_id)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "size_bytes": self._size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+    
+    @staticmethod
+    def _is_prefix(entry: _CachedSession, fingerprints: list) -> bool:
+        """True if the converted messages are still the start of the history."""
+        return entry.fingerprints == fingerprints[:entry.converted]
+    
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._size_bytes -= entry.size_bytes
+    
+    def _evict(self, keep: str) -> None:
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._size_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                # The current session alone exceeds the budget; keep it
+                break
+            self._drop(oldest)
+            self.evictions += 1
+            logger.debug(f"Evicted cached history of session {oldest}")
+
+
+_session_cache = SessionMessageCache(
+    max_sessions=getattr(settings, "llm_history_cache_sessions", 256),
+    max_bytes=getattr(settings, "llm_history_cache_bytes", 64 * 1024 * 1024),
+)
+_session_storage: Optional[SessionStorage] = None
+
+
+def limit_history_images(
+    messages: List[BaseMessage], max_bytes: int
+) -> Tuple[List[BaseMessage], Dict[str, int]]:
+    """
+    Keep the newest images within `max_bytes` of data URLs per request.
+    
+    Walks the history from the newest message back; images that no longer
+    fit are replaced by their text caption. The images of the most recent
+    message with images are always kept. Returns new message objects where
+    something changed (the cached messages are not modified) and counts.
+    """
+    result = list(messages)
+    used = 0
+    kept = captioned = 0
+    newest = True
+    for i in range(len(result) - 1, -1, -1):
+        msg = result[i]
+        if not isinstance(msg, HumanMessage) or isinstance(msg.content, str):
+            continue
+        parts = []
+        changed = False
+        has_images = False
+        for part in msg.content:
+            if part.get("type") != "image_url":
+                parts.append(part)
+                continue
+            has_images = True
+            url = part["image_url"]["url"]
+            if newest or used + len(url) <= max_bytes:
+                used += len(url)
+                kept += 1
+                parts.append(part)
+            else:
+                captioned += 1
+                changed = True
+                parts.append({"type": "text", "text": _image_pipeline.caption(url)})
+        if changed:
+            result[i] = HumanMessage(content=parts)
+        newest = newest and not has_images
+    return result, {"images": kept, "captioned": captioned, "image_bytes": used}
+
+
+def _get_session_storage() -> SessionStorage:
+    """Reuse one SessionStorage instead of constructing it per request."""
+    global _session_storage
+    
+    if _session_storage is None:
+        _session_storage = SessionStorage()
+    return _session_storage
+
+
+@dataclass
+class StreamStats:
+    """Per-stream throughput numbers, filled in by `coalesce_chunks`."""
+    
+    chunks: int = 0             # LLM chunks received (~ tokens)
+    chars: int = 0
+    events: int = 0             # coalesced events sent to the client
+    backpressure_waits: int = 0
+    start: float = field(default_factory=time.perf_counter)
+    first_chunk_s: Optional[float] = None
+    end_s: Optional[float] = None
+    
+    @property
+    def tokens_per_s(self) -> float:
+        if self.first_chunk_s is None or self.end_s is None:
+            return 0.0
+        generation_s = self.end_s - self.first_chunk_s
+        return self.chunks / generation_s if generation_s > 0 else 0.0
+    
+    def format(self) -> str:
+        ttft = f"{self.first_chunk_s * 1000:.0f} ms" if self.first_chunk_s is not None else "n/a"
+        return (
+            f"{self.chunks} chunks -> {self.events} events, {self.chars} chars, "
+            f"TTFT {ttft}, {self.tokens_per_s:.1f} tokens/s, "
+            f"{self.backpressure_waits} backpressure waits"
         )
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[str],
+    stats: StreamStats,
+    window_s: float = getattr(settings, "llm_stream_coalesce_ms", 50) / 1000,
+    max_bytes: int = getattr(settings, "llm_stream_coalesce_bytes", 512),
+    max_buffer_bytes: int = getattr(settings, "llm_stream_buffer_bytes", 64 * 1024),
+) -> AsyncGenerator[str, None]:
+    """
+    Merge small LLM chunks into fewer, larger pieces of text.
+    
+    A background task reads `source` into a buffer. A piece is emitted once
+    `window_s` has passed since its first chunk, or as soon as it holds
+    `max_bytes`. While the client is slow to accept events, chunks keep
+    collecting in the buffer (so the next event is simply bigger); only when
+    the buffer reaches `max_buffer_bytes` does reading from the LLM pause
+    until the client catches up.
+    """
+    parts: List[str] = []
+    buffered = 0
+    done = False
+    error: Optional[BaseException] = None
+    data_ready = asyncio.Event()      # something to send (or end of stream)
+    drained = asyncio.Event()         # buffer below max_buffer_bytes again
+    drained.set()
+    
+    async def produce() -> None:
+        nonlocal buffered, done, error
+        try:
+            async for chunk in source:
+                if not chunk:
+                    continue
+                now = time.perf_counter()
+                if stats.first_chunk_s is None:
+                    stats.first_chunk_s = now - stats.start
+                stats.chunks += 1
+                stats.chars += len(chunk)
+                parts.append(chunk)
+                buffered += len(chunk.encode("utf-8"))
+                data_ready.set()
+                if buffered >= max_buffer_bytes:
+                    stats.backpressure_waits += 1
+                    drained.clear()
+                    await drained.wait()
+        except Exception as e:
+            error = e
+        finally:
+            stats.end_s = time.perf_counter() - stats.start
+            done = True
+            data_ready.set()
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            await data_ready.wait()
+            # Give the piece up to window_s to grow, unless it is big enough
+            deadline = time.perf_counter() + window_s
+            while not done and buffered < max_bytes:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                data_ready.clear()
+                try:
+                    await asyncio.wait_for(data_ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            
+            if parts:
+                text = "".join(parts)
+                parts.clear()
+                buffered = 0
+                drained.set()
+                stats.events += 1
+                # The consumer (SSE response) resumes us only after sending
+                yield text
+            if done and not parts:
+                break
+            if not parts:
+                data_ready.clear()
+        if error is not None:
+            raise error
+    finally:
+        # Client went away or stream failed: stop reading from the LLM
+        producer.cancel()
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def request_key(message: str, chat_history: List[BaseMessage]) -> str:
+    """
+    Hash of everything that determines the LLM output: model settings,
+    system prompt, history and the (whitespace-normalized) user message.
+    """
+    digest = hashlib.sha256()
+    model_settings = (settings.llm_model, settings.llm_max_tokens, settings.llm_temperature)
+    digest.update(repr(model_settings).encode("utf-8"))
+    digest.update(SYSTEM_PROMPT.encode("utf-8"))
+    for msg in chat_history:
+        content = msg.content
+        if isinstance(content, str):
+            content = _normalize_text(content)
+        else:
+            # Multimodal content (text + image data URLs)
+            content = json.dumps(content, sort_keys=True)
+        digest.update(b"\x00" + msg.type.encode("utf-8") + b"\x00" + content.encode("utf-8"))
+    digest.update(b"\x00input\x00" + _normalize_text(message).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _Flight:
+    """One upstream LLM stream that any number of subscribers follow."""
+    
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+    
+    def publish(self, chunk: Optional[str] = None) -> None:
+        if chunk is not None:
+            self.chunks.append(chunk)
+        # Wake everybody waiting for the current version, start a new one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+    
+    async def follow(self) -> AsyncGenerator[str, None]:
+        """All chunks from the beginning, then new ones as they arrive."""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                break
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class StreamSingleflight:
+    """
+    Coalesce identical concurrent LLM requests into one upstream stream.
+    
+    The first request for a key starts the upstream stream in a background
+    task; requests with the same key that arrive while it runs join it and
+    receive all chunks from the start. Completed answers stay in a small
+    result cache for `ttl_s` seconds, so late joiners (e.g. the same button
+    clicked a moment later) are answered without an LLM call. Errors are not
+    cached. If every subscriber disconnects, the upstream stream is cancelled.
+    """
+    
+    def __init__(self, ttl_s: float = 30.0, max_results: int = 256):
+        self.ttl_s = ttl_s
+        self.max_results = max_results
+        self._flights: Dict[str, _Flight] = {}
+        self._results: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.started = 0
+        self.joined = 0
+        self.cache_hits = 0
+    
+    async def stream(
+        self, key: str, start: Callable[[], AsyncIterator[str]]
+    ) -> AsyncGenerator[str, None]:
+        cached = self._cached(key)
+        if cached is not None:
+            self.cache_hits += 1
+            logger.info(f"Singleflight cache hit for request {key[:12]}")
+            yield cached
+            return
+        
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, start))
+            self.started += 1
+        else:
+            self.joined += 1
+            logger.info(f"Joined in-flight request {key[:12]} ({flight.subscribers} other subscriber(s))")
         
-        logger.info(f"LLM initialized successfully with model: {settings.llm_model}")
-    else:
-        logger.debug("Reusing existing LLM instance")
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.follow():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Unregister first: a request arriving while the task winds
+                # down starts a fresh upstream instead of joining a dead one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
     
-    return _llm_instance
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+            "cache_hits": self.cache_hits,
+            "cached_results": len(self._results),
+        }
+    
+    async def _run(self, key: str, flight: _Flight, start: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for chunk in start():
+                if chunk:
+                    flight.publish(chunk)
+            self._store(key, "".join(flight.chunks))
+        except asyncio.CancelledError:
+            # Notify anyone still following (see finally), then let the
+            # cancellation propagate
+            flight.error = RuntimeError("Upstream stream cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish()
+    
+    def _cached(self, key: str) -> Optional[str]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        return text
+    
+    def _store(self, key: str, text: str) -> None:
+        if self.ttl_s <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.ttl_s, text)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+
+_singleflight = StreamSingleflight(ttl_s=getattr(settings, "llm_singleflight_ttl_s", 30.0))
 
 
 async def generate_llm_response(message: str, session_id: str | None = None) -> AsyncGenerator[dict, None]:
@@ -71,51 +760,30 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
         SSE events as dictionaries with 'event' and 'data' keys
     """
     try:
-        # Get or initialize LLM (singleton)
-        llm = _get_llm()
+        # Get the shared, already-authenticated LLM
+        llm = get_llm()
         
-        # Load chat history from session
+        # Load chat history from session (converted messages are cached per
+        # session; only messages added since the last request are converted)
         chat_history = []
         if session_id:
             logger.debug(f"Loading chat history for session: {session_id}")
-            storage = SessionStorage()
-            session = storage.get_session(session_id)
+            session = _get_session_storage().get_session(session_id)
             if session and session.messages:
-                # Convert stored messages to LangChain message format
-                logger.info(f"Loaded {len(session.messages)} messages from session {session_id}")
-                for msg in session.messages:
-                    logger.debug(f"Message: {msg.role} - {msg.content[:50]}...")
-                    if msg.role == "user":
-                        # Check if message has image attachments
-                        if msg.attachments:
-                            # Build multimodal content array (OpenAI format)
-                            content = []
-                            
-                            # Add text if present
-                            if msg.content:
-                                content.append({
-                                    "type": "text",
-                                    "text": msg.content
-                                })
-                            
-                            # Add images
-                            for attachment in msg.attachments:
-                                content.append({
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:{attachment.mime_type};base64,{attachment.data}"
-                                    }
-                                })
-                            
-                            chat_history.append(HumanMessage(content=content))
-                            logger.debug(f"Added multimodal message with {len(msg.attachments)} attachment(s)")
-                        else:
-                            # Text-only message
-                            chat_history.append(HumanMessage(content=msg.content))
-                    elif msg.role == "assistant":
-                        # Assistant messages remain text-only
-                        chat_history.append(AIMessage(content=msg.content))
+                # In a worker thread: new image attachments are decoded and
+                # resized there, which would otherwise block the event loop
+                chat_history = await asyncio.to_thread(
+                    _session_cache.get_messages, session_id, session.messages
+                )
+                chat_history, image_stats = limit_history_images(
+                    chat_history, getattr(settings, "llm_history_image_bytes", 4 * 1024 * 1024)
+                )
                 logger.info(f"Chat history prepared with {len(chat_history)} messages")
+                if image_stats["images"] or image_stats["captioned"]:
+                    logger.info(
+                        f"History images: {image_stats['images']} sent ({image_stats['image_bytes']} bytes), "
+                        f"{image_stats['captioned']} replaced by captions"
+                    )
             else:
                 logger.warning(f"No session or messages found for session_id: {session_id}")
         else:
@@ -123,7 +791,7 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
         
         # Create prompt with chat history
         prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful AI assistant for financial data analysis. You can analyze both text and images. Answer questions clearly and concisely. When providing tables, use proper markdown table format with newlines between rows."),
+            ("system", SYSTEM_PROMPT),
             MessagesPlaceholder("chat_history"),
             ("human", "{input}")
         ])
@@ -131,18 +799,22 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
         # Create chain
         chain = prompt | llm | StrOutputParser()
         
-        # Stream response chunks
-        async for chunk in chain.astream({
+        # Identical concurrent requests share one upstream stream
+        inputs = {
             "input": message,
             "chat_history": chat_history
-        }):
-            if chunk:
-                yield {
-                    "event": "text",
-                    "data": chunk
-                }
-                # Small delay to make streaming visible
-                await asyncio.sleep(0.01)
+        }
+        key = request_key(message, chat_history)
+        stream = _singleflight.stream(key, lambda: chain.astream(inputs))
+        
+        # Stream response chunks, coalesced into fewer, larger SSE events
+        stats = StreamStats()
+        async for text in coalesce_chunks(stream, stats):
+            yield {
+                "event": "text",
+                "data": text
+            }
+        logger.info(f"Stream finished for session {session_id}: {stats.format()}")
         
         # Signal end of stream
         yield {"event": "end", "data": ""}